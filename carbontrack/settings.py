@@ -49,7 +49,9 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # AuthenticationMiddleware that caches the user and household
+    'tracker.middleware.CachedAuthenticationMiddleware',
+    'tracker.replicas.PrimaryPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -85,6 +87,37 @@ DATABASES = {
     }
 }
 
+# Read replica for reports, charts and summary API reads (see tracker/replicas.py).
+# For local testing point this at a copy of db.sqlite3.
+if os.environ.get('CARBONTRACK_REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['CARBONTRACK_REPLICA_DB'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['tracker.replicas.ReplicaRouter']
+
+# Cache
+# Sessions and authenticated users are cached here (see tracker/middleware.py). With more
+# than one process set CARBONTRACK_CACHE_URL (e.g. redis://localhost:6379/2) so they share it.
+if os.environ.get('CARBONTRACK_CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CARBONTRACK_CACHE_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Sessions are read from the cache and written through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -136,19 +169,31 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        # Authorization: Api-Key <key>; replaces BasicAuthentication, which ran a password hash per request.
+        # Listed first so failed requests get 401 with a WWW-Authenticate header
+        'tracker.apikeys.ApiKeyAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # JSON by default; Accept: application/msgpack (or ?format=msgpack) for MessagePack
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
+        'tracker.renderers.OrjsonRenderer',
+        'tracker.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'tracker.renderers.OrjsonParser',
+        'tracker.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
+# The browsable API renders forms for every response; development only
+if DEBUG:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('rest_framework.renderers.BrowsableAPIRenderer')
 
 # Crispy Forms
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
@@ -160,7 +205,15 @@ LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/'
 
 # Email Configuration (for production)
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# Set CARBONTRACK_EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend to send through SMTP
+EMAIL_BACKEND = os.environ.get('CARBONTRACK_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', '') == '1'
+EMAIL_TIMEOUT = 30
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'CarbonTrack <noreply@carbontrack.local>')
 
 # Carbon Footprint App Specific Settings
 CARBON_FOOTPRINT_SETTINGS = {
@@ -173,7 +226,69 @@ CARBON_FOOTPRINT_SETTINGS = {
     'AVERAGE_INDIAN_EMISSIONS': {
         'per_capita_yearly': 1900,  # kg CO2 per person per year
         'household_monthly': 300,   # kg CO2 per household per month
-    }
+    },
+    # Live dashboard updates (server-sent events, requires ASGI)
+    'EVENTS': {
+        # Use 'tracker.events.RedisBackend' when running more than one worker
+        'BACKEND': os.environ.get('CARBONTRACK_EVENTS_BACKEND', 'tracker.events.InProcessBackend'),
+        'REDIS_URL': 'redis://localhost:6379/1',
+        'COALESCE_SECONDS': 0.5,    # merge bursts of updates for the same month
+        'KEEPALIVE_SECONDS': 15,
+        'MAX_STREAM_SECONDS': 300,  # clients reconnect automatically
+    },
+    # Read replicas (aliases in DATABASES) used by reports, charts and the summary API
+    'REPLICAS': {
+        'ALIASES': [alias for alias in DATABASES if alias != 'default'],
+        'STICKY_SECONDS': 10,       # read from the primary this long after a client writes
+        'MAX_LAG_SECONDS': 5,       # replicas further behind are skipped
+        'LAG_CHECK_SECONDS': 5,     # how often each worker re-measures replica lag
+    },
+    # Cold storage of old usage rows (tracker/archive.py, archive_usage command)
+    'ARCHIVE': {
+        'DIR': os.environ.get('CARBONTRACK_ARCHIVE_DIR', BASE_DIR / 'archive'),
+        'HORIZON_MONTHS': 36,       # months of usage kept in the database
+        'CHUNK_SIZE': 50000,        # rows written to Parquet and deleted per step
+    },
+    # Columnar exports for the analytics warehouse (export_warehouse command)
+    'WAREHOUSE': {
+        'DIR': os.environ.get('CARBONTRACK_WAREHOUSE_DIR', BASE_DIR / 'warehouse'),
+        'ROW_GROUP_SIZE': 65536,    # rows per row group; bounds export memory
+        'FORMAT': 'parquet',        # or 'arrow' (Arrow IPC files)
+    },
+    # Downloadable yearly statements (render_statements command)
+    'REPORTS': {
+        'DIR': os.environ.get('CARBONTRACK_REPORTS_DIR', BASE_DIR / 'reports'),
+        'FORMAT': 'pdf',            # or 'png'
+        'DPI': 150,
+    },
+    # Monthly digest emails (send_digests command)
+    'DIGEST': {
+        'SITE_URL': os.environ.get('CARBONTRACK_SITE_URL', 'http://127.0.0.1:8000'),
+        'CHUNK_SIZE': 500,          # messages rendered and sent per send_messages() call
+        'MAX_ATTEMPTS': 3,          # per message and run, reconnecting between attempts
+        'RETRY_DELAY': 5,           # seconds, doubled after each failed attempt
+    },
+    # API key authentication (tracker.apikeys)
+    'API_KEYS': {
+        'CACHE_SIZE': 1024,         # verified keys kept per process
+        'CACHE_TTL': 60,            # seconds before a key is checked against the database again
+    },
+    # HTTP client used by tracker.scraper
+    'SCRAPER': {
+        'CACHE_DIR': os.environ.get('CARBONTRACK_SCRAPER_CACHE', BASE_DIR / 'scraper_cache'),
+        'CONNECT_TIMEOUT': 5,
+        'READ_TIMEOUT': 20,
+        'RETRIES': 3,
+        'BACKOFF_FACTOR': 0.5,      # waits 0.5s, 1s, 2s between retries
+        'POOL_CONNECTIONS': 10,     # hosts kept in the connection pool
+        'POOL_MAXSIZE': 10,         # connections kept open per host
+        # Page URL per source (petrol_diesel, lpg, electricity, energy_tips,
+        # transport_tips, diet_tips); sources without one use the sample data
+        'SOURCES': {},
+        # Table extraction spec per source, overriding tracker.scraper.SOURCE_SPECS
+        'SPECS': {},
+        'PARSER': None,             # 'lxml', 'soupstrainer' or 'beautifulsoup'; None picks lxml
+    },
 }
 
 # Celery Configuration (for background tasks)
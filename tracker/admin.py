@@ -1,10 +1,46 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from .apikeys import revoke_key
+from .search import search_tips
 from .models import (
     IndianState, Household, EmissionFactor, EnergyUsage, 
     TransportUsage, DietEmission, MonthlyEmissionSummary, 
-    EcoTip, FuelPrice, UserGoal
+    EcoTip, FuelPrice, LatestFuelPrice, UserGoal, EmissionSnapshot, YearlyEmissionRollup, UsageArchive, WarehouseExport,
+    DigestLog, ApiKey
 )
 
+ADMIN_SEARCH_LIMIT = 1000
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator using the planner's row estimate for large unfiltered PostgreSQL tables"""
+    estimate_threshold = 100000
+    
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                        [queryset.model._meta.db_table]
+                    )
+                    row = cursor.fetchone()
+                if row and row[0] >= self.estimate_threshold:
+                    return row[0]
+        return super().count
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables that grow with every household"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_select_related = ['household__user']
+    autocomplete_fields = ['household']
+
 @admin.register(IndianState)
 class IndianStateAdmin(admin.ModelAdmin):
     list_display = ['name', 'electricity_emission_factor', 'created_at']
@@ -14,6 +50,10 @@ class IndianStateAdmin(admin.ModelAdmin):
 @admin.register(Household)
 class HouseholdAdmin(admin.ModelAdmin):
     list_display = ['name', 'user', 'house_type', 'members_count', 'state', 'city', 'created_at']
+    list_select_related = ['user', 'state']
+    autocomplete_fields = ['user', 'state']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     list_filter = ['house_type', 'state', 'income_range', 'created_at']
     search_fields = ['name', 'user__username', 'city']
     readonly_fields = ['id', 'created_at', 'updated_at']
@@ -35,43 +75,53 @@ class HouseholdAdmin(admin.ModelAdmin):
 
 @admin.register(EmissionFactor)
 class EmissionFactorAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'emission_factor', 'unit', 'is_active', 'created_at']
+    list_display = ['name', 'category', 'emission_factor', 'unit', 'valid_from', 'valid_to', 'is_active', 'created_at']
     list_filter = ['category', 'is_active']
     search_fields = ['name', 'source']
-    ordering = ['category', 'name']
+    ordering = ['category', 'name', 'valid_from']
     
 @admin.register(EnergyUsage)
-class EnergyUsageAdmin(admin.ModelAdmin):
+class EnergyUsageAdmin(LargeTableAdmin):
     list_display = ['household', 'energy_source', 'consumption', 'unit', 'month_year', 'emission_calculated']
     list_filter = ['energy_source', 'month_year', 'created_at']
     search_fields = ['household__name', 'household__user__username']
     readonly_fields = ['emission_calculated', 'created_at']
-    date_hierarchy = 'month_year'
 
 @admin.register(TransportUsage)
-class TransportUsageAdmin(admin.ModelAdmin):
+class TransportUsageAdmin(LargeTableAdmin):
     list_display = ['household', 'transport_mode', 'distance_km', 'frequency_per_month', 'month_year', 'emission_calculated']
     list_filter = ['transport_mode', 'month_year']
     search_fields = ['household__name']
     readonly_fields = ['emission_calculated', 'created_at']
-    date_hierarchy = 'month_year'
 
 @admin.register(DietEmission)
-class DietEmissionAdmin(admin.ModelAdmin):
+class DietEmissionAdmin(LargeTableAdmin):
     list_display = ['household', 'diet_type', 'frequency', 'food_waste_percentage', 'month_year', 'emission_calculated']
     list_filter = ['diet_type', 'frequency', 'month_year']
     search_fields = ['household__name']
     readonly_fields = ['emission_calculated', 'created_at']
-    date_hierarchy = 'month_year'
 
 @admin.register(MonthlyEmissionSummary)
-class MonthlyEmissionSummaryAdmin(admin.ModelAdmin):
+class MonthlyEmissionSummaryAdmin(LargeTableAdmin):
     list_display = ['household', 'month_year', 'total_emissions', 'per_capita_emissions', 'updated_at']
     list_filter = ['month_year']
     search_fields = ['household__name']
     readonly_fields = ['total_energy_emissions', 'total_transport_emissions', 'total_diet_emissions', 
                       'total_emissions', 'per_capita_emissions', 'created_at', 'updated_at']
-    date_hierarchy = 'month_year'
+
+@admin.register(EmissionSnapshot)
+class EmissionSnapshotAdmin(LargeTableAdmin):
+    list_display = ['household', 'month_year', 'members_count', 'total_emissions', 'per_capita_emissions']
+    list_filter = ['month_year']
+    search_fields = ['household__name']
+    readonly_fields = ['recorded_at', 'updated_at']
+
+@admin.register(YearlyEmissionRollup)
+class YearlyEmissionRollupAdmin(LargeTableAdmin):
+    list_display = ['household', 'year', 'months_count', 'total_emissions', 'per_capita_emissions']
+    list_filter = ['year']
+    search_fields = ['household__name']
+    readonly_fields = ['updated_at']
 
 @admin.register(EcoTip)
 class EcoTipAdmin(admin.ModelAdmin):
@@ -79,17 +129,70 @@ class EcoTipAdmin(admin.ModelAdmin):
     list_filter = ['category', 'is_active']
     search_fields = ['title', 'content']
     readonly_fields = ['created_at']
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Match through the full-text index instead of LIKE scans over content"""
+        if not search_term.strip():
+            return queryset, False
+        matches = search_tips(search_term, active_only=False, limit=ADMIN_SEARCH_LIMIT)
+        return queryset.filter(pk__in=[tip.pk for tip in matches]), False
 
 @admin.register(FuelPrice)
 class FuelPriceAdmin(admin.ModelAdmin):
     list_display = ['fuel_type', 'state', 'price', 'unit', 'date_recorded', 'source']
     list_filter = ['fuel_type', 'state', 'date_recorded']
     search_fields = ['state__name', 'source']
-    date_hierarchy = 'date_recorded'
     readonly_fields = ['created_at']
+    list_select_related = ['state']
+    autocomplete_fields = ['state']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(LatestFuelPrice)
+class LatestFuelPriceAdmin(admin.ModelAdmin):
+    list_display = ['fuel_type', 'state', 'price', 'unit', 'date_recorded', 'updated_at']
+    list_filter = ['fuel_type']
+    search_fields = ['state__name']
+    readonly_fields = ['updated_at']
+    list_select_related = ['state']
+    autocomplete_fields = ['state']
+
+@admin.register(UsageArchive)
+class UsageArchiveAdmin(admin.ModelAdmin):
+    list_display = ['table', 'cutoff', 'rows_archived', 'updated_at']
+    readonly_fields = ['table', 'cutoff', 'rows_archived', 'updated_at']
+
+@admin.register(WarehouseExport)
+class WarehouseExportAdmin(admin.ModelAdmin):
+    list_display = ['table', 'watermark', 'rows_exported', 'exported_at']
+    readonly_fields = ['table', 'watermark', 'rows_exported', 'last_file', 'exported_at']
+
+@admin.register(DigestLog)
+class DigestLogAdmin(LargeTableAdmin):
+    list_display = ['household', 'month_year', 'email', 'status', 'attempts', 'updated_at']
+    list_filter = ['month_year', 'status']
+    search_fields = ['household__name']
+    readonly_fields = ['household', 'month_year', 'email', 'status', 'attempts', 'error', 'updated_at']
+
+@admin.register(ApiKey)
+class ApiKeyAdmin(LargeTableAdmin):
+    list_display = ['prefix', 'household', 'name', 'scope', 'created_at', 'last_used_at', 'revoked_at']
+    list_filter = ['scope', 'revoked_at']
+    search_fields = ['prefix', 'household__name']
+    readonly_fields = ['household', 'prefix', 'key_hash', 'created_at', 'last_used_at', 'revoked_at']
+    actions = ['revoke']
+    
+    def has_add_permission(self, request):
+        # Keys are created from /api/keys/ or the create_api_key command, which show the key once
+        return False
+    
+    @admin.action(description='Revoke selected API keys')
+    def revoke(self, request, queryset):
+        for api_key in queryset:
+            revoke_key(api_key)
 
 @admin.register(UserGoal)
-class UserGoalAdmin(admin.ModelAdmin):
+class UserGoalAdmin(LargeTableAdmin):
     list_display = ['household', 'goal_type', 'target_reduction_percentage', 'target_date', 'is_active']
     list_filter = ['goal_type', 'is_active', 'target_date']
     search_fields = ['household__name']
@@ -0,0 +1,168 @@
+"""Cost and emissions analytics joining usage with the fuel price series.
+
+Usage rows and monthly average prices are loaded into DataFrames and joined
+in one as-of merge per category: each row gets the price of its fuel in the
+household's state for the usage month, or the most recent earlier month when
+that month has no price. Missing costs are estimated from that price and the
+fuel the usage burns, and reported costs are kept where they exist.
+"""
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.db.models import Avg
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .archive import usage_records
+from .models import EnergyUsage, TransportUsage, FuelPrice, Household
+
+logger = logging.getLogger('tracker')
+
+CHUNK_SIZE = 20000
+
+# Usage source -> (priced fuel, priced units per consumed unit).
+# LPG is priced per 14.2 kg cylinder and consumption is recorded in kg.
+ENERGY_FUELS = {
+    'electricity': ('electricity', 1.0),
+    'lpg': ('lpg', 1 / 14.2),
+    'cng': ('cng', 1.0),
+}
+
+# Transport mode -> (priced fuel, litres or kg per km) at typical Indian mileage
+TRANSPORT_FUELS = {
+    'bike': ('petrol', 1 / 45),
+    'car_petrol': ('petrol', 1 / 15),
+    'car_diesel': ('diesel', 1 / 18),
+    'car_cng': ('cng', 1 / 22),
+}
+
+# category -> (model, source field, quantity fields, cost field, fuel map)
+CATEGORIES = {
+    'energy': (EnergyUsage, 'energy_source', ['consumption'], 'cost', ENERGY_FUELS),
+    'transport': (TransportUsage, 'transport_mode', ['distance_km', 'frequency_per_month'], 'fuel_cost', TRANSPORT_FUELS),
+}
+
+
+def monthly_prices(state_ids=None, end=None):
+    """Average price per (state, fuel, month) as a DataFrame sorted by month.
+
+    Usage is priced at its month or an earlier one, so prices after the
+    month of end are never needed.
+    """
+    prices = FuelPrice.objects.all()
+    if state_ids is not None:
+        prices = prices.filter(state_id__in=state_ids)
+    if end:
+        prices = prices.filter(date_recorded__lt=(end.replace(day=1) + timedelta(days=32)).replace(day=1))
+    rows = prices.annotate(month=TruncMonth('date_recorded')).values(
+        'state_id', 'fuel_type', 'month'
+    ).annotate(price=Avg('price')).order_by()
+    frame = pd.DataFrame.from_records(list(rows), columns=['state_id', 'fuel_type', 'month', 'price'])
+    frame['month'] = pd.to_datetime(frame['month'])
+    frame['price'] = pd.to_numeric(frame['price'], errors='coerce').astype(float)
+    return frame.dropna(subset=['price']).sort_values('month', kind='stable')
+
+
+def usage_frame(category, start=None, end=None, household_ids=None):
+    """Usage rows of a category with their fuel quantity, reported cost and emissions"""
+    _, source_field, quantity_fields, cost_field, _ = CATEGORIES[category]
+    columns = ['id', 'household_id', 'state_id', 'source', 'month', 'reported_cost', 'emissions', *quantity_fields]
+    # Includes rows moved to the Parquet archive when the range reaches them
+    rows = usage_records(
+        category,
+        ['id', 'household_id', 'household__state_id', source_field, 'month_year',
+         cost_field, 'emission_calculated', *quantity_fields],
+        start, end, household_ids, chunk_size=CHUNK_SIZE,
+    )
+    frame = pd.DataFrame.from_records(rows, columns=columns)
+
+    frame['month'] = pd.to_datetime(frame['month'])
+    frame['reported_cost'] = pd.to_numeric(frame['reported_cost'], errors='coerce').astype(float)
+    frame['emissions'] = pd.to_numeric(frame['emissions'], errors='coerce').astype(float).fillna(0.0)
+    frame['quantity'] = frame[quantity_fields].astype(float).prod(axis=1)
+    return frame.drop(columns=quantity_fields)
+
+
+def estimate_costs(category, start=None, end=None, household_ids=None, prices=None):
+    """Usage rows with estimated_cost and cost (reported, else estimated) columns"""
+    fuels = CATEGORIES[category][4]
+    usage = usage_frame(category, start, end, household_ids)
+    if prices is None:
+        prices = monthly_prices()
+
+    usage['fuel_type'] = usage['source'].map({source: fuel for source, (fuel, _) in fuels.items()})
+    usage['fuel_per_unit'] = usage['source'].map({source: ratio for source, (_, ratio) in fuels.items()})
+
+    priced = usage.dropna(subset=['fuel_type', 'state_id']).astype({'state_id': 'int64'})
+    if priced.empty or prices.empty:
+        usage['price'] = np.nan
+    else:
+        # Price of the usage month, or the latest month before it with a price
+        priced = pd.merge_asof(
+            priced.sort_values('month', kind='stable'), prices,
+            on='month', by=['state_id', 'fuel_type'], direction='backward',
+        )
+        usage = usage.merge(priced[['id', 'price']], on='id', how='left')
+
+    usage['estimated_cost'] = usage['quantity'] * usage['fuel_per_unit'] * usage['price']
+    usage['cost'] = usage['reported_cost'].fillna(usage['estimated_cost'])
+    usage['category'] = category
+    return usage
+
+
+def cost_intensity(start=None, end=None, household_ids=None):
+    """Cost, emissions and rupees per kg CO2 per household and category"""
+    state_ids = None
+    if household_ids is not None:
+        state_ids = set(Household.objects.filter(pk__in=household_ids).values_list('state_id', flat=True))
+    prices = monthly_prices(state_ids, end)
+    frames = [
+        estimate_costs(category, start, end, household_ids, prices=prices)
+        for category in CATEGORIES
+    ]
+    usage = pd.concat([frame for frame in frames if not frame.empty] or frames[:1], ignore_index=True)
+    if usage.empty:
+        return pd.DataFrame(columns=['household_id', 'category', 'cost', 'emissions', 'inr_per_kg_co2', 'estimated_share'])
+
+    usage['estimated'] = usage['reported_cost'].isna() & usage['estimated_cost'].notna()
+    usage['estimated_amount'] = usage['cost'].where(usage['estimated'], 0.0)
+    # Rows without any cost (e.g. public transport) don't count towards the rate
+    usage['costed_emissions'] = usage['emissions'].where(usage['cost'].notna(), 0.0)
+    metrics = usage.groupby(['household_id', 'category'], as_index=False).agg(
+        cost=('cost', 'sum'),
+        emissions=('emissions', 'sum'),
+        costed_emissions=('costed_emissions', 'sum'),
+        estimated_amount=('estimated_amount', 'sum'),
+    )
+    metrics['inr_per_kg_co2'] = (metrics['cost'] / metrics['costed_emissions']).where(metrics['costed_emissions'] > 0)
+    metrics['estimated_share'] = (metrics['estimated_amount'] / metrics['cost']).where(metrics['cost'] > 0, 0.0)
+    return metrics.drop(columns=['costed_emissions', 'estimated_amount'])
+
+
+def fill_missing_costs(start=None, end=None, batch_size=2000):
+    """Store estimated costs on usage rows without a reported cost"""
+    prices = monthly_prices()
+    filled = {}
+    now = timezone.now()
+    for category, (model, _, _, cost_field, _) in CATEGORIES.items():
+        usage = estimate_costs(category, start, end, prices=prices)
+        missing = usage[usage['reported_cost'].isna() & usage['estimated_cost'].notna()]
+        rows = [
+            model(pk=int(pk), updated_at=now, **{cost_field: Decimal(f'{value:.2f}')})
+            for pk, value in zip(missing['id'], missing['estimated_cost'])
+        ]
+        # Archived rows are not in the table and are left as they are. updated_at
+        # is set here as bulk_update() skips auto_now, for the warehouse export
+        filled[category] = model.objects.bulk_update(rows, [cost_field, 'updated_at'], batch_size=batch_size)
+    logger.info(f"Filled estimated costs: {filled}")
+    return filled
+
+
+def household_cost_intensity(household_id, start=None, end=None):
+    """cost_intensity rows of one household as dicts, missing values as None"""
+    metrics = cost_intensity(start, end, household_ids=[household_id])
+    metrics = metrics.astype(object).where(metrics.notna(), None)
+    return metrics.drop(columns='household_id').to_dict('records')
@@ -0,0 +1,150 @@
+"""API key authentication for integration clients.
+
+Keys look like ct_<prefix>_<secret>. The database keeps the prefix, to find
+the key, and an HMAC-SHA256 digest of the whole key under the project
+secret, to check it. Unlike a password hash this takes microseconds, which
+is safe because keys are long random strings rather than guessable
+passwords. Verified keys are kept in a small per-process LRU for
+CACHE_TTL seconds, so a busy client costs one dictionary lookup per request.
+Revoking a key drops it from this process's cache at once. Other processes
+stop accepting it within CACHE_TTL.
+"""
+import copy
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.permissions import SAFE_METHODS
+
+from .models import ApiKey
+
+API_KEYS_DEFAULTS = {
+    'CACHE_SIZE': 1024,
+    'CACHE_TTL': 60,
+}
+KEYWORD = 'Api-Key'
+KEY_PREFIX = 'ct'
+HASH_SALT = 'tracker.apikeys'
+
+
+def get_api_keys_setting(name):
+    configured = settings.CARBON_FOOTPRINT_SETTINGS.get('API_KEYS', {})
+    return configured.get(name, API_KEYS_DEFAULTS[name])
+
+
+def hash_key(key):
+    return salted_hmac(HASH_SALT, key, algorithm='sha256').hexdigest()
+
+
+def split_key(key):
+    """Prefix of a well-formed key, else None"""
+    parts = key.split('_', 2)
+    if len(parts) != 3 or parts[0] != KEY_PREFIX or not parts[1] or not parts[2]:
+        return None
+    return parts[1]
+
+
+def create_key(household, name, scope='read'):
+    """Create a key; returns (ApiKey, key). The key itself is never stored, so show it now."""
+    prefix = secrets.token_hex(6)
+    key = f'{KEY_PREFIX}_{prefix}_{secrets.token_urlsafe(32)}'
+    api_key = ApiKey.objects.create(household=household, name=name, prefix=prefix, key_hash=hash_key(key), scope=scope)
+    return api_key, key
+
+
+def revoke_key(api_key):
+    if api_key.revoked_at is None:
+        api_key.revoked_at = timezone.now()
+        api_key.save(update_fields=['revoked_at'])
+    key_cache.discard(api_key.pk)
+
+
+class KeyCache:
+    """LRU of verified keys: key digest -> (key id, scope, user, cached at)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[3] > get_api_keys_setting('CACHE_TTL'):
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return entry
+
+    def put(self, digest, key_id, scope, user):
+        with self._lock:
+            self._entries[digest] = (key_id, scope, user, time.monotonic())
+            self._entries.move_to_end(digest)
+            while len(self._entries) > get_api_keys_setting('CACHE_SIZE'):
+                self._entries.popitem(last=False)
+
+    def discard(self, key_id):
+        with self._lock:
+            for digest in [digest for digest, entry in self._entries.items() if entry[0] == key_id]:
+                del self._entries[digest]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+key_cache = KeyCache()
+
+
+class ApiKeyAuthentication(BaseAuthentication):
+    """Authorization: Api-Key <key>. Read-scoped keys may only make safe requests."""
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != KEYWORD.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid API key header.')
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid API key.')
+
+        digest = hash_key(key)
+        entry = key_cache.get(digest)
+        key_id, scope, user = entry[:3] if entry else self.verify(key, digest)
+
+        if scope != 'write' and request.method not in SAFE_METHODS:
+            raise exceptions.PermissionDenied('This API key is read-only.')
+        # Each request gets its own copy: views cache related objects on request.user
+        return copy.copy(user), key_id
+
+    def verify(self, key, digest):
+        prefix = split_key(key)
+        api_key = None
+        if prefix:
+            api_key = ApiKey.objects.select_related('household__user').filter(prefix=prefix).first()
+        if api_key is None or not hmac.compare_digest(api_key.key_hash, digest):
+            raise exceptions.AuthenticationFailed('Invalid API key.')
+        if api_key.revoked_at is not None:
+            raise exceptions.AuthenticationFailed('API key has been revoked.')
+        user = api_key.household.user
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        user._state.fields_cache = {}
+
+        # Written on cache misses only, so at most once per CACHE_TTL per process
+        ApiKey.objects.filter(pk=api_key.pk).update(last_used_at=timezone.now())
+        key_cache.put(digest, api_key.pk, api_key.scope, user)
+        return api_key.pk, api_key.scope, user
+
+    def authenticate_header(self, request):
+        return KEYWORD
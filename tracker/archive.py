@@ -0,0 +1,315 @@
+"""Cold storage of old usage rows in Parquet.
+
+Energy, transport and diet rows for months before a cutoff are moved out
+of their tables into Parquet files partitioned by year and state
+(<ARCHIVE DIR>/<table>/year=2019/state_id=7/*.parquet), in chunks of
+CHUNK_SIZE rows: each chunk is written, then deleted from the table.
+Monthly summaries are kept. UsageArchive records each table's cutoff;
+readers that ask for months before it (summary recalculation, analytics
+exports, emission recalculation) also read the archived partitions, which
+are pruned by year so only the years asked for are opened. Summary
+recalculation, which runs per row, checks a copy of the cutoffs kept for
+CUTOFF_CACHE_TTL seconds and skips months after them without a query.
+Cutoffs only move forward and old months, so a stale copy can only miss
+a run made elsewhere in the last few seconds. Archived copies
+of rows still in the table (a run that stopped between writing a chunk and
+deleting it) are skipped, so no row is counted twice.
+"""
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+
+import pandas as pd
+from django.conf import settings
+from django.db import models, transaction
+
+from .models import EnergyUsage, TransportUsage, DietEmission, UsageArchive
+from .tombstones import deletion_batch
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is in requirements.txt
+    pa = None
+
+logger = logging.getLogger('tracker')
+
+ARCHIVE_DEFAULTS = {
+    'DIR': None,
+    'HORIZON_MONTHS': 36,
+    'CHUNK_SIZE': 50000,
+}
+TABLES = {
+    'energy': EnergyUsage,
+    'transport': TransportUsage,
+    'diet': DietEmission,
+}
+PARTITION_COLUMNS = ['year', 'state_id']
+CUTOFF_CACHE_TTL = 60
+
+_cutoffs = None   # (loaded at, cutoffs)
+
+
+def get_archive_setting(name):
+    configured = settings.CARBON_FOOTPRINT_SETTINGS.get('ARCHIVE', {})
+    return configured.get(name, ARCHIVE_DEFAULTS[name])
+
+
+def table_dir(table):
+    root = get_archive_setting('DIR') or Path(settings.BASE_DIR) / 'archive'
+    return Path(root) / table
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError('pyarrow is required to read or write archived usage')
+
+
+def archive_columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def arrow_type(field):
+    if isinstance(field, models.ForeignKey):
+        return arrow_type(field.target_field)
+    if isinstance(field, models.UUIDField):
+        return pa.string()
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    if isinstance(field, (models.AutoField, models.BigAutoField, models.IntegerField)):
+        return pa.int64()
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    return pa.string()
+
+
+def arrow_schema(model):
+    fields = [pa.field(field.attname, arrow_type(field)) for field in model._meta.concrete_fields]
+    return pa.schema(fields + [pa.field('year', pa.int16()), pa.field('state_id', pa.int64())])
+
+
+def file_schema(model):
+    """Columns stored in each file; year and state_id are in the directory names"""
+    schema = arrow_schema(model)
+    for name in PARTITION_COLUMNS:
+        schema = schema.remove(schema.get_field_index(name))
+    return schema
+
+
+def partitioning():
+    return ds.partitioning(pa.schema([('year', pa.int16()), ('state_id', pa.int64())]), flavor='hive')
+
+
+def archive_cutoffs():
+    """Table -> first month still in the database, for archived tables.
+
+    Read from the database each time (it has a row per table): a cached copy
+    would miss cutoffs moved by archive runs in other processes.
+    """
+    return dict(UsageArchive.objects.values_list('table', 'cutoff'))
+
+
+def cached_archive_cutoffs():
+    """archive_cutoffs(), reloaded after CUTOFF_CACHE_TTL or when this process moves a cutoff"""
+    global _cutoffs
+    cached = _cutoffs
+    if cached is None or time.monotonic() - cached[0] > CUTOFF_CACHE_TTL:
+        cached = _cutoffs = (time.monotonic(), archive_cutoffs())
+    return cached[1]
+
+
+def invalidate_archive_cutoffs():
+    global _cutoffs
+    _cutoffs = None
+
+
+def is_archived(table, start):
+    """Whether a range starting at `start` (None: the beginning) reaches archived months"""
+    cutoff = archive_cutoffs().get(table)
+    return cutoff is not None and (start is None or start < cutoff)
+
+
+def _to_arrow(model, schema, rows):
+    columns = archive_columns(model)
+    data = {name: list(values) for name, values in zip(columns + ['state_id'], zip(*rows))}
+    data['household_id'] = [str(value) for value in data['household_id']]
+    data['year'] = [month.year for month in data['month_year']]
+    return pa.table(data, schema=schema)
+
+
+def archive_table(table, before, chunk_size=None):
+    """Move a table's rows for months before `before` to Parquet; returns rows moved"""
+    require_pyarrow()
+    model = TABLES[table]
+    chunk_size = chunk_size or get_archive_setting('CHUNK_SIZE')
+    schema = arrow_schema(model)
+    path = table_dir(table)
+    path.mkdir(parents=True, exist_ok=True)
+
+    # Record the cutoff first: until the move finishes readers look in both places
+    archive, _ = UsageArchive.objects.get_or_create(table=table, defaults={'cutoff': before})
+    if archive.cutoff < before:
+        archive.cutoff = before
+        archive.save(update_fields=['cutoff', 'updated_at'])
+
+    old_rows = model.objects.filter(month_year__lt=before).order_by('pk')
+    columns = archive_columns(model)
+    moved = 0
+    last_pk = 0
+    while True:
+        rows = list(old_rows.filter(pk__gt=last_pk).values_list(*columns, 'household__state_id')[:chunk_size])
+        if not rows:
+            break
+        pq.write_to_dataset(
+            _to_arrow(model, schema, rows), path, partition_cols=PARTITION_COLUMNS,
+            basename_template=f'{uuid.uuid4().hex}-{{i}}.parquet',
+            existing_data_behavior='overwrite_or_ignore',
+        )
+        # Rows are deleted only once their chunk is on disk; a crash in
+        # between leaves copies in both places, and readers skip the archived ones
+        with transaction.atomic(), deletion_batch('archived'):
+            old_rows.filter(pk__gt=last_pk, pk__lte=rows[-1][0]).delete()
+        last_pk = rows[-1][0]
+        moved += len(rows)
+        logger.info(f"Archived {moved} {table} usage rows")
+
+    UsageArchive.objects.filter(pk=archive.pk).update(rows_archived=models.F('rows_archived') + moved)
+    return moved
+
+
+def live_ids(table, start=None, end=None, household_ids=None):
+    """Ids of rows before the table's cutoff that are still in the database"""
+    cutoff = archive_cutoffs().get(table)
+    if cutoff is None:
+        return []
+    queryset = TABLES[table].objects.filter(month_year__lt=cutoff)
+    if start:
+        queryset = queryset.filter(month_year__gte=start)
+    if end:
+        queryset = queryset.filter(month_year__lte=end)
+    if household_ids is not None:
+        queryset = queryset.filter(household_id__in=household_ids)
+    return list(queryset.values_list('id', flat=True))
+
+
+def read_archive(table, start=None, end=None, household_ids=None, columns=None):
+    """Archived rows of a table between two months as a DataFrame (model column names).
+
+    Rows also still in the database are left out; database readers count those.
+    """
+    model = TABLES[table]
+    columns = list(columns or archive_columns(model) + ['state_id'])
+    path = table_dir(table)
+    # A run that found nothing to move leaves an empty directory
+    if pa is None or next(path.rglob('*.parquet'), None) is None:
+        return pd.DataFrame(columns=columns)
+
+    dataset = ds.dataset(path, format='parquet', partitioning=partitioning())
+    condition = None
+    filters = []
+    if start:
+        filters += [ds.field('year') >= start.year, ds.field('month_year') >= pa.scalar(start, pa.date32())]
+    if end:
+        filters += [ds.field('year') <= end.year, ds.field('month_year') <= pa.scalar(end, pa.date32())]
+    if household_ids is not None:
+        filters.append(ds.field('household_id').isin([str(household_id) for household_id in household_ids]))
+    in_database = live_ids(table, start, end, household_ids)
+    if in_database:
+        filters.append(~ds.field('id').isin(in_database))
+    for expression in filters:
+        condition = expression if condition is None else condition & expression
+
+    read_columns = columns if 'id' in columns else ['id'] + columns
+    frame = dataset.to_table(columns=read_columns, filter=condition).to_pandas()
+    frame = frame.drop_duplicates('id', keep='last')[columns]
+    if 'household_id' in frame:
+        frame['household_id'] = frame['household_id'].map(uuid.UUID)
+    return frame.reset_index(drop=True)
+
+
+def usage_records(table, fields, start=None, end=None, household_ids=None, chunk_size=2000):
+    """Tuples of `fields` for a table's rows in a range, from the database and the archive.
+
+    Fields are model attribute names; 'household__state_id' reads the
+    household's state (as it was when archived, for archived rows).
+    """
+    queryset = TABLES[table].objects.all()
+    if start:
+        queryset = queryset.filter(month_year__gte=start)
+    if end:
+        queryset = queryset.filter(month_year__lte=end)
+    if household_ids is not None:
+        queryset = queryset.filter(household_id__in=household_ids)
+    yield from queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+    if is_archived(table, start):
+        archived = [field.replace('household__state_id', 'state_id') for field in fields]
+        frame = read_archive(table, start, end, household_ids, archived)
+        yield from frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None)
+
+
+def archived_totals(household_id, month):
+    """Archived emissions of a household's month per table (empty for months in the database)"""
+    totals = {}
+    cutoffs = cached_archive_cutoffs()
+    if not any(month < cutoff for cutoff in cutoffs.values()):
+        return totals
+    for table in TABLES:
+        if table in cutoffs and month < cutoffs[table]:
+            frame = read_archive(table, month, month, [household_id], ['emission_calculated'])
+            totals[table] = float(frame['emission_calculated'].fillna(0).sum())
+    return totals
+
+
+def recalculate_archive(table, start=None, end=None):
+    """Recompute emissions of archived rows with current factors, rewriting changed partitions.
+
+    Returns the (household_id, month) pairs whose emissions changed.
+    """
+    path = table_dir(table)
+    if not is_archived(table, start) or not path.exists():
+        return set()
+    require_pyarrow()
+    model = TABLES[table]
+    schema = file_schema(model)
+    columns = archive_columns(model)
+    touched = set()
+
+    for partition in sorted(path.glob('year=*/state_id=*')):
+        year = int(partition.parent.name.split('=', 1)[1])
+        if (start and year < start.year) or (end and year > end.year):
+            continue
+        files = sorted(partition.glob('*.parquet'))
+        frame = ds.dataset(files, format='parquet', schema=schema).to_table().to_pandas()
+        frame = frame.drop_duplicates('id', keep='last')
+
+        changed = False
+        emissions = []
+        for row in frame[columns].itertuples(index=False):
+            usage = model(**row._asdict())
+            in_range = (not start or usage.month_year >= start) and (not end or usage.month_year <= end)
+            previous = usage.emission_calculated
+            if in_range:
+                usage.calculate_emissions()
+                if usage.emission_calculated != previous:
+                    changed = True
+                    touched.add((uuid.UUID(usage.household_id), usage.month_year))
+            emissions.append(usage.emission_calculated)
+        if not changed:
+            continue
+
+        frame['emission_calculated'] = emissions
+        replacement = partition / f'{uuid.uuid4().hex}-0.parquet'
+        temporary = replacement.with_suffix('.tmp')
+        pq.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False), temporary)
+        os.replace(temporary, replacement)
+        for old in files:
+            old.unlink()
+    return touched
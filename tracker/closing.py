@@ -0,0 +1,131 @@
+"""Month-end close: monthly summaries for every household.
+
+Summaries are otherwise created when a household opens its dashboard or
+saves data, so households that don't visit have none. Closing a month
+computes all of them with grouped aggregate queries (three per range of
+households rather than three per household) and writes them with bulk
+upserts. Ranges of households, split by id, are closed in parallel worker
+processes.
+
+Bulk writes skip the summary signals, so each range also updates the
+snapshots and goal progress and deletes the stored forecasts and
+recommendations those signals would have, in the same transaction. All of
+these live in the database rather than a worker's own cache, so every web
+process sees them. Dashboards pick up the new totals on their next load.
+"""
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.db.models import Sum
+
+from . import forecasting, goals, history, recommendations
+from .archive import TABLES, is_archived, read_archive
+from .models import Household, MonthlyEmissionSummary
+
+logger = logging.getLogger('tracker')
+
+DEFAULT_PARTITION_SIZE = 5000
+DEFAULT_WORKERS = 4
+BATCH_SIZE = 1000
+
+TOTAL_FIELDS = {
+    'energy': 'total_energy_emissions',
+    'transport': 'total_transport_emissions',
+    'diet': 'total_diet_emissions',
+}
+UPDATE_FIELDS = [*TOTAL_FIELDS.values(), 'total_emissions', 'per_capita_emissions', 'updated_at']
+
+
+def next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def household_ranges(month, partition_size=DEFAULT_PARTITION_SIZE):
+    """(first id, last id) of consecutive ranges of the households existing by the month's end"""
+    household_ids = list(
+        Household.objects.filter(created_at__date__lt=next_month(month)).order_by('id').values_list('id', flat=True)
+    )
+    return [
+        (household_ids[start], household_ids[min(start + partition_size, len(household_ids)) - 1])
+        for start in range(0, len(household_ids), partition_size)
+    ]
+
+
+def close_range(month, first_id, last_id):
+    """Compute and upsert the month's summaries of one household range; returns households closed"""
+    households = dict(Household.objects.filter(
+        id__gte=first_id, id__lte=last_id, created_at__date__lt=next_month(month)
+    ).values_list('id', 'members_count'))
+    totals = {household_id: dict.fromkeys(TOTAL_FIELDS, 0.0) for household_id in households}
+
+    for table, model in TABLES.items():
+        grouped = model.objects.filter(
+            household_id__gte=first_id, household_id__lte=last_id, month_year=month
+        ).values('household_id').annotate(total=Sum('emission_calculated')).order_by()
+        for row in grouped:
+            if row['household_id'] in totals:
+                totals[row['household_id']][table] += row['total'] or 0
+        if is_archived(table, month):
+            archived = read_archive(table, month, month, list(households), ['household_id', 'emission_calculated'])
+            for household_id, emissions in archived.groupby('household_id')['emission_calculated'].sum().items():
+                totals[household_id][table] += emissions
+
+    summaries = []
+    for household_id, members_count in households.items():
+        summary = MonthlyEmissionSummary(household_id=household_id, month_year=month)
+        for table, field in TOTAL_FIELDS.items():
+            setattr(summary, field, totals[household_id][table])
+        summary.total_emissions = sum(totals[household_id].values())
+        summary.per_capita_emissions = summary.total_emissions / members_count if members_count > 0 else 0
+        summaries.append(summary)
+
+    household_ids = list(households)
+    with transaction.atomic():
+        MonthlyEmissionSummary.objects.bulk_create(
+            summaries, batch_size=BATCH_SIZE, update_conflicts=True,
+            unique_fields=['household', 'month_year'], update_fields=UPDATE_FIELDS,
+        )
+        history.record_month(household_ids, month, BATCH_SIZE)
+        goals.record_month(household_ids, month)
+        forecasting.invalidate_forecasts(household_ids)
+        recommendations.invalidate_recommendations(household_ids)
+    return len(summaries)
+
+
+def _close_range_task(month, first_id, last_id):
+    started = time.perf_counter()
+    closed = close_range(month, first_id, last_id)
+    return closed, time.perf_counter() - started
+
+
+def close_month(month, workers=DEFAULT_WORKERS, partition_size=DEFAULT_PARTITION_SIZE, progress=None):
+    """Close a month for all households; returns (households closed, seconds)"""
+    started = time.perf_counter()
+    ranges = household_ranges(month, partition_size)
+    closed = 0
+
+    if workers <= 1 or len(ranges) <= 1:
+        for first_id, last_id in ranges:
+            count, seconds = _close_range_task(month, first_id, last_id)
+            closed += count
+            if progress:
+                progress(count, seconds)
+    else:
+        # Forked workers must open their own database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [pool.submit(_close_range_task, month, first_id, last_id) for first_id, last_id in ranges]
+            for future in as_completed(futures):
+                count, seconds = future.result()
+                closed += count
+                if progress:
+                    progress(count, seconds)
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Closed {month:%b %Y} for {closed} households in {elapsed:.1f}s")
+    return closed, elapsed
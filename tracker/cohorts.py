@@ -0,0 +1,211 @@
+"""Peer comparison against "households like mine".
+
+Households are grouped into cohorts by state, house type, household size band
+and income range. For each month the index keeps a sorted NumPy array of
+per-capita emissions per cohort, so a percentile rank is two binary searches.
+Month indexes are built with one query, updated in place when summaries or
+households change, and rebuilt after PEER_INDEX_TTL to pick up writes made by
+other processes. Builds run outside the registry lock, so post_save handlers
+never wait on the query; changes recorded during a build are replayed onto the
+new index before it is swapped in.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .models import MonthlyEmissionSummary
+
+logger = logging.getLogger('tracker')
+
+PEER_INDEX_TTL = 15 * 60
+MAX_MONTHS_LOADED = 24
+
+# (lowest, highest) members_count per band; None means unbounded
+MEMBER_BANDS = [
+    ('1', 1, 1),
+    ('2', 2, 2),
+    ('3-4', 3, 4),
+    ('5-6', 5, 6),
+    ('7+', 7, None),
+]
+
+
+def members_band(members_count):
+    for label, lowest, highest in MEMBER_BANDS:
+        if members_count >= lowest and (highest is None or members_count <= highest):
+            return label
+    return MEMBER_BANDS[0][0]
+
+
+def cohort_key(state_id, house_type, members_count, income_range):
+    return (state_id, house_type, members_band(members_count or 1), income_range or '')
+
+
+def household_cohort(household):
+    return cohort_key(household.state_id, household.house_type, household.members_count, household.income_range)
+
+
+class MonthIndex:
+    """Sorted per-capita emissions per cohort for a single month"""
+
+    def __init__(self, month):
+        self.month = month
+        self.built_at = time.monotonic()
+        self.cohorts = {}   # cohort key -> sorted np.ndarray
+        self.members = {}   # household id -> (cohort key, per-capita value)
+        self.states = {}    # state id -> [sum, count]
+
+    @classmethod
+    def build(cls, month):
+        index = cls(month)
+        rows = MonthlyEmissionSummary.objects.filter(month_year=month).values_list(
+            'household_id', 'per_capita_emissions', 'household__state_id',
+            'household__house_type', 'household__members_count', 'household__income_range'
+        )
+        grouped = {}
+        for household_id, value, state_id, house_type, members_count, income_range in rows.iterator(chunk_size=10000):
+            key = cohort_key(state_id, house_type, members_count, income_range)
+            grouped.setdefault(key, []).append(value)
+            index.members[household_id] = (key, value)
+            index._add_state(state_id, value)
+        index.cohorts = {key: np.sort(np.asarray(values, dtype=np.float64)) for key, values in grouped.items()}
+        return index
+
+    def _add_state(self, state_id, value, sign=1):
+        totals = self.states.setdefault(state_id, [0.0, 0])
+        totals[0] += sign * value
+        totals[1] += sign
+
+    def remove(self, household_id):
+        entry = self.members.pop(household_id, None)
+        if entry is None:
+            return
+        key, value = entry
+        values = self.cohorts.get(key)
+        if values is not None:
+            position = np.searchsorted(values, value)
+            if position < len(values) and values[position] == value:
+                self.cohorts[key] = np.delete(values, position)
+        self._add_state(key[0], value, sign=-1)
+
+    def upsert(self, household_id, key, value):
+        self.remove(household_id)
+        values = self.cohorts.get(key, np.empty(0))
+        self.cohorts[key] = np.insert(values, np.searchsorted(values, value), value)
+        self.members[household_id] = (key, value)
+        self._add_state(key[0], value)
+
+    def percentile(self, household_id):
+        """Percentile rank of a household within its cohort (lower means fewer emissions than peers)"""
+        entry = self.members.get(household_id)
+        if entry is None:
+            return None, 0
+        key, value = entry
+        values = self.cohorts[key]
+        below = np.searchsorted(values, value, side='left')
+        equal = np.searchsorted(values, value, side='right') - below
+        return float((below + 0.5 * equal) / len(values) * 100), len(values)
+
+    def state_average(self, state_id):
+        total, count = self.states.get(state_id, (0.0, 0))
+        return total / count if count else None
+
+    def apply(self, change):
+        """Apply a change recorded by PeerIndex"""
+        kind, household_id, key, value = change
+        if kind == 'removed':
+            self.remove(household_id)
+        elif kind == 'summary':
+            self.upsert(household_id, key, value)
+        else:
+            entry = self.members.get(household_id)
+            if entry is not None and entry[0] != key:
+                self.upsert(household_id, key, entry[1])
+
+
+class PeerIndex:
+    """Process-wide registry of month indexes"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._months = OrderedDict()
+        self._builds = {}   # month -> changes logged for each build in progress
+
+    def get(self, month):
+        with self._lock:
+            index = self._months.get(month)
+            if index is not None and time.monotonic() - index.built_at <= PEER_INDEX_TTL:
+                self._months.move_to_end(month)
+                return index
+            changes = []
+            self._builds.setdefault(month, []).append(changes)
+
+        index = None
+        try:
+            index = MonthIndex.build(month)
+        finally:
+            with self._lock:
+                builds = self._builds[month]
+                builds.remove(changes)
+                if not builds:
+                    del self._builds[month]
+                if index is not None:
+                    for change in changes:
+                        index.apply(change)
+                    self._months[month] = index
+                    self._months.move_to_end(month)
+                    while len(self._months) > MAX_MONTHS_LOADED:
+                        self._months.popitem(last=False)
+        logger.info(f"Built peer index for {month:%b %Y} ({len(index.members)} households)")
+        return index
+
+    def _record(self, change, months=None):
+        with self._lock:
+            if months is None:
+                months = set(self._months) | set(self._builds)
+            for month in months:
+                index = self._months.get(month)
+                if index is not None:
+                    index.apply(change)
+                for changes in self._builds.get(month, ()):
+                    changes.append(change)
+
+    def record_summary(self, summary, deleted=False):
+        """Apply a summary change to the month's index if it is loaded or being built"""
+        if deleted:
+            change = ('removed', summary.household_id, None, None)
+        else:
+            change = ('summary', summary.household_id, household_cohort(summary.household), summary.per_capita_emissions)
+        self._record(change, [summary.month_year])
+
+    def record_household(self, household):
+        """Move a household to its new cohort in every loaded month"""
+        self._record(('household', household.pk, household_cohort(household), None))
+
+    def clear(self):
+        with self._lock:
+            self._months.clear()
+
+
+peer_index = PeerIndex()
+
+
+def compare_household(household, month, national_average):
+    """Comparison data for a household's per-capita emissions in a month"""
+    index = peer_index.get(month)
+    entry = index.members.get(household.pk)
+    if entry is None:
+        return None
+    per_capita = entry[1]
+    rank_percentile, cohort_size = index.percentile(household.pk)
+    return {
+        'household_emissions': per_capita,
+        'national_average': national_average,
+        'state_average': index.state_average(household.state_id) if household.state_id else None,
+        'comparison_percentage': (per_capita / national_average * 100) if national_average > 0 else 0,
+        'rank_percentile': rank_percentile,
+        'cohort_size': cohort_size,
+    }
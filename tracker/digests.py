@@ -0,0 +1,232 @@
+"""Monthly footprint digest emails.
+
+Recipients and everything their digest shows come from one query over the
+month's summaries, streamed in chunks. Each chunk is rendered and handed to
+send_messages() on a single connection that stays open for the whole run.
+When sending fails part-way through a chunk, the messages before the
+failing one have gone out. The connection is reopened and sending resumes
+at the failing message, which is retried up to MAX_ATTEMPTS times before it
+is marked failed. DigestLog records every household sent to, so a re-run
+(after a crash, or to retry failures) skips households already sent their
+digest for the month.
+"""
+import logging
+import smtplib
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Exists, OuterRef, Subquery
+from django.template.loader import get_template
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import DigestLog, MonthlyEmissionSummary
+
+logger = logging.getLogger('tracker')
+
+DIGEST_DEFAULTS = {
+    'SITE_URL': 'http://127.0.0.1:8000',
+    'CHUNK_SIZE': 500,
+    'MAX_ATTEMPTS': 3,
+    'RETRY_DELAY': 5,
+}
+TEXT_TEMPLATE = 'tracker/email/monthly_digest.txt'
+HTML_TEMPLATE = 'tracker/email/monthly_digest.html'
+RECIPIENT_FIELDS = (
+    'household_id', 'household__name', 'household__user__email', 'household__user__first_name',
+    'household__user__username', 'total_energy_emissions', 'total_transport_emissions',
+    'total_diet_emissions', 'total_emissions', 'per_capita_emissions', 'previous_total',
+)
+# Errors retrying won't fix: the message is marked failed straight away
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused,)
+LOG_UPDATE_FIELDS = ['email', 'status', 'attempts', 'error', 'updated_at']
+
+
+def get_digest_setting(name):
+    configured = settings.CARBON_FOOTPRINT_SETTINGS.get('DIGEST', {})
+    return configured.get(name, DIGEST_DEFAULTS[name])
+
+
+def previous_month(month):
+    return (month.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+
+def digest_recipients(month):
+    """Rows (RECIPIENT_FIELDS) of households with emissions in the month and no digest sent yet"""
+    previous_total = MonthlyEmissionSummary.objects.filter(
+        household_id=OuterRef('household_id'), month_year=previous_month(month)
+    ).values('total_emissions')[:1]
+    already_sent = DigestLog.objects.filter(household_id=OuterRef('household_id'), month_year=month, status='sent')
+    return (
+        MonthlyEmissionSummary.objects
+        .filter(month_year=month, total_emissions__gt=0, household__user__is_active=True)
+        .exclude(household__user__email='')
+        .annotate(previous_total=Subquery(previous_total))
+        .filter(~Exists(already_sent))
+        .order_by('household_id')
+        .values(*RECIPIENT_FIELDS)
+    )
+
+
+class DigestRenderer:
+    """Renders digest messages with templates compiled once per run"""
+
+    def __init__(self, month):
+        self.month = month
+        self.text_template = get_template(TEXT_TEMPLATE)
+        self.html_template = get_template(HTML_TEMPLATE)
+        site_url = get_digest_setting('SITE_URL').rstrip('/')
+        averages = settings.CARBON_FOOTPRINT_SETTINGS['AVERAGE_INDIAN_EMISSIONS']
+        self.common = {
+            'month': month,
+            'national_per_capita': averages['per_capita_yearly'] / 12,
+            'dashboard_url': site_url + reverse('dashboard'),
+            'statement_url': f"{site_url}{reverse('download_statement')}?year={month.year}",
+        }
+        self.subject = f'Your carbon footprint for {month:%B %Y}'
+
+    def context(self, row):
+        previous = row['previous_total']
+        change = (row['total_emissions'] - previous) / previous * 100 if previous else None
+        return {
+            **self.common,
+            'name': row['household__user__first_name'] or row['household__user__username'],
+            'household': row['household__name'],
+            'energy': row['total_energy_emissions'],
+            'transport': row['total_transport_emissions'],
+            'diet': row['total_diet_emissions'],
+            'total': row['total_emissions'],
+            'per_capita': row['per_capita_emissions'],
+            'change': change,
+            'change_abs': abs(change) if change is not None else None,
+            'comparison': row['per_capita_emissions'] / self.common['national_per_capita'] * 100,
+        }
+
+    def render(self, row, connection=None):
+        context = self.context(row)
+        message = EmailMultiAlternatives(
+            self.subject, self.text_template.render(context), None, [row['household__user__email']],
+            connection=connection,
+        )
+        message.attach_alternative(self.html_template.render(context), 'text/html')
+        return message
+
+
+class _Tracked:
+    """Iterable over messages remembering how many send_messages() has taken.
+
+    Backends send messages in order and raise on the first failure, so when
+    send_messages() raises, the last message taken is the one that failed.
+    """
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.taken = 0
+
+    def __iter__(self):
+        for message in self.messages:
+            self.taken += 1
+            yield message
+
+    def __bool__(self):
+        return bool(self.messages)
+
+
+def send_chunk(connection, messages, results, max_attempts=None, retry_delay=None):
+    """Send messages over a connection, reconnecting and resuming after failures.
+
+    Fills results with {message index: (status, attempts, error)} as it
+    goes, so the caller can record what was sent even if it raises.
+    """
+    max_attempts = max_attempts or get_digest_setting('MAX_ATTEMPTS')
+    retry_delay = get_digest_setting('RETRY_DELAY') if retry_delay is None else retry_delay
+    attempts = {}
+    reconnects = 0
+    position = 0
+    while position < len(messages):
+        tracked = _Tracked(messages[position:])
+        try:
+            connection.open()
+            connection.send_messages(tracked)
+        except (smtplib.SMTPException, OSError) as error:
+            permanent = isinstance(error, PERMANENT_ERRORS)
+            if not permanent:
+                _close_quietly(connection)
+            if not tracked.taken:
+                # The connection could not be opened
+                reconnects += 1
+                if reconnects >= max_attempts:
+                    raise
+                time.sleep(retry_delay * 2 ** (reconnects - 1))
+                continue
+            failed = position + tracked.taken - 1
+            for index in range(position, failed):
+                results[index] = ('sent', attempts.get(index, 0) + 1, '')
+            attempts[failed] = attempts.get(failed, 0) + 1
+            logger.warning(f"Digest to {messages[failed].to[0]} failed (attempt {attempts[failed]}): {error}")
+            if permanent or attempts[failed] >= max_attempts:
+                results[failed] = ('failed', attempts[failed], str(error)[:500])
+                position = failed + 1
+            else:
+                position = failed
+                time.sleep(retry_delay * 2 ** (attempts[failed] - 1))
+        else:
+            for index in range(position, len(messages)):
+                results[index] = ('sent', attempts.get(index, 0) + 1, '')
+            break
+    return results
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except (smtplib.SMTPException, OSError):
+        pass
+
+
+def record_results(month, rows, results):
+    """Upsert the DigestLog rows of the messages that were sent or gave up on"""
+    now = timezone.now()
+    logs = []
+    for index, (status, attempts, error) in results.items():
+        row = rows[index]
+        logs.append(DigestLog(
+            household_id=row['household_id'], month_year=month, email=row['household__user__email'],
+            status=status, attempts=attempts, error=error, updated_at=now,
+        ))
+    DigestLog.objects.bulk_create(
+        logs, update_conflicts=True, unique_fields=['household', 'month_year'], update_fields=LOG_UPDATE_FIELDS,
+    )
+
+
+def send_digests(month, chunk_size=None, connection=None, progress=None):
+    """Send the month's digest to every household not sent it yet; returns (sent, failed, seconds)"""
+    started = time.perf_counter()
+    chunk_size = chunk_size or get_digest_setting('CHUNK_SIZE')
+    renderer = DigestRenderer(month)
+    connection = connection or get_connection(fail_silently=False)
+    sent = failed = 0
+
+    rows = digest_recipients(month).iterator(chunk_size=chunk_size)
+    try:
+        while chunk := list(islice(rows, chunk_size)):
+            messages = [renderer.render(row, connection) for row in chunk]
+            results = {}
+            try:
+                send_chunk(connection, messages, results)
+            finally:
+                record_results(month, chunk, results)
+            chunk_failed = sum(1 for status, _, _ in results.values() if status == 'failed')
+            sent += len(chunk) - chunk_failed
+            failed += chunk_failed
+            if progress:
+                progress(sent, failed)
+    finally:
+        _close_quietly(connection)
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Sent {sent} {month:%b %Y} digests ({failed} failed) in {elapsed:.1f}s")
+    return sent, failed, elapsed
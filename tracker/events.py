@@ -0,0 +1,245 @@
+"""Live dashboard updates pushed to browsers as server-sent events"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('tracker')
+
+EVENT_DEFAULTS = {
+    'BACKEND': 'tracker.events.InProcessBackend',
+    'COALESCE_SECONDS': 0.5,
+    'KEEPALIVE_SECONDS': 15,
+    'MAX_STREAM_SECONDS': 300,
+    'REDIS_URL': 'redis://localhost:6379/1',
+    'REDIS_CHANNEL_PREFIX': 'carbontrack:',
+}
+
+
+def get_event_setting(name):
+    """Read a setting from CARBON_FOOTPRINT_SETTINGS['EVENTS'] with a fallback default"""
+    overrides = settings.CARBON_FOOTPRINT_SETTINGS.get('EVENTS', {})
+    return overrides.get(name, EVENT_DEFAULTS[name])
+
+
+def household_channel(household_id):
+    return f'household:{household_id}'
+
+
+def fuel_channel(state_id):
+    return f'fuel:{state_id}'
+
+
+class Subscription:
+    """A connected client listening on a set of channels.
+
+    Events carry a ``key``; a newer event replaces a pending one with the same
+    key, so a burst of saves for the same month reaches the client only once.
+    """
+
+    def __init__(self, channels, coalesce_seconds):
+        self.channels = list(channels)
+        self.coalesce_seconds = coalesce_seconds
+        self.closed = False
+        self._loop = asyncio.get_running_loop()
+        self._pending = OrderedDict()
+        self._ready = asyncio.Event()
+
+    def deliver(self, event):
+        """Queue an event; safe to call from any thread"""
+        if self.closed:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._push, event)
+        except RuntimeError:
+            # Event loop already shut down
+            self.closed = True
+
+    def _push(self, event):
+        key = event.get('key') or id(event)
+        self._pending.pop(key, None)
+        self._pending[key] = event
+        self._ready.set()
+
+    async def next_batch(self, timeout=None):
+        """Wait for events and return everything that arrived within the coalescing window"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        if self.coalesce_seconds:
+            await asyncio.sleep(self.coalesce_seconds)
+        batch = list(self._pending.values())
+        self._pending.clear()
+        self._ready.clear()
+        return batch
+
+
+class InProcessBackend:
+    """Pub/sub between publishers and subscribers living in the same process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def publish(self, channel, event):
+        self._fan_out(channel, event)
+
+    def _fan_out(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+    async def subscribe(self, channels):
+        subscription = Subscription(channels, get_event_setting('COALESCE_SECONDS'))
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions[channel].add(subscription)
+        return subscription
+
+    async def unsubscribe(self, subscription):
+        subscription.closed = True
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscriptions.get(channel)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[channel]
+
+
+class RedisBackend(InProcessBackend):
+    """Pub/sub relayed through Redis so every worker process sees every event.
+
+    Each process keeps one pattern subscription to Redis and fans messages out
+    to its local subscriptions.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.url = get_event_setting('REDIS_URL')
+        self.prefix = get_event_setting('REDIS_CHANNEL_PREFIX')
+        self._client = None
+        self._listener = None
+
+    def publish(self, channel, event):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url)
+        self._client.publish(self.prefix + channel, json.dumps(event))
+
+    async def subscribe(self, channels):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return await super().subscribe(channels)
+
+    async def _listen(self):
+        import redis.asyncio as aioredis
+
+        while True:
+            try:
+                client = aioredis.from_url(self.url)
+                pubsub = client.pubsub()
+                await pubsub.psubscribe(f'{self.prefix}*')
+                async for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    channel = message['channel'].decode()[len(self.prefix):]
+                    self._fan_out(channel, json.loads(message['data']))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis event listener failed, reconnecting: {e}")
+                await asyncio.sleep(1)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the configured event backend, creating it on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(get_event_setting('BACKEND'))()
+    return _backend
+
+
+def publish(channel, event):
+    """Publish an event without ever failing the caller"""
+    try:
+        get_backend().publish(channel, event)
+    except Exception as e:
+        logger.error(f"Error publishing event to {channel}: {e}")
+
+
+def summary_event(summary):
+    """Build the event sent when a monthly summary changes"""
+    return {
+        'type': 'summary',
+        'key': f'summary:{summary.month_year.isoformat()}',
+        'data': {
+            'month_year': summary.month_year.isoformat(),
+            'month_label': summary.month_year.strftime('%b %Y'),
+            'total_energy_emissions': summary.total_energy_emissions,
+            'total_transport_emissions': summary.total_transport_emissions,
+            'total_diet_emissions': summary.total_diet_emissions,
+            'total_emissions': summary.total_emissions,
+            'per_capita_emissions': summary.per_capita_emissions,
+        },
+    }
+
+
+def fuel_price_event(fuel_price):
+    """Build the event sent when a fuel price is recorded"""
+    date_recorded = fuel_price.date_recorded
+    if isinstance(date_recorded, datetime):
+        # Unsaved default of timezone.now
+        date_recorded = date_recorded.date()
+    return {
+        'type': 'fuel_price',
+        'key': f'fuel_price:{fuel_price.fuel_type}',
+        'data': {
+            'fuel_type': fuel_price.fuel_type,
+            'fuel_type_display': fuel_price.get_fuel_type_display(),
+            'price': str(fuel_price.price),
+            'unit': fuel_price.unit,
+            'date_recorded': date_recorded.isoformat(),
+        },
+    }
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+async def event_stream(channels):
+    """Yield server-sent events for the given channels.
+
+    The stream ends after MAX_STREAM_SECONDS so abandoned connections are
+    released; EventSource reconnects on its own.
+    """
+    backend = get_backend()
+    subscription = await backend.subscribe(channels)
+    keepalive = get_event_setting('KEEPALIVE_SECONDS')
+    deadline = time.monotonic() + get_event_setting('MAX_STREAM_SECONDS')
+    try:
+        yield 'retry: 3000\n\n'
+        while time.monotonic() < deadline:
+            batch = await subscription.next_batch(timeout=keepalive)
+            if not batch:
+                yield ': keepalive\n\n'
+            for event in batch:
+                yield format_sse(event)
+    finally:
+        await backend.unsubscribe(subscription)
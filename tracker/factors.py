@@ -0,0 +1,88 @@
+"""As-of lookups of time-versioned emission factors.
+
+All active factors are held in memory as sorted validity intervals per
+(category, source key); resolving the factor for a usage month is a bisect,
+not a query. Where versions overlap, the latest one started that still covers
+the month applies. The index is rebuilt when a factor is saved or deleted in this
+process and after FACTOR_INDEX_TTL to pick up changes made elsewhere.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_right
+from collections import defaultdict
+
+from .models import EmissionFactor
+
+logger = logging.getLogger('tracker')
+
+FACTOR_INDEX_TTL = 5 * 60
+
+
+class FactorIndex:
+    """Validity intervals of emission factors keyed by (category, source key)"""
+
+    def __init__(self, factors):
+        grouped = defaultdict(list)
+        for factor in factors:
+            grouped[(factor.category, factor.source_key)].append(
+                (factor.valid_from, factor.valid_to, factor.emission_factor)
+            )
+        self._starts = {}
+        self._intervals = {}
+        for key, intervals in grouped.items():
+            intervals.sort(key=lambda interval: interval[0])
+            self._starts[key] = [valid_from for valid_from, _, _ in intervals]
+            self._intervals[key] = [(valid_to, value) for _, valid_to, value in intervals]
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def load(cls):
+        return cls(EmissionFactor.objects.filter(is_active=True).only(
+            'category', 'name', 'emission_factor', 'valid_from', 'valid_to'
+        ))
+
+    def resolve(self, category, source, month):
+        """Factor valid for a source in a month, or None.
+
+        Sources are matched on the factor name as a key ('car_petrol' matches
+        'Car Petrol'), falling back to the part before the first underscore.
+        """
+        for candidate in dict.fromkeys((source, source.split('_')[0])):
+            key = (category, candidate)
+            starts = self._starts.get(key)
+            if not starts:
+                continue
+            intervals = self._intervals[key]
+            # Step back past later versions that have already ended
+            for position in range(bisect_right(starts, month) - 1, -1, -1):
+                valid_to, value = intervals[position]
+                if valid_to is None or month < valid_to:
+                    return value
+        return None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_factor_index():
+    global _index
+    index = _index
+    if index is None or time.monotonic() - index.built_at > FACTOR_INDEX_TTL:
+        with _index_lock:
+            if _index is None or time.monotonic() - _index.built_at > FACTOR_INDEX_TTL:
+                _index = FactorIndex.load()
+            index = _index
+    return index
+
+
+def invalidate_factor_index():
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def resolve_factor(category, source, month):
+    """Emission factor (kg CO2 per unit) for a source as of a month"""
+    return get_factor_index().resolve(category, source, month)
@@ -0,0 +1,205 @@
+"""Shared HTTP client for the scrapers.
+
+One requests Session with pooled connections per host, timeouts and retries
+with exponential backoff. Responses carrying an ETag or Last-Modified header
+are kept in an on-disk cache keyed by URL and revalidated with conditional
+GETs, so a source that hasn't changed costs a 304 and the scraper can skip
+parsing it. A fetched page's validators are only stored once the caller
+commits the result after saving its data, so a page that failed to ingest
+is fetched in full again next time instead of being answered with a 304.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger('tracker')
+
+SCRAPER_DEFAULTS = {
+    'CACHE_DIR': None,
+    'CONNECT_TIMEOUT': 5,
+    'READ_TIMEOUT': 20,
+    'RETRIES': 3,
+    'BACKOFF_FACTOR': 0.5,
+    'POOL_CONNECTIONS': 10,
+    'POOL_MAXSIZE': 10,
+    'USER_AGENT': 'CarbonTrack/1.0 (+https://github.com/Krishit-Shah/carbontrack)',
+    'SOURCES': {},
+    'SPECS': {},
+    'PARSER': None,
+}
+
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+def get_scraper_setting(name):
+    configured = settings.CARBON_FOOTPRINT_SETTINGS.get('SCRAPER', {})
+    return configured.get(name, SCRAPER_DEFAULTS[name])
+
+
+class FetchResult:
+    """Body and metadata of a fetched URL"""
+
+    def __init__(self, url, status, content, headers, encoding=None, not_modified=False, on_commit=None):
+        self.url = url
+        self.status = status
+        self.content = content
+        self.headers = headers
+        self.encoding = encoding or 'utf-8'
+        self.not_modified = not_modified
+        self._on_commit = on_commit
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors='replace')
+
+    @property
+    def changed(self):
+        return not self.not_modified
+
+    def commit(self):
+        """Cache the response's validators; call once its data has been saved"""
+        if self._on_commit:
+            self._on_commit()
+            self._on_commit = None
+
+
+class ResponseCache:
+    """On-disk cache of response bodies and validators, one pair of files per URL"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return self.directory / f'{key}.json', self.directory / f'{key}.body'
+
+    def get(self, url):
+        """(metadata, body) of a cached response, or None"""
+        meta_path, body_path = self._paths(url)
+        try:
+            meta = json.loads(meta_path.read_text(encoding='utf-8'))
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != url:
+            return None
+        return meta, body
+
+    def set(self, url, response):
+        meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'encoding': response.encoding,
+            'fetched_at': time.time(),
+        }
+        meta_path, body_path = self._paths(url)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Body first, so metadata never points at a missing or partial body
+        self._write(body_path, response.content)
+        self._write(meta_path, json.dumps(meta).encode('utf-8'))
+
+    def delete(self, url):
+        for path in self._paths(url):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _write(self, path, data):
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(handle, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+class HttpClient:
+    """Pooled, retrying HTTP client with conditional GETs against a response cache"""
+
+    def __init__(self, cache_dir=None, timeout=None, retries=None, backoff_factor=None,
+                 pool_connections=None, pool_maxsize=None, user_agent=None):
+        cache_dir = cache_dir or get_scraper_setting('CACHE_DIR') or Path(settings.BASE_DIR) / 'scraper_cache'
+        self.cache = ResponseCache(cache_dir)
+        self.timeout = timeout or (get_scraper_setting('CONNECT_TIMEOUT'), get_scraper_setting('READ_TIMEOUT'))
+
+        retry = Retry(
+            total=get_scraper_setting('RETRIES') if retries is None else retries,
+            backoff_factor=get_scraper_setting('BACKOFF_FACTOR') if backoff_factor is None else backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=['GET', 'HEAD'],
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        # pool_connections is the number of hosts kept pooled, pool_maxsize
+        # the connections kept open per host
+        adapter = HTTPAdapter(
+            max_retries=retry,
+            pool_connections=pool_connections or get_scraper_setting('POOL_CONNECTIONS'),
+            pool_maxsize=pool_maxsize or get_scraper_setting('POOL_MAXSIZE'),
+        )
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'User-Agent': user_agent or get_scraper_setting('USER_AGENT')})
+
+    def fetch(self, url, revalidate=True):
+        """GET a URL, answering from the cache when the server reports it unchanged.
+
+        A changed response is only cached when the result is committed.
+        Raises requests.RequestException when the request fails after retries
+        or the server answers with an error status.
+        """
+        cached = self.cache.get(url) if revalidate else None
+        headers = {}
+        if cached:
+            meta = cached[0]
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached:
+            meta, body = cached
+            logger.info(f"Not modified: {url}")
+            return FetchResult(url, 304, body, response.headers, meta.get('encoding'), not_modified=True)
+
+        response.raise_for_status()
+        # The cached copy is stale either way
+        self.cache.delete(url)
+        on_commit = None
+        if response.headers.get('ETag') or response.headers.get('Last-Modified'):
+            on_commit = lambda: self.cache.set(url, response)
+        return FetchResult(
+            url, response.status_code, response.content, response.headers, response.encoding, on_commit=on_commit,
+        )
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide client shared by all scrapers"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
@@ -0,0 +1,200 @@
+"""Sparse fieldsets and values()-based list serialization for the API.
+
+GET requests may pass ?fields=month_year,total_emissions to get only those
+fields. The query is narrowed to match: .only() the columns the fields read,
+and select_related for nested serializers (which previously cost a query
+per row), or no join at all when the nested fields are left out.
+
+List actions skip ModelSerializer instances altogether. A RowPlan compiled
+once from the serializer's fields reads the page with values() and builds
+each row's dict, nested dicts included, with the same field
+to_representation calls, so the output is what the serializer would
+return. Serializers with fields a plan can't read (method fields, dotted
+sources, related fields not nested as model serializers) fall back to the
+regular path.
+"""
+from datetime import date
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+FIELDS_PARAM = 'fields'
+PLAN_CACHE_SIZE = 256
+
+
+def requested_fields(request):
+    """Field names from ?fields=, or None for all fields"""
+    value = request.query_params.get(FIELDS_PARAM)
+    if not value:
+        return None
+    return tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+
+
+class SparseFieldsMixin:
+    """ModelSerializer taking fields=(...) to limit the fields it outputs"""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is None:
+            return
+        readable = [name for name, field in self.fields.items() if not field.write_only]
+        unknown = [name for name in fields if name not in readable]
+        if unknown:
+            raise ValidationError({FIELDS_PARAM: [f"Unknown field: {name}" for name in unknown]})
+        # Write-only fields stay, they never appear in the output anyway
+        for name in readable:
+            if name not in fields:
+                self.fields.pop(name)
+
+
+class Unsupported(Exception):
+    """The serializer has a field a RowPlan can't read from values()"""
+
+
+def iso_datetime(timezone_):
+    """DateTimeField.to_representation in ISO 8601, with the time zone looked up once"""
+    def to_representation(value):
+        value = value.astimezone(timezone_).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return to_representation
+
+
+def fast_converter(field, timezone_):
+    """A cheaper equivalent of field.to_representation for non-null values, where there is one"""
+    if isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        if output_format and output_format.lower() == ISO_8601 and timezone_ and not hasattr(field, 'timezone'):
+            return iso_datetime(timezone_)
+    elif isinstance(field, serializers.DateField):
+        output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+        if output_format and output_format.lower() == ISO_8601:
+            return date.isoformat
+    elif type(field) is serializers.FloatField:
+        return float
+    return field.to_representation
+
+
+class RowPlan:
+    """How to build a serializer's output dicts from values() rows"""
+
+    def __init__(self, serializer, prefix=''):
+        self.entries = []
+        self.paths = []
+        self.related = []
+        model = serializer.Meta.model
+        for field in serializer._readable_fields:
+            if '.' in field.source or field.source == '*':
+                raise Unsupported(field.field_name)
+            try:
+                model_field = model._meta.get_field(field.source)
+            except models.FieldDoesNotExist:
+                raise Unsupported(field.field_name)
+
+            if isinstance(field, serializers.ModelSerializer):
+                if not (model_field.many_to_one or model_field.one_to_one) or not model_field.concrete:
+                    raise Unsupported(field.field_name)
+                child = RowPlan(field, f'{prefix}{field.source}__')
+                # Nested serializers return None for a null relation
+                null_path = f'{prefix}{model_field.attname}' if model_field.null else None
+                self.entries.append((field.field_name, null_path, None, child))
+                self.related.append(f'{prefix}{field.source}')
+                self.related.extend(child.related)
+                if null_path:
+                    self.paths.append(null_path)
+                self.paths.extend(child.paths)
+            elif model_field.is_relation or not model_field.concrete:
+                raise Unsupported(field.field_name)
+            else:
+                path = f'{prefix}{field.source}'
+                self.entries.append((field.field_name, path, field, None))
+                self.paths.append(path)
+
+    def bind(self, timezone_):
+        """Entries with each field replaced by its converter"""
+        return [
+            (name, path, None, child.bind(timezone_)) if child is not None
+            else (name, path, fast_converter(field, timezone_), None)
+            for name, path, field, child in self.entries
+        ]
+
+    def rows(self, values_rows):
+        entries = self.bind(timezone.get_current_timezone() if settings.USE_TZ else None)
+        return [build_row(entries, values) for values in values_rows]
+
+
+def build_row(entries, values):
+    data = {}
+    for name, path, convert, child in entries:
+        if child is not None:
+            data[name] = None if path and values[path] is None else build_row(child, values)
+        else:
+            value = values[path]
+            data[name] = None if value is None else convert(value)
+    return data
+
+
+def row_plan(serializer_class, fields=None):
+    """Compiled plan for a serializer class and field selection, or None if unsupported"""
+    # Output follows the serializer's field order, so the requested order doesn't matter
+    return _row_plan(serializer_class, None if fields is None else tuple(sorted(fields)))
+
+
+# Bounded, as the field selections come from clients
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _row_plan(serializer_class, fields):
+    try:
+        return RowPlan(serializer_class(fields=fields))
+    except Unsupported:
+        return None
+
+
+class SparseFieldsViewSetMixin:
+    """?fields= on GET requests, and values()-based list responses.
+
+    The serializer class must use SparseFieldsMixin.
+    """
+
+    def get_requested_fields(self):
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return None
+        return requested_fields(self.request)
+
+    def get_row_plan(self):
+        # Unknown fields raise ValidationError here, answered with a 400
+        return row_plan(self.get_serializer_class(), self.get_requested_fields())
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        # Rather than get_queryset, which viewsets override without calling super()
+        queryset = super().filter_queryset(queryset)
+        if self.request is not None and self.request.method in SAFE_METHODS:
+            plan = self.get_row_plan()
+            if plan is not None:
+                queryset = queryset.select_related(*plan.related)
+                # Deferred-field instances are slower to build, so only when it saves columns
+                if self.get_requested_fields() is not None:
+                    queryset = queryset.only(*plan.paths)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        plan = self.get_row_plan()
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset()).values(*plan.paths)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.rows(page))
+        return Response(plan.rows(queryset))
@@ -0,0 +1,181 @@
+"""Emission forecasts per household.
+
+Every household gets a linear trend plus a calendar-month seasonal offset,
+fitted with least squares over its monthly totals. Households are fitted in
+batches as matrices (households x months), so a nightly run over the whole
+table is a handful of NumPy operations per batch. Fitted coefficients are
+stored in EmissionForecast, so a nightly fit_forecasts run serves every web
+process and a forecast request only evaluates them. Saving a summary
+deletes the household's row and its next request refits it.
+"""
+import logging
+from datetime import date
+
+import numpy as np
+from django.utils import timezone
+
+from .models import EmissionForecast, Household, MonthlyEmissionSummary
+
+logger = logging.getLogger('tracker')
+
+DEFAULT_BATCH_SIZE = 5000
+SLOPE_RIDGE = 1e-6
+SEASONAL_RIDGE = 1e-3
+
+
+def month_number(month):
+    return month.year * 12 + month.month - 1
+
+
+def month_from_number(number):
+    return date(number // 12, number % 12 + 1, 1)
+
+
+def fit_batch(rows):
+    """Fit coefficients for every household in rows of (household_id, month_year, total).
+
+    Returns a dict of household_id -> coefficients.
+    """
+    if not rows:
+        return {}
+
+    household_ids = []
+    positions = {}
+    row_index = np.empty(len(rows), dtype=np.int64)
+    months = np.empty(len(rows), dtype=np.int64)
+    values = np.empty(len(rows), dtype=np.float64)
+    for i, (household_id, month, total) in enumerate(rows):
+        if household_id not in positions:
+            positions[household_id] = len(household_ids)
+            household_ids.append(household_id)
+        row_index[i] = positions[household_id]
+        months[i] = month_number(month)
+        values[i] = total or 0
+
+    origin = months.min()
+    span = months.max() - origin + 1
+    x = np.arange(span, dtype=np.float64)
+
+    observed = np.zeros((len(household_ids), span))
+    y = np.zeros((len(household_ids), span))
+    observed[row_index, months - origin] = 1
+    y[row_index, months - origin] = values
+
+    # Joint least squares for y = intercept + slope * x + seasonal[calendar month],
+    # one small normal system per household, solved for the whole batch at once
+    design = np.column_stack([
+        np.ones(span), x, np.eye(12)[(origin + np.arange(span)) % 12]
+    ])
+    gram = np.einsum('ti,tj,ht->hij', design, design, observed)
+    moment = y @ design
+    # A light ridge keeps unobserved calendar months at zero offset and a single
+    # observed month flat at its value instead of leaving the system singular
+    penalty = np.diag([0.0, SLOPE_RIDGE] + [SEASONAL_RIDGE] * 12)
+    beta = np.linalg.solve(gram + penalty, moment[..., None])[..., 0]
+    intercept, slope, seasonal = beta[:, 0], beta[:, 1], beta[:, 2:]
+    n = observed.sum(axis=1)
+
+    last_observed = span - 1 - np.argmax(observed[:, ::-1], axis=1)
+    last_value = y[np.arange(len(household_ids)), last_observed]
+
+    fitted_at = timezone.now().isoformat()
+    return {
+        household_id: {
+            'origin': int(origin),
+            'intercept': float(intercept[i]),
+            'slope': float(slope[i]),
+            'seasonal': seasonal[i].tolist(),
+            'last_month': int(origin + last_observed[i]),
+            'last_value': float(last_value[i]),
+            'months_observed': int(n[i]),
+            'fitted_at': fitted_at,
+        }
+        for i, household_id in enumerate(household_ids)
+    }
+
+
+def predict(coefficients, months=6):
+    """Forecast the months following the last observed one"""
+    forecast = []
+    for step in range(1, months + 1):
+        number = coefficients['last_month'] + step
+        value = (
+            coefficients['intercept']
+            + coefficients['slope'] * (number - coefficients['origin'])
+            + coefficients['seasonal'][number % 12]
+        )
+        forecast.append({
+            'month_year': month_from_number(number),
+            'total_emissions': max(value, 0.0),
+        })
+    return forecast
+
+
+def store_forecasts(coefficients):
+    """Upsert the EmissionForecast rows of {household_id: coefficients}"""
+    fitted_at = timezone.now()
+    EmissionForecast.objects.bulk_create(
+        [
+            EmissionForecast(household_id=household_id, coefficients=coef, fitted_at=fitted_at)
+            for household_id, coef in coefficients.items()
+        ],
+        update_conflicts=True, unique_fields=['household'], update_fields=['coefficients', 'fitted_at'],
+    )
+
+
+def fit_all_forecasts(batch_size=DEFAULT_BATCH_SIZE):
+    """Fit and store forecasts for all households, one query per batch"""
+    household_ids = list(Household.objects.order_by('id').values_list('id', flat=True))
+    fitted = 0
+    for start in range(0, len(household_ids), batch_size):
+        chunk = household_ids[start:start + batch_size]
+        rows = list(MonthlyEmissionSummary.objects.filter(
+            household_id__gte=chunk[0], household_id__lte=chunk[-1]
+        ).values_list('household_id', 'month_year', 'total_emissions'))
+        coefficients = fit_batch(rows)
+        store_forecasts(coefficients)
+        fitted += len(coefficients)
+    logger.info(f"Fitted emission forecasts for {fitted} households")
+    return fitted
+
+
+def get_coefficients(household_id):
+    """Stored coefficients for a household, fitting them if there are none"""
+    stored = EmissionForecast.objects.filter(household_id=household_id).values_list('coefficients', flat=True)
+    for coefficients in stored:
+        return coefficients
+    rows = list(MonthlyEmissionSummary.objects.filter(
+        household_id=household_id
+    ).values_list('household_id', 'month_year', 'total_emissions'))
+    coefficients = fit_batch(rows)
+    if household_id not in coefficients:
+        return None
+    store_forecasts(coefficients)
+    return coefficients[household_id]
+
+
+def invalidate_forecast(household_id):
+    invalidate_forecasts([household_id])
+
+
+def invalidate_forecasts(household_ids):
+    """Forget stored coefficients, so the next request refits with the changed months"""
+    EmissionForecast.objects.filter(household_id__in=household_ids).delete()
+
+
+def forecast_trend(coefficients, forecast):
+    """Trend of the next forecast month against the last observed month"""
+    current = forecast[0]['total_emissions'] if forecast else 0.0
+    previous = coefficients['last_value']
+    change = ((current - previous) / previous * 100) if previous > 0 else 0
+    if abs(change) < 1:
+        direction = 'stable'
+    else:
+        direction = 'increasing' if change > 0 else 'decreasing'
+    return {
+        'period': 'next_month',
+        'current_emissions': current,
+        'previous_emissions': previous,
+        'change_percentage': change,
+        'trend_direction': direction,
+    }
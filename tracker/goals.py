@@ -0,0 +1,215 @@
+"""Goal tracking engine for UserGoal.
+
+Each goal keeps a GoalProgress row holding the tracked value per month and
+the least-squares sums of (month index, value). A summary change adjusts those
+sums in place, so evaluating a goal never re-aggregates its history.
+"""
+from collections import defaultdict
+
+from django.utils import timezone
+
+from .models import UserGoal, GoalProgress, MonthlyEmissionSummary
+
+
+def month_index(start, month):
+    """Number of whole months between two first-of-month dates"""
+    return (month.year - start.year) * 12 + month.month - start.month
+
+
+def goal_start(goal):
+    """First month counted towards a goal"""
+    created = goal.created_at or timezone.now()
+    return timezone.localdate(created).replace(day=1)
+
+
+def tracked_field(goal):
+    """Summary field a goal is measured on"""
+    return 'per_capita_emissions' if goal.goal_type == 'per_capita' else 'total_emissions'
+
+
+def target_value(goal):
+    return goal.baseline_emissions * (1 - goal.target_reduction_percentage / 100)
+
+
+def _add_point(progress, x, y, sign=1):
+    progress.months_count += sign
+    progress.sum_x += sign * x
+    progress.sum_y += sign * y
+    progress.sum_xx += sign * x * x
+    progress.sum_xy += sign * x * y
+
+
+def apply_value(progress, goal, month, value):
+    """Record (or replace) the tracked value for a month"""
+    x = month_index(goal_start(goal), month)
+    key = month.isoformat()
+    previous = progress.monthly_values.get(key)
+    if previous is not None:
+        _add_point(progress, x, previous, sign=-1)
+    _add_point(progress, x, value)
+    progress.monthly_values[key] = value
+
+
+def remove_value(progress, goal, month):
+    """Forget the tracked value for a month"""
+    previous = progress.monthly_values.pop(month.isoformat(), None)
+    if previous is not None:
+        _add_point(progress, month_index(goal_start(goal), month), previous, sign=-1)
+
+
+def build_progress(goals):
+    """Create GoalProgress rows for goals from their summaries in one query"""
+    goals = list(goals)
+    if not goals:
+        return []
+
+    summaries = defaultdict(list)
+    rows = MonthlyEmissionSummary.objects.filter(
+        household_id__in={goal.household_id for goal in goals}
+    ).values_list('household_id', 'month_year', 'total_emissions', 'per_capita_emissions')
+    for household_id, month, total, per_capita in rows:
+        summaries[household_id].append((month, total, per_capita))
+
+    built = []
+    for goal in goals:
+        progress = GoalProgress(goal=goal, monthly_values={})
+        start = goal_start(goal)
+        per_capita = goal.goal_type == 'per_capita'
+        for month, total, per_capita_value in summaries[goal.household_id]:
+            if month >= start:
+                apply_value(progress, goal, month, per_capita_value if per_capita else total)
+        goal.progress = progress
+        built.append(progress)
+
+    GoalProgress.objects.bulk_create(built)
+    return built
+
+
+def get_progress(goal):
+    """Return the goal's GoalProgress, building it on first use"""
+    try:
+        return goal.progress
+    except GoalProgress.DoesNotExist:
+        return build_progress([goal])[0]
+
+
+def record_summary(summary, deleted=False):
+    """Update the running aggregates of every active goal of the summary's household"""
+    goals = UserGoal.objects.filter(
+        household_id=summary.household_id, is_active=True
+    ).select_related('progress')
+    for goal in goals:
+        if summary.month_year < goal_start(goal):
+            continue
+        try:
+            progress = goal.progress
+        except GoalProgress.DoesNotExist:
+            # Built from the current summaries, which already include this one
+            build_progress([goal])
+            continue
+        if deleted:
+            remove_value(progress, goal, summary.month_year)
+        else:
+            apply_value(progress, goal, summary.month_year, getattr(summary, tracked_field(goal)))
+        progress.save()
+
+
+def record_month(household_ids, month):
+    """record_summary for many households' summaries of one month, in bulk"""
+    values = dict(
+        (household_id, (total, per_capita)) for household_id, total, per_capita in
+        MonthlyEmissionSummary.objects.filter(household_id__in=household_ids, month_year=month)
+        .values_list('household_id', 'total_emissions', 'per_capita_emissions')
+    )
+    goals = UserGoal.objects.filter(household_id__in=household_ids, is_active=True).select_related('progress')
+    missing, changed = [], []
+    for goal in goals:
+        if goal.household_id not in values or month < goal_start(goal):
+            continue
+        try:
+            progress = goal.progress
+        except GoalProgress.DoesNotExist:
+            missing.append(goal)
+            continue
+        total, per_capita = values[goal.household_id]
+        apply_value(progress, goal, month, per_capita if goal.goal_type == 'per_capita' else total)
+        progress.updated_at = timezone.now()
+        changed.append(progress)
+    build_progress(missing)
+    GoalProgress.objects.bulk_update(
+        changed, ['monthly_values', 'months_count', 'sum_x', 'sum_y', 'sum_xx', 'sum_xy', 'updated_at']
+    )
+    return len(missing) + len(changed)
+
+
+def evaluate(goal, progress):
+    """Percent achieved, projected end value and on-track status of a goal"""
+    target = target_value(goal)
+    result = {
+        'goal_id': goal.pk,
+        'household_id': goal.household_id,
+        'goal_type': goal.goal_type,
+        'baseline': goal.baseline_emissions,
+        'target': target,
+        'current': None,
+        'percent_achieved': 0.0,
+        'projected_end_value': None,
+        'on_track': False,
+        'months_tracked': progress.months_count,
+    }
+    if not progress.months_count:
+        return result
+
+    months = sorted(progress.monthly_values)
+    if goal.goal_type == 'yearly':
+        # Annualise the trailing twelve months
+        window = months[-12:]
+        current = sum(progress.monthly_values[m] for m in window) / len(window) * 12
+    else:
+        current = progress.monthly_values[months[-1]]
+
+    n = progress.months_count
+    denominator = n * progress.sum_xx - progress.sum_x ** 2
+    if n >= 2 and denominator:
+        slope = (n * progress.sum_xy - progress.sum_x * progress.sum_y) / denominator
+        intercept = (progress.sum_y - slope * progress.sum_x) / n
+    else:
+        slope, intercept = 0.0, progress.sum_y / n
+
+    end_month = goal.target_date.replace(day=1)
+    projected = max(intercept + slope * month_index(goal_start(goal), end_month), 0)
+    if goal.goal_type == 'yearly':
+        projected *= 12
+
+    reduction_needed = goal.baseline_emissions - target
+    if reduction_needed > 0:
+        percent_achieved = (goal.baseline_emissions - current) / reduction_needed * 100
+    else:
+        percent_achieved = 100.0 if current <= target else 0.0
+
+    result.update({
+        'current': current,
+        'percent_achieved': percent_achieved,
+        'projected_end_value': projected,
+        'on_track': projected <= target,
+    })
+    return result
+
+
+def goal_status(goal):
+    """Evaluate a single goal"""
+    return evaluate(goal, get_progress(goal))
+
+
+def evaluate_active_goals():
+    """Evaluate every active goal in one pass"""
+    goals = list(UserGoal.objects.filter(is_active=True).select_related('progress'))
+    missing = []
+    for goal in goals:
+        try:
+            goal.progress
+        except GoalProgress.DoesNotExist:
+            missing.append(goal)
+    build_progress(missing)
+
+    return [evaluate(goal, goal.progress) for goal in goals]
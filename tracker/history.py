@@ -0,0 +1,286 @@
+"""Long-range emission history.
+
+EmissionSnapshot keeps one row per household and month with the totals and
+the household attributes (members, state, house type, income) in force that
+month. A snapshot follows its household while the month is open and keeps
+those attributes once the month has passed, so per-capita values of earlier
+months don't change when the household grows or moves. Only the totals are
+updated after that, when usage is corrected. YearlyEmissionRollup sums the
+snapshots of each year, so a multi-year chart reads one row per year.
+"""
+import logging
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
+
+from .models import EmissionSnapshot, YearlyEmissionRollup, MonthlyEmissionSummary
+
+logger = logging.getLogger('tracker')
+
+ATTRIBUTES = ('members_count', 'state_id', 'house_type', 'income_range')
+TOTALS = ('total_energy_emissions', 'total_transport_emissions', 'total_diet_emissions', 'total_emissions')
+# Ranges longer than this are charted per year
+YEARLY_AFTER_MONTHS = 36
+DEFAULT_BATCH_SIZE = 2000
+
+
+def current_month():
+    return timezone.localdate().replace(day=1)
+
+
+def months_between(start, end):
+    return (end.year - start.year) * 12 + end.month - start.month
+
+
+def per_capita(total, members_count):
+    return total / members_count if members_count else 0
+
+
+def household_attributes(household):
+    return {name: getattr(household, name) for name in ATTRIBUTES}
+
+
+def record_snapshot(summary):
+    """Store a summary's totals, taking household attributes only while its month is open"""
+    snapshot = EmissionSnapshot.objects.filter(
+        household_id=summary.household_id, month_year=summary.month_year
+    ).first()
+    if snapshot is None:
+        snapshot = EmissionSnapshot(
+            household_id=summary.household_id, month_year=summary.month_year,
+            **household_attributes(summary.household)
+        )
+    elif summary.month_year >= current_month():
+        for name, value in household_attributes(summary.household).items():
+            setattr(snapshot, name, value)
+    for name in TOTALS:
+        setattr(snapshot, name, getattr(summary, name))
+    snapshot.per_capita_emissions = per_capita(snapshot.total_emissions, snapshot.members_count)
+    snapshot.save()
+    refresh_rollup(summary.household_id, summary.month_year.year)
+
+
+def remove_snapshot(household_id, month):
+    EmissionSnapshot.objects.filter(household_id=household_id, month_year=month).delete()
+    # Also runs while a household is deleted: never create rows here
+    refresh_rollup(household_id, month.year, create=False)
+
+
+def record_household(household):
+    """Carry household changes into the snapshots of open months"""
+    month = current_month()
+    open_snapshots = EmissionSnapshot.objects.filter(household_id=household.pk, month_year__gte=month)
+    updated = open_snapshots.update(
+        per_capita_emissions=F('total_emissions') / household.members_count,
+        **household_attributes(household)
+    )
+    if updated:
+        for year in open_snapshots.dates('month_year', 'year'):
+            refresh_rollup(household.pk, year.year)
+
+
+def refresh_rollup(household_id, year, create=True):
+    """Re-sum one household's year (at most twelve snapshots)"""
+    sums = EmissionSnapshot.objects.filter(household_id=household_id, month_year__year=year).aggregate(
+        months_count=Count('id'),
+        per_capita_emissions=Sum('per_capita_emissions'),
+        **{name: Sum(name) for name in TOTALS}
+    )
+    if not sums['months_count']:
+        YearlyEmissionRollup.objects.filter(household_id=household_id, year=year).delete()
+        return
+    if create:
+        YearlyEmissionRollup.objects.update_or_create(household_id=household_id, year=year, defaults=sums)
+    else:
+        YearlyEmissionRollup.objects.filter(household_id=household_id, year=year).update(**sums)
+
+
+def rebuild_rollups(household_ids=None, batch_size=DEFAULT_BATCH_SIZE, year=None):
+    """Recompute yearly rollups from snapshots, for some households (and one year) or all"""
+    snapshots = EmissionSnapshot.objects.all()
+    rollups = YearlyEmissionRollup.objects.all()
+    if household_ids is not None:
+        snapshots = snapshots.filter(household_id__in=household_ids)
+        rollups = rollups.filter(household_id__in=household_ids)
+    if year is not None:
+        snapshots = snapshots.filter(month_year__year=year)
+        rollups = rollups.filter(year=year)
+    yearly = snapshots.annotate(year=ExtractYear('month_year')).values('household_id', 'year').annotate(
+        months_count=Count('id'),
+        per_capita_emissions=Sum('per_capita_emissions'),
+        **{name: Sum(name) for name in TOTALS}
+    ).order_by()
+    with transaction.atomic():
+        rollups.delete()
+        created = YearlyEmissionRollup.objects.bulk_create(
+            (YearlyEmissionRollup(**row) for row in yearly.iterator()), batch_size=batch_size
+        )
+    return len(created)
+
+
+def record_month(household_ids, month, batch_size=DEFAULT_BATCH_SIZE):
+    """record_snapshot for many households' summaries of one month, in bulk"""
+    summaries = MonthlyEmissionSummary.objects.filter(
+        household_id__in=household_ids, month_year=month
+    ).values_list('household_id', *TOTALS, *(f'household__{name}' for name in ATTRIBUTES))
+    existing = {
+        snapshot.household_id: snapshot
+        for snapshot in EmissionSnapshot.objects.filter(household_id__in=household_ids, month_year=month)
+    }
+    is_open = month >= current_month()
+
+    new, changed = [], []
+    for row in summaries:
+        totals = dict(zip(TOTALS, row[1:1 + len(TOTALS)]))
+        attributes = dict(zip(ATTRIBUTES, row[1 + len(TOTALS):]))
+        snapshot = existing.get(row[0])
+        if snapshot is None:
+            snapshot = EmissionSnapshot(household_id=row[0], month_year=month, **attributes)
+            new.append(snapshot)
+        else:
+            if is_open:
+                for name, value in attributes.items():
+                    setattr(snapshot, name, value)
+            changed.append(snapshot)
+        for name, value in totals.items():
+            setattr(snapshot, name, value)
+        snapshot.per_capita_emissions = per_capita(snapshot.total_emissions, snapshot.members_count)
+        snapshot.updated_at = timezone.now()
+
+    EmissionSnapshot.objects.bulk_create(new, batch_size=batch_size)
+    EmissionSnapshot.objects.bulk_update(
+        changed, [*ATTRIBUTES, *TOTALS, 'per_capita_emissions', 'updated_at'], batch_size=batch_size
+    )
+    rebuild_rollups(household_ids, batch_size, year=month.year)
+    return len(new) + len(changed)
+
+
+def build_snapshots(start=None, end=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Snapshot summaries recorded before snapshots were kept.
+
+    Their months have no record of the household as it was then, so the
+    current attributes are used. Existing snapshots are left alone.
+    Returns the number of snapshots created.
+    """
+    summaries = MonthlyEmissionSummary.objects.order_by('pk').values_list(
+        'household_id', 'month_year', *TOTALS, *(f'household__{name}' for name in ATTRIBUTES)
+    )
+    if start:
+        summaries = summaries.filter(month_year__gte=start)
+    if end:
+        summaries = summaries.filter(month_year__lte=end)
+
+    created = 0
+    households = set()
+    batch = []
+    for row in summaries.iterator(chunk_size=batch_size):
+        household_id, month = row[0], row[1]
+        totals = dict(zip(TOTALS, row[2:2 + len(TOTALS)]))
+        attributes = dict(zip(ATTRIBUTES, row[2 + len(TOTALS):]))
+        batch.append(EmissionSnapshot(
+            household_id=household_id, month_year=month,
+            per_capita_emissions=per_capita(totals['total_emissions'], attributes['members_count']),
+            **totals, **attributes
+        ))
+        households.add(household_id)
+        if len(batch) >= batch_size:
+            created += _insert_new(batch)
+            batch = []
+    created += _insert_new(batch)
+    if start is None and end is None:
+        rollups = rebuild_rollups(batch_size=batch_size) if households else 0
+    else:
+        # In batches, keeping each IN list within the database's parameter limit
+        household_ids = sorted(households)
+        rollups = sum(
+            rebuild_rollups(household_ids[offset:offset + batch_size], batch_size)
+            for offset in range(0, len(household_ids), batch_size)
+        )
+    logger.info(f"Created {created} emission snapshots and {rollups} yearly rollups")
+    return created
+
+
+def _insert_new(snapshots):
+    if not snapshots:
+        return 0
+    existing = set(EmissionSnapshot.objects.filter(
+        household_id__in={snapshot.household_id for snapshot in snapshots},
+        month_year__in={snapshot.month_year for snapshot in snapshots},
+    ).values_list('household_id', 'month_year'))
+    new = [snapshot for snapshot in snapshots if (snapshot.household_id, snapshot.month_year) not in existing]
+    EmissionSnapshot.objects.bulk_create(new)
+    return len(new)
+
+
+def emission_history(household_id, start=None, end=None, granularity=None):
+    """Points of a household's history between two months, oldest first.
+
+    granularity is 'month' or 'year'; by default ranges over
+    YEARLY_AFTER_MONTHS (or without a start) are read from the yearly
+    rollups, whose points cover whole years.
+    """
+    if granularity is None:
+        long_range = start is None or months_between(start, end or current_month()) > YEARLY_AFTER_MONTHS
+        granularity = 'year' if long_range else 'month'
+
+    if granularity == 'year':
+        rows = YearlyEmissionRollup.objects.filter(household_id=household_id)
+        if start:
+            rows = rows.filter(year__gte=start.year)
+        if end:
+            rows = rows.filter(year__lte=end.year)
+        fields = ('year', 'months_count', 'per_capita_emissions', *TOTALS)
+        return [
+            {'period': date(row['year'], 1, 1), 'label': str(row.pop('year')), **row}
+            for row in rows.order_by('year').values(*fields)
+        ]
+
+    rows = EmissionSnapshot.objects.filter(household_id=household_id)
+    if start:
+        rows = rows.filter(month_year__gte=start)
+    if end:
+        rows = rows.filter(month_year__lte=end)
+    fields = ('month_year', 'members_count', 'per_capita_emissions', *TOTALS)
+    return [
+        {'period': row['month_year'], 'label': row.pop('month_year').strftime('%b %Y'), **row}
+        for row in rows.order_by('month_year').values(*fields)
+    ]
+
+
+def history_chart_data(points):
+    """Chart series in the shape of the dashboard charts, plus per-capita"""
+    return {
+        'months': [point['label'] for point in points],
+        'energy': [point['total_energy_emissions'] for point in points],
+        'transport': [point['total_transport_emissions'] for point in points],
+        'diet': [point['total_diet_emissions'] for point in points],
+        'total': [point['total_emissions'] for point in points],
+        'per_capita': [point['per_capita_emissions'] for point in points],
+    }
+
+
+def prepare_chart_data(monthly_summaries):
+    """Prepare data for charts"""
+    months = []
+    energy_data = []
+    transport_data = []
+    diet_data = []
+    total_data = []
+    
+    for summary in monthly_summaries:
+        months.append(summary.month_year.strftime('%b %Y'))
+        energy_data.append(float(summary.total_energy_emissions))
+        transport_data.append(float(summary.total_transport_emissions))
+        diet_data.append(float(summary.total_diet_emissions))
+        total_data.append(float(summary.total_emissions))
+    
+    return {
+        'months': months,
+        'energy': energy_data,
+        'transport': transport_data,
+        'diet': diet_data,
+        'total': total_data
+    }
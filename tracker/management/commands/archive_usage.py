@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from datetime import datetime
+from tracker.archive import TABLES, archive_table, get_archive_setting, table_dir, pa
+
+class Command(BaseCommand):
+    help = 'Move energy, transport and diet rows older than the archive horizon to partitioned Parquet files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before',
+            help='Archive months before this one (YYYY-MM, default: the configured horizon)',
+        )
+        parser.add_argument(
+            '--keep-months',
+            type=int,
+            help='Months kept in the database, counting the current one (default: ARCHIVE HORIZON_MONTHS)',
+        )
+        parser.add_argument(
+            '--tables',
+            default=','.join(TABLES),
+            help='Comma-separated tables to archive',
+        )
+        parser.add_argument('--chunk-size', type=int, help='Rows written and deleted per chunk')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would move')
+
+    def parse_month(self, value):
+        try:
+            return datetime.strptime(value, '%Y-%m').date()
+        except ValueError:
+            raise CommandError(f'Invalid month {value!r}, expected YYYY-MM')
+
+    def handle(self, *args, **options):
+        tables = [name.strip() for name in options['tables'].split(',') if name.strip()]
+        unknown = set(tables) - set(TABLES)
+        if unknown:
+            raise CommandError(f"Unknown tables: {', '.join(sorted(unknown))}")
+        if pa is None:
+            raise CommandError('pyarrow is not installed')
+        
+        if options['before']:
+            before = self.parse_month(options['before'])
+        else:
+            keep = options['keep_months'] or get_archive_setting('HORIZON_MONTHS')
+            month = timezone.now().date().replace(day=1)
+            index = month.year * 12 + month.month - 1 - (keep - 1)
+            before = month.replace(year=index // 12, month=index % 12 + 1)
+        
+        self.stdout.write(f'🗄️ Archiving usage before {before:%Y-%m}')
+        for table in tables:
+            if options['dry_run']:
+                count = TABLES[table].objects.filter(month_year__lt=before).count()
+                self.stdout.write(f'   {table}: {count} rows would move')
+                continue
+            moved = archive_table(table, before, options['chunk_size'])
+            self.stdout.write(f'   {table}: {moved} rows moved to {table_dir(table)}')
+        
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run - no rows moved'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Usage archival complete'))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.request import Request
+from tracker.apikeys import ApiKeyAuthentication, create_key, key_cache
+from tracker.models import Household, IndianState
+import base64
+import statistics
+import time
+
+class Command(BaseCommand):
+    help = 'Compare per-request authentication cost of HTTP Basic and API keys (on a throwaway user)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests authenticated per scheme')
+
+    def measure(self, authenticator, header, count, before=None):
+        factory = RequestFactory()
+        timings = []
+        for _ in range(count):
+            request = Request(factory.get('/api/households/', HTTP_AUTHORIZATION=header))
+            if before:
+                before()
+            started = time.perf_counter()
+            user, _ = authenticator.authenticate(request)
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    def report(self, label, timings):
+        self.stdout.write(
+            f'   {label:<24} median {statistics.median(timings) * 1e6:10.1f} µs   '
+            f'mean {statistics.fmean(timings) * 1e6:10.1f} µs'
+        )
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        with transaction.atomic():
+            password = 'benchmark-password'
+            user = User.objects.create_user('auth-benchmark', password=password)
+            household = Household.objects.create(
+                user=user, name='Benchmark', state=IndianState.objects.first(), members_count=1, city='-'
+            )
+            _, key = create_key(household, 'benchmark')
+            basic = 'Basic ' + base64.b64encode(f'auth-benchmark:{password}'.encode()).decode()
+            
+            self.stdout.write(f'🔐 Authenticating {count} requests per scheme')
+            # Basic runs the full password hash on every request, so fewer samples suffice
+            self.report('HTTP Basic', self.measure(BasicAuthentication(), basic, max(count // 10, 5)))
+            self.report('API key (cache miss)', self.measure(ApiKeyAuthentication(), f'Api-Key {key}', count, key_cache.clear))
+            self.report('API key (cached)', self.measure(ApiKeyAuthentication(), f'Api-Key {key}', count))
+            transaction.set_rollback(True)
+        key_cache.clear()
+        
+        self.stdout.write(self.style.SUCCESS('✅ Authentication benchmark complete'))
@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand, CommandError
+from tracker.parsing import PARSERS, get_parser, etree
+from tracker.scraper import get_source_spec
+from pathlib import Path
+import multiprocessing
+import resource
+import time
+
+def synthetic_page(rows):
+    """Fuel price portal page: navigation, scripts and unrelated tables around a large price table"""
+    parts = ['<html><head><title>Fuel prices</title>']
+    parts += [f'<script>var tracking{i} = "{"x" * 200}";</script>' for i in range(50)]
+    parts.append('</head><body><nav><ul>')
+    parts += [f'<li><a href="/city/{i}">City {i}</a></li>' for i in range(rows // 2)]
+    parts.append('</ul></nav><table class="ads"><tr><td>Advertisement</td></tr></table>')
+    parts.append('<table class="prices"><thead><tr><th>State</th><th>Petrol</th><th>Diesel</th></tr></thead><tbody>')
+    parts += [
+        f'<tr><td><a href="/state/{i}">State {i}</a></td><td>{95 + i % 15}.{i % 100:02d}</td>'
+        f'<td><span class="price">{85 + i % 12}.{i % 100:02d}</span></td></tr>'
+        for i in range(rows)
+    ]
+    parts.append('</tbody></table><footer>')
+    parts += [f'<p>Disclaimer paragraph {i} {"lorem ipsum " * 20}</p>' for i in range(rows // 4)]
+    parts.append('</footer></body></html>')
+    return ''.join(parts)
+
+def measure(parser_name, html, spec, repeat, connection):
+    """Parse in a forked child so peak RSS reflects this parser alone"""
+    parser = get_parser(parser_name)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = parser.parse(html, spec)
+        timings.append(time.perf_counter() - started)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    connection.send((min(timings), len(rows), peak))
+    connection.close()
+
+class Command(BaseCommand):
+    help = 'Compare parse time and peak memory of the scraper HTML parsers on fixture pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('pages', nargs='*', help='Saved HTML pages to parse (default: a generated page)')
+        parser.add_argument('--source', default='petrol_diesel', help='Source whose extraction spec is used')
+        parser.add_argument(
+            '--table',
+            help='Attribute identifying the table to extract, e.g. class=prices (default: the spec\'s table)',
+        )
+        parser.add_argument('--rows', type=int, default=20000, help='Table rows in the generated page')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per parser; the fastest is reported')
+        parser.add_argument('--save-page', help='Write the generated page to this file for reuse')
+        parser.add_argument(
+            '--parsers',
+            default=','.join(PARSERS),
+            help='Comma-separated parsers to compare',
+        )
+
+    def handle(self, *args, **options):
+        parsers = [name.strip() for name in options['parsers'].split(',') if name.strip()]
+        unknown = set(parsers) - set(PARSERS)
+        if unknown:
+            raise CommandError(f"Unknown parsers: {', '.join(sorted(unknown))}")
+        if 'lxml' in parsers and etree is None:
+            self.stdout.write(self.style.WARNING('⚠️ lxml is not installed, skipping it'))
+            parsers.remove('lxml')
+
+        spec = get_source_spec(options['source'])
+        table = options['table'] or ('' if options['pages'] else 'class=prices')
+        if table:
+            name, _, value = table.partition('=')
+            spec.table = {name: value}
+        
+        if options['pages']:
+            pages = [(path, Path(path).read_text(encoding='utf-8', errors='replace')) for path in options['pages']]
+        else:
+            html = synthetic_page(options['rows'])
+            if options['save_page']:
+                Path(options['save_page']).write_text(html, encoding='utf-8')
+            pages = [(f"generated ({options['rows']} rows)", html)]
+
+        context = multiprocessing.get_context('fork')
+        for label, html in pages:
+            self.stdout.write(f'📄 {label}: {len(html) / 1024:.0f} KiB')
+            for name in parsers:
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=measure, args=(name, html, spec, options['repeat'], sender))
+                process.start()
+                seconds, rows, peak_kib = receiver.recv()
+                process.join()
+                self.stdout.write(
+                    f'   {name:<14} {seconds * 1000:8.1f} ms  {peak_kib / 1024:7.1f} MiB peak  {rows} rows'
+                )
+
+        self.stdout.write(self.style.SUCCESS('✅ Parser benchmark complete'))
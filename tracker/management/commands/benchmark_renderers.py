@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from tracker.models import Household, IndianState, MonthlyEmissionSummary
+from tracker.renderers import MessagePackRenderer, OrjsonRenderer, msgpack, orjson
+from tracker.serializers import MonthlyEmissionSummarySerializer
+from datetime import date
+import json
+import time
+
+def synthetic_summaries(rows):
+    """Unsaved summaries, with households, users and states, shaped like an API list page"""
+    now = timezone.now()
+    states = [IndianState(id=i + 1, name=f'State {i}', created_at=now) for i in range(30)]
+    summaries = []
+    for i in range(rows):
+        user = User(id=i + 1, username=f'user{i}', email=f'user{i}@example.com', first_name='Asha', last_name='Rao')
+        household = Household(
+            id=i + 1, user=user, name=f'Household {i}', house_type='apartment', members_count=1 + i % 5,
+            state=states[i % len(states)], city='Pune', income_range='5_10lakh', created_at=now, updated_at=now,
+        )
+        energy, transport, diet = 180.5 + i % 97, 95.25 + i % 53, 120.125 + i % 31
+        summaries.append(MonthlyEmissionSummary(
+            id=i + 1, household=household, month_year=date(2024, 1 + i % 12, 1),
+            total_energy_emissions=energy, total_transport_emissions=transport, total_diet_emissions=diet,
+            total_emissions=energy + transport + diet, per_capita_emissions=(energy + transport + diet) / household.members_count,
+            created_at=now, updated_at=now,
+        ))
+    return summaries
+
+class Command(BaseCommand):
+    help = 'Compare API renderers on a large list of serialized monthly summaries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Summaries in the rendered list')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per renderer; the fastest is reported')
+
+    def best_of(self, repeat, function):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = function()
+            timings.append(time.perf_counter() - started)
+        return min(timings), result
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        summaries = synthetic_summaries(rows)
+
+        self.stdout.write(f'📦 Rendering {rows} monthly summaries (best of {repeat})')
+        seconds, data = self.best_of(repeat, lambda: MonthlyEmissionSummarySerializer(summaries, many=True).data)
+        self.stdout.write(f'   {"serializer":<12} {seconds * 1000:9.1f} ms   {rows / seconds:12,.0f} rows/s')
+
+        renderers = [('json (DRF)', JSONRenderer())]
+        if orjson is not None:
+            renderers.append(('orjson', OrjsonRenderer()))
+        if msgpack is not None:
+            renderers.append(('msgpack', MessagePackRenderer()))
+
+        outputs = {}
+        for label, renderer in renderers:
+            seconds, content = self.best_of(repeat, lambda: renderer.render(data, renderer.media_type))
+            outputs[label] = content
+            self.stdout.write(
+                f'   {label:<12} {seconds * 1000:9.1f} ms   {rows / seconds:12,.0f} rows/s   '
+                f'{len(content) / seconds / 1e6:8.1f} MB/s   {len(content) / 1024:8.0f} KiB'
+            )
+
+        if 'orjson' in outputs:
+            if outputs['orjson'] == outputs['json (DRF)']:
+                self.stdout.write('   orjson output is byte-identical to DRF JSON')
+            elif json.loads(outputs['orjson']) == json.loads(outputs['json (DRF)']):
+                self.stdout.write('   orjson output decodes to the same data as DRF JSON')
+            else:
+                self.stdout.write(self.style.ERROR('❌ orjson output differs from DRF JSON'))
+        if 'msgpack' in outputs and msgpack.unpackb(outputs['msgpack'], raw=False) != json.loads(outputs['json (DRF)']):
+            self.stdout.write(self.style.ERROR('❌ MessagePack output differs from DRF JSON'))
+
+        self.stdout.write(self.style.SUCCESS('✅ Renderer benchmark complete'))
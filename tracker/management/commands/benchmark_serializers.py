@@ -0,0 +1,96 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from tracker.fieldsets import row_plan
+from tracker.models import Household, IndianState, MonthlyEmissionSummary
+from tracker.serializers import MonthlyEmissionSummarySerializer
+from datetime import date
+import time
+
+SPARSE_FIELDS = ('month_year', 'total_emissions')
+
+class Command(BaseCommand):
+    help = 'Compare ways of serializing monthly summary lists (on throwaway rows)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=6000, help='Monthly summaries to serialize')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per method; the fastest is reported')
+
+    def create_rows(self, rows):
+        states = list(IndianState.objects.all()[:10]) or [IndianState.objects.create(name='Benchmark State')]
+        count = max(rows // 12, 1)
+        users = User.objects.bulk_create([User(username=f'serializer-benchmark-{i}') for i in range(count)])
+        households = Household.objects.bulk_create([
+            Household(user=user, name=f'Benchmark {i}', state=states[i % len(states)], members_count=1 + i % 5, city='Pune')
+            for i, user in enumerate(users)
+        ])
+        MonthlyEmissionSummary.objects.bulk_create([
+            MonthlyEmissionSummary(
+                household=household, month_year=date(2024, 1 + i % 12, 1), total_energy_emissions=100.5 + i % 7,
+                total_transport_emissions=50.25, total_diet_emissions=80.0, total_emissions=230.75 + i % 7,
+                per_capita_emissions=(230.75 + i % 7) / household.members_count,
+            )
+            for household in households for i in range(12)
+        ][:rows])
+        return MonthlyEmissionSummary.objects.filter(household__name__startswith='Benchmark ').order_by('pk')
+
+    def measure(self, label, repeat, function):
+        timings = []
+        queries = []
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        for _ in range(repeat):
+            queries.clear()
+            with connection.execute_wrapper(count_query):
+                started = time.perf_counter()
+                data = function()
+                timings.append(time.perf_counter() - started)
+        seconds = min(timings)
+        self.stdout.write(
+            f'   {label:<48} {seconds * 1000:9.1f} ms   {len(data) / seconds:10,.0f} rows/s   '
+            f'{len(queries):6} queries'
+        )
+        return data
+
+    def compare(self, label, data, expected):
+        if [dict(row) for row in data] != [dict(row) for row in expected]:
+            self.stdout.write(self.style.ERROR(f'❌ {label} output differs from the serializer'))
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        with transaction.atomic():
+            queryset = self.create_rows(rows)
+            full_plan = row_plan(MonthlyEmissionSummarySerializer)
+            sparse_plan = row_plan(MonthlyEmissionSummarySerializer, SPARSE_FIELDS)
+
+            self.stdout.write(f'📋 Serializing {queryset.count()} monthly summaries (best of {repeat})')
+            current = self.measure(
+                'serializer (current)', repeat,
+                lambda: MonthlyEmissionSummarySerializer(queryset.all(), many=True).data,
+            )
+            joined = self.measure(
+                'serializer + select_related', repeat,
+                lambda: MonthlyEmissionSummarySerializer(queryset.select_related(*full_plan.related), many=True).data,
+            )
+            rows_data = self.measure(
+                'values() rows', repeat, lambda: full_plan.rows(queryset.values(*full_plan.paths)),
+            )
+            self.compare('select_related', joined, current)
+            self.compare('values() rows', rows_data, current)
+
+            sparse = self.measure(
+                f'serializer, fields={",".join(SPARSE_FIELDS)}', repeat,
+                lambda: MonthlyEmissionSummarySerializer(
+                    queryset.only(*sparse_plan.paths), many=True, fields=SPARSE_FIELDS,
+                ).data,
+            )
+            sparse_rows = self.measure(
+                f'values() rows, fields={",".join(SPARSE_FIELDS)}', repeat,
+                lambda: sparse_plan.rows(queryset.values(*sparse_plan.paths)),
+            )
+            self.compare('sparse values() rows', sparse_rows, sparse)
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✅ Serializer benchmark complete'))
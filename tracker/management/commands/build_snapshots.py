@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from datetime import datetime
+from tracker.history import build_snapshots, rebuild_rollups, DEFAULT_BATCH_SIZE
+
+class Command(BaseCommand):
+    help = 'Snapshot monthly summaries recorded before snapshots were kept and rebuild yearly rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First month to snapshot (YYYY-MM)')
+        parser.add_argument('--to', dest='end', help='Last month to snapshot (YYYY-MM)')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Rows read and inserted per batch',
+        )
+        parser.add_argument(
+            '--rebuild-rollups',
+            action='store_true',
+            help='Recompute the yearly rollups of every household from their snapshots',
+        )
+
+    def parse_month(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m').date()
+        except ValueError:
+            raise CommandError(f'Invalid month {value!r}, expected YYYY-MM')
+
+    def handle(self, *args, **options):
+        start = self.parse_month(options['start'])
+        end = self.parse_month(options['end'])
+        
+        created = build_snapshots(start, end, batch_size=options['batch_size'])
+        self.stdout.write(f'📸 Created {created} emission snapshots')
+        
+        if options['rebuild_rollups']:
+            rollups = rebuild_rollups(batch_size=options['batch_size'])
+            self.stdout.write(f'📅 Rebuilt {rollups} yearly rollups')
+        
+        self.stdout.write(self.style.SUCCESS('✅ Emission history is up to date'))
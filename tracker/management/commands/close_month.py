@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from datetime import datetime, timedelta
+from tracker.closing import close_month, DEFAULT_PARTITION_SIZE, DEFAULT_WORKERS
+
+class Command(BaseCommand):
+    help = 'Compute monthly emission summaries of every household for a month'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Month to close (YYYY-MM, default: last month)')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_WORKERS,
+            help='Worker processes; 1 closes every range in this process',
+        )
+        parser.add_argument(
+            '--partition-size',
+            type=int,
+            default=DEFAULT_PARTITION_SIZE,
+            help='Households per id range handed to a worker',
+        )
+
+    def parse_month(self, value):
+        try:
+            return datetime.strptime(value, '%Y-%m').date()
+        except ValueError:
+            raise CommandError(f'Invalid month {value!r}, expected YYYY-MM')
+
+    def handle(self, *args, **options):
+        if options['month']:
+            month = self.parse_month(options['month'])
+        else:
+            month = (timezone.now().date().replace(day=1) - timedelta(days=1)).replace(day=1)
+        
+        self.stdout.write(f"🗓️ Closing {month:%b %Y} with {options['workers']} workers")
+        
+        def progress(count, seconds):
+            rate = count / seconds if seconds else 0
+            self.stdout.write(f'   {count} households in {seconds:.2f}s ({rate:,.0f}/s)')
+        
+        closed, elapsed = close_month(
+            month, workers=options['workers'], partition_size=options['partition_size'], progress=progress
+        )
+        rate = closed / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Closed {month:%b %Y} for {closed} households in {elapsed:.1f}s ({rate:,.0f} households/s)')
+        )
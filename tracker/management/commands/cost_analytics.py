@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from tracker.analytics import cost_intensity, fill_missing_costs
+from datetime import datetime
+import time
+
+class Command(BaseCommand):
+    help = 'Compute cost per kg CO2 for every household, estimating missing costs from fuel prices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First month to include (YYYY-MM)')
+        parser.add_argument('--to', dest='end', help='Last month to include (YYYY-MM)')
+        parser.add_argument('--output', help='Write per household and category metrics to this CSV file')
+        parser.add_argument(
+            '--fill',
+            action='store_true',
+            help='Store estimated costs on usage rows that have no reported cost',
+        )
+
+    def parse_month(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m').date()
+        except ValueError:
+            raise CommandError(f'Invalid month {value!r}, expected YYYY-MM')
+
+    def handle(self, *args, **options):
+        start = self.parse_month(options['start'])
+        end = self.parse_month(options['end'])
+        started = time.perf_counter()
+
+        if options['fill']:
+            filled = fill_missing_costs(start, end)
+            for category, count in filled.items():
+                self.stdout.write(f'💰 {category.capitalize()}: estimated cost stored on {count} rows')
+
+        metrics = cost_intensity(start, end)
+        if options['output']:
+            metrics.to_csv(options['output'], index=False)
+            self.stdout.write(f"📄 Wrote {len(metrics)} rows to {options['output']}")
+
+        for category, group in metrics.groupby('category'):
+            self.stdout.write(
+                f'📊 {category.capitalize()}: {group["household_id"].nunique()} households, '
+                f'median ₹{group["inr_per_kg_co2"].median():.2f} per kg CO2'
+            )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'✅ Cost analytics complete in {elapsed:.1f}s'))
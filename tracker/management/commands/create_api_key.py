@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from tracker.apikeys import create_key
+from tracker.models import ApiKey, Household
+
+class Command(BaseCommand):
+    help = "Create an API key for a user's household and print it (it is not stored and can't be shown again)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Owner of the household')
+        parser.add_argument('--name', required=True, help='What the key is for, e.g. the client using it')
+        parser.add_argument(
+            '--scope',
+            choices=[scope for scope, _ in ApiKey.SCOPES],
+            default='read',
+            help='read: GET requests only; write: all requests',
+        )
+
+    def handle(self, *args, **options):
+        household = Household.objects.filter(user__username=options['username']).first()
+        if household is None:
+            raise CommandError(f"No household for user {options['username']!r}")
+        
+        api_key, key = create_key(household, options['name'], options['scope'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Created {api_key.scope} key {api_key.prefix} for {household.name}'))
+        self.stdout.write(key)
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from tracker.models import EcoTip
+from tracker.tips import TipIndex, fingerprint
+from tracker.search import invalidate_search_results
+from tracker.recommendations import invalidate_recommendations
+
+class Command(BaseCommand):
+    help = 'Store content fingerprints of eco tips and find (or deactivate) duplicate tips'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--deactivate',
+            action='store_true',
+            help='Deactivate duplicates, keeping the oldest tip of each group active',
+        )
+
+    def handle(self, *args, **options):
+        tips = list(EcoTip.objects.order_by('created_at', 'id').only('title', 'content', 'content_hash', 'simhash', 'is_active'))
+        
+        stale = []
+        for tip in tips:
+            fields = fingerprint(tip.content)
+            if tip.content_hash != fields['content_hash'] or tip.simhash != fields['simhash']:
+                tip.content_hash, tip.simhash = fields['content_hash'], fields['simhash']
+                stale.append(tip)
+        EcoTip.objects.bulk_update(stale, ['content_hash', 'simhash'], batch_size=500)
+        self.stdout.write(f'🔑 Updated fingerprints of {len(stale)} tips')
+        
+        index = TipIndex()
+        duplicates = []
+        for tip in tips:
+            kind = index.find_duplicate(tip.title, tip.content_hash, tip.simhash)
+            if kind:
+                duplicates.append(tip)
+                self.stdout.write(f'    {kind:<5} #{tip.pk} {tip.title}')
+            else:
+                index.add(tip.title, tip.content_hash, tip.simhash)
+        
+        if options['deactivate']:
+            deactivated = EcoTip.objects.filter(
+                pk__in=[tip.pk for tip in duplicates], is_active=True
+            ).update(is_active=False)
+            invalidate_search_results()
+            invalidate_recommendations()
+            self.stdout.write(self.style.SUCCESS(f'✅ Deactivated {deactivated} duplicate tips'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ Found {len(duplicates)} duplicate tips'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from tracker.prices import downsample_prices, rebuild_latest
+from datetime import timedelta
+
+class Command(BaseCommand):
+    help = 'Roll old daily fuel prices up into monthly averages and refresh the latest-price index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-days',
+            type=int,
+            default=365,
+            help='Daily prices newer than this many days are kept as they are',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report how many rows would be rolled up without changing anything',
+        )
+        parser.add_argument(
+            '--rebuild-latest',
+            action='store_true',
+            help='Recompute the latest price of every state and fuel from the history',
+        )
+
+    def handle(self, *args, **options):
+        before = (timezone.now() - timedelta(days=options['keep_days'])).date().replace(day=1)
+        groups, removed = downsample_prices(before, dry_run=options['dry_run'])
+        prefix = 'Would roll up' if options['dry_run'] else 'Rolled up'
+        self.stdout.write(
+            self.style.SUCCESS(f'⛽ {prefix} {groups} months before {before} ({removed} daily rows)')
+        )
+
+        if options['rebuild_latest'] and not options['dry_run']:
+            count = rebuild_latest()
+            self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt {count} latest fuel prices'))
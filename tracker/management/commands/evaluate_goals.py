@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from tracker.goals import evaluate_active_goals
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Evaluate progress of all active household goals (intended to run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--off-track-only',
+            action='store_true',
+            help='Only list goals that are not on track',
+        )
+
+    def handle(self, *args, **options):
+        results = evaluate_active_goals()
+        on_track = sum(1 for result in results if result['on_track'])
+        
+        for result in results:
+            if options['off_track_only'] and result['on_track']:
+                continue
+            projected = result['projected_end_value']
+            self.stdout.write(
+                f"Goal {result['goal_id']} ({result['goal_type']}) household {result['household_id']}: "
+                f"{result['percent_achieved']:.1f}% achieved, projected "
+                f"{'n/a' if projected is None else f'{projected:.1f}'} kg CO2 "
+                f"vs target {result['target']:.1f} - {'on track' if result['on_track'] else 'off track'}"
+            )
+        
+        logger.info(f"Evaluated {len(results)} goals, {on_track} on track")
+        self.stdout.write(
+            self.style.SUCCESS(f'🎯 Evaluated {len(results)} goals: {on_track} on track, {len(results) - on_track} off track')
+        )
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from tracker.warehouse import EXPORTS, FORMATS, export_table, get_warehouse_setting, pa
+import time
+
+class Command(BaseCommand):
+    help = 'Export households, usage, monthly summaries, fuel prices and deletions to Parquet or Arrow datasets for the warehouse'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tables',
+            default=','.join(EXPORTS),
+            help='Comma-separated tables to export',
+        )
+        parser.add_argument('--output-dir', help='Dataset root directory (default: WAREHOUSE DIR)')
+        parser.add_argument('--format', choices=sorted(FORMATS), help='File format (default: WAREHOUSE FORMAT)')
+        parser.add_argument(
+            '--row-group-size',
+            type=int,
+            help='Rows per row group (record batch for Arrow), which also bounds memory',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Export every row instead of those changed since the last export',
+        )
+
+    def handle(self, *args, **options):
+        tables = [name.strip() for name in options['tables'].split(',') if name.strip()]
+        unknown = set(tables) - set(EXPORTS)
+        if unknown:
+            raise CommandError(f"Unknown tables: {', '.join(sorted(unknown))}")
+        if pa is None:
+            raise CommandError('pyarrow is not installed')
+        
+        for table in tables:
+            started = time.perf_counter()
+            rows, path = export_table(
+                table,
+                output_dir=options['output_dir'],
+                full=options['full'],
+                row_group_size=options['row_group_size'] or get_warehouse_setting('ROW_GROUP_SIZE'),
+                file_format=options['format'],
+            )
+            elapsed = time.perf_counter() - started
+            target = path if path else 'nothing new'
+            self.stdout.write(f'📦 {table}: {rows} rows in {elapsed:.1f}s ({target})')
+        
+        self.stdout.write(self.style.SUCCESS('✅ Warehouse export complete'))
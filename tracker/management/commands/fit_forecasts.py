@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from tracker.forecasting import fit_all_forecasts, DEFAULT_BATCH_SIZE
+import time
+
+class Command(BaseCommand):
+    help = 'Fit emission forecast models for all households and store their coefficients'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of households fitted together in one batch',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        fitted = fit_all_forecasts(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f'📈 Fitted forecasts for {fitted} households in {elapsed:.1f}s')
+        )
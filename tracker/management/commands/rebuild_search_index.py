@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from tracker.search import get_search_backend, invalidate_search_results
+
+class Command(BaseCommand):
+    help = 'Create the eco tip full-text index if missing and rebuild it from the tips table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to index')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend(options['database'])
+        backend.install()
+        backend.rebuild()
+        invalidate_search_results()
+        self.stdout.write(self.style.SUCCESS(f'🔎 Rebuilt eco tip search index ({type(backend).__name__})'))
@@ -0,0 +1,107 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from datetime import datetime
+from tracker.models import EnergyUsage, TransportUsage, MonthlyEmissionSummary
+from tracker.factors import invalidate_factor_index
+from tracker.archive import recalculate_archive
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Archive table and fields read by each model's calculate_emissions()
+USAGE_MODELS = [
+    (EnergyUsage, 'energy', ['energy_source', 'consumption']),
+    (TransportUsage, 'transport', ['transport_mode', 'distance_km', 'frequency_per_month']),
+]
+
+class Command(BaseCommand):
+    help = 'Recalculate energy and transport emissions with the emission factors valid for each usage month'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First month to recalculate (YYYY-MM)')
+        parser.add_argument('--to', dest='end', help='Last month to recalculate (YYYY-MM)')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows loaded and updated per batch',
+        )
+        parser.add_argument(
+            '--skip-summaries',
+            action='store_true',
+            help='Do not refresh monthly summaries of the affected households',
+        )
+
+    def parse_month(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m').date()
+        except ValueError:
+            raise CommandError(f'Invalid month {value!r}, expected YYYY-MM')
+
+    def handle(self, *args, **options):
+        start = self.parse_month(options['start'])
+        end = self.parse_month(options['end'])
+        batch_size = options['batch_size']
+        
+        # Start from the factors as they are now, not a cached copy
+        invalidate_factor_index()
+        
+        touched = set()
+        for model, table, fields in USAGE_MODELS:
+            queryset = model.objects.order_by('pk').only('household_id', 'month_year', 'emission_calculated', *fields)
+            if start:
+                queryset = queryset.filter(month_year__gte=start)
+            if end:
+                queryset = queryset.filter(month_year__lte=end)
+            
+            changed = []
+            updated = 0
+            for usage in queryset.iterator(chunk_size=batch_size):
+                previous = usage.emission_calculated
+                # Resolved from the in-memory factor index, no query per row
+                usage.calculate_emissions()
+                if usage.emission_calculated != previous:
+                    changed.append(usage)
+                    touched.add((usage.household_id, usage.month_year))
+                if len(changed) >= batch_size:
+                    updated += self.write(model, changed, batch_size)
+                    changed = []
+            updated += self.write(model, changed, batch_size)
+            self.stdout.write(f'⚡ {model._meta.verbose_name_plural.capitalize()}: {updated} rows updated')
+            
+            archived = recalculate_archive(table, start, end)
+            if archived:
+                touched |= archived
+                self.stdout.write(f'🗄️ Archived {table} usage: {len(archived)} household months updated')
+        
+        if touched and not options['skip_summaries']:
+            self.refresh_summaries(touched)
+        
+        self.stdout.write(self.style.SUCCESS('✅ Emission recalculation complete'))
+
+    def write(self, model, rows, batch_size):
+        if rows:
+            # bulk_update() skips auto_now; the warehouse export goes by updated_at
+            now = timezone.now()
+            for row in rows:
+                row.updated_at = now
+            with transaction.atomic():
+                model.objects.bulk_update(rows, ['emission_calculated', 'updated_at'], batch_size=batch_size)
+        return len(rows)
+
+    def refresh_summaries(self, touched):
+        """Re-save the summaries of every (household, month) whose usage changed"""
+        households = {household_id for household_id, _ in touched}
+        months = {month for _, month in touched}
+        summaries = MonthlyEmissionSummary.objects.filter(
+            household_id__in=households, month_year__in=months
+        ).select_related('household')
+        refreshed = 0
+        for summary in summaries.iterator(chunk_size=500):
+            if (summary.household_id, summary.month_year) in touched:
+                summary.save()
+                refreshed += 1
+        self.stdout.write(f'📊 Refreshed {refreshed} monthly summaries')
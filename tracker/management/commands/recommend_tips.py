@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from tracker.recommendations import compute_all_recommendations, DEFAULT_BATCH_SIZE, TOP_K
+import time
+
+class Command(BaseCommand):
+    help = 'Score eco tips for every household and store the top recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of households scored together in one matrix product',
+        )
+        parser.add_argument('--top-k', type=int, default=TOP_K, help='Tips stored per household')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        scored = compute_all_recommendations(batch_size=options['batch_size'], k=options['top_k'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f'💡 Recommended tips for {scored} households in {elapsed:.1f}s')
+        )
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from tracker.statements import render_all_statements, FORMATS, DEFAULT_BATCH_SIZE, DEFAULT_WORKERS
+
+class Command(BaseCommand):
+    help = 'Render the yearly emission statement (PDF or PNG) of every household'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help='Year of the statements (default: this year)')
+        parser.add_argument('--format', dest='file_format', choices=FORMATS, help='Output format (default: REPORTS FORMAT setting)')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_WORKERS,
+            help='Worker processes; 1 renders in this process',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Households per task handed to a worker',
+        )
+
+    def handle(self, *args, **options):
+        year = options['year'] or timezone.now().year
+        if year < 1900:
+            raise CommandError(f'Invalid year {year}')
+        
+        self.stdout.write(f"📄 Rendering {year} statements with {options['workers']} workers")
+        
+        def progress(rendered, skipped, total):
+            self.stdout.write(f'   {rendered + skipped}/{total} households ({skipped} unchanged)')
+        
+        rendered, skipped, elapsed = render_all_statements(
+            year, options['file_format'], workers=options['workers'],
+            batch_size=options['batch_size'], progress=progress,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Rendered {rendered} statements, skipped {skipped} unchanged, in {elapsed:.1f}s')
+        )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from datetime import datetime, timedelta
+from tracker.digests import send_digests, digest_recipients, get_digest_setting
+
+class Command(BaseCommand):
+    help = 'Email each household its monthly footprint digest, skipping households already sent it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Month of the digest (YYYY-MM, default: last month)')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Messages rendered and sent per batch (default: DIGEST CHUNK_SIZE setting)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count the households that would be sent a digest',
+        )
+
+    def parse_month(self, value):
+        try:
+            return datetime.strptime(value, '%Y-%m').date()
+        except ValueError:
+            raise CommandError(f'Invalid month {value!r}, expected YYYY-MM')
+
+    def handle(self, *args, **options):
+        if options['month']:
+            month = self.parse_month(options['month'])
+        else:
+            month = (timezone.now().date().replace(day=1) - timedelta(days=1)).replace(day=1)
+        
+        if options['dry_run']:
+            count = digest_recipients(month).count()
+            self.stdout.write(f'📬 {count} households would be sent their {month:%b %Y} digest')
+            return
+        
+        chunk_size = options['chunk_size'] or get_digest_setting('CHUNK_SIZE')
+        self.stdout.write(f'📬 Sending {month:%b %Y} digests in chunks of {chunk_size}')
+        
+        def progress(sent, failed):
+            self.stdout.write(f'   {sent} sent, {failed} failed')
+        
+        sent, failed, elapsed = send_digests(month, chunk_size=chunk_size, progress=progress)
+        rate = sent / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f'✅ Sent {sent} digests in {elapsed:.1f}s ({rate:,.0f}/s)'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'⚠️ {failed} digests failed; run again to retry them'))
@@ -1,8 +1,14 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.core.exceptions import ValidationError
 from django.db import transaction
 from tracker.models import (
     IndianState, EmissionFactor, EcoTip
 )
+from tracker.seeding import diff_rows, apply_diff, load_fixture
+from tracker.factors import invalidate_factor_index
+from tracker.tips import fingerprint
+from tracker.search import invalidate_search_results
+from tracker.recommendations import invalidate_recommendations
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,23 +27,71 @@ class Command(BaseCommand):
             action='store_true',
             help='Skip loading Indian states',
         )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be created or updated without writing anything',
+        )
+        parser.add_argument(
+            '--states-file',
+            help='JSON or CSV file of states to load instead of the built-in list',
+        )
+        parser.add_argument(
+            '--factors-file',
+            help='JSON or CSV file of emission factors to load instead of the built-in list '
+                 '(add a valid_from column to version a factor instead of revising it)',
+        )
+        parser.add_argument(
+            '--tips-file',
+            help='JSON or CSV file of eco tips to load instead of the built-in list',
+        )
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('🌱 Setting up initial data for Carbon Footprint Tracker...'))
         
         try:
-            with transaction.atomic():
-                if not options['skip_states']:
-                    self.create_indian_states()
-                
-                self.create_emission_factors()
-                
-                if not options['skip_tips']:
-                    self.create_eco_tips()
-                
+            diffs = []
+            if not options['skip_states']:
+                rows = self.load_rows(options['states_file'], IndianState, self.indian_states_data)
+                diffs.append(('📍', diff_rows(IndianState, rows, ['name'])))
+            
+            rows = self.load_rows(options['factors_file'], EmissionFactor, self.emission_factors_data)
+            for row in rows:
+                # Rows without valid_from revise the original version in place
+                row.setdefault('valid_from', EmissionFactor.DEFAULT_VALID_FROM)
+            diffs.append(('⚡', diff_rows(EmissionFactor, rows, ['category', 'name', 'valid_from'])))
+            
+            if not options['skip_tips']:
+                rows = self.load_rows(options['tips_file'], EcoTip, self.eco_tips_data)
+                for row in rows:
+                    # bulk writes skip EcoTip.save(), which keeps these current
+                    row.update(fingerprint(row.get('content', '')))
+                diffs.append(('💡', diff_rows(EcoTip, rows, ['title'])))
+            
+            for icon, diff in diffs:
                 self.stdout.write(
-                    self.style.SUCCESS('✅ Successfully setup initial data!')
+                    f'{icon} {diff.label.capitalize()}: {len(diff.to_create)} to create, '
+                    f'{len(diff.to_update)} to update, {diff.unchanged} unchanged'
                 )
+                if options['dry_run'] or options['verbosity'] > 1:
+                    for line in diff.describe():
+                        self.stdout.write(f'    {line}')
+            
+            if options['dry_run']:
+                self.stdout.write(self.style.WARNING('Dry run - no changes written'))
+                return
+            
+            with transaction.atomic():
+                for _, diff in diffs:
+                    apply_diff(diff)
+            # Bulk writes skip model signals
+            invalidate_factor_index()
+            invalidate_search_results()
+            invalidate_recommendations()
+            
+            self.stdout.write(
+                self.style.SUCCESS('✅ Successfully setup initial data!')
+            )
                 
         except Exception as e:
             self.stdout.write(
@@ -45,114 +99,99 @@ class Command(BaseCommand):
             )
             raise
 
-    def create_indian_states(self):
-        """Create Indian states with electricity emission factors"""
+    def load_rows(self, path, model, builtin):
+        """Rows from a fixture file if given, otherwise the built-in data"""
+        if not path:
+            return builtin()
+        try:
+            return load_fixture(path, model)
+        except (OSError, ValueError, ValidationError) as e:
+            raise CommandError(f'Could not load {path}: {e}')
+
+    def indian_states_data(self):
+        """Indian states with electricity emission factors"""
         states_data = [
-            {'name': 'Andhra Pradesh', 'emission_factor': 0.79},
-            {'name': 'Arunachal Pradesh', 'emission_factor': 0.65},
-            {'name': 'Assam', 'emission_factor': 0.71},
-            {'name': 'Bihar', 'emission_factor': 0.89},
-            {'name': 'Chhattisgarh', 'emission_factor': 0.95},
-            {'name': 'Delhi', 'emission_factor': 0.82},
-            {'name': 'Goa', 'emission_factor': 0.76},
-            {'name': 'Gujarat', 'emission_factor': 0.84},
-            {'name': 'Haryana', 'emission_factor': 0.81},
-            {'name': 'Himachal Pradesh', 'emission_factor': 0.45},
-            {'name': 'Jharkhand', 'emission_factor': 0.92},
-            {'name': 'Karnataka', 'emission_factor': 0.73},
-            {'name': 'Kerala', 'emission_factor': 0.68},
-            {'name': 'Madhya Pradesh', 'emission_factor': 0.88},
-            {'name': 'Maharashtra', 'emission_factor': 0.77},
-            {'name': 'Manipur', 'emission_factor': 0.69},
-            {'name': 'Meghalaya', 'emission_factor': 0.72},
-            {'name': 'Mizoram', 'emission_factor': 0.74},
-            {'name': 'Nagaland', 'emission_factor': 0.73},
-            {'name': 'Odisha', 'emission_factor': 0.91},
-            {'name': 'Punjab', 'emission_factor': 0.78},
-            {'name': 'Rajasthan', 'emission_factor': 0.85},
-            {'name': 'Sikkim', 'emission_factor': 0.42},
-            {'name': 'Tamil Nadu', 'emission_factor': 0.75},
-            {'name': 'Telangana', 'emission_factor': 0.80},
-            {'name': 'Tripura', 'emission_factor': 0.76},
-            {'name': 'Uttar Pradesh', 'emission_factor': 0.86},
-            {'name': 'Uttarakhand', 'emission_factor': 0.67},
-            {'name': 'West Bengal', 'emission_factor': 0.87},
+            {'name': 'Andhra Pradesh', 'electricity_emission_factor': 0.79},
+            {'name': 'Arunachal Pradesh', 'electricity_emission_factor': 0.65},
+            {'name': 'Assam', 'electricity_emission_factor': 0.71},
+            {'name': 'Bihar', 'electricity_emission_factor': 0.89},
+            {'name': 'Chhattisgarh', 'electricity_emission_factor': 0.95},
+            {'name': 'Delhi', 'electricity_emission_factor': 0.82},
+            {'name': 'Goa', 'electricity_emission_factor': 0.76},
+            {'name': 'Gujarat', 'electricity_emission_factor': 0.84},
+            {'name': 'Haryana', 'electricity_emission_factor': 0.81},
+            {'name': 'Himachal Pradesh', 'electricity_emission_factor': 0.45},
+            {'name': 'Jharkhand', 'electricity_emission_factor': 0.92},
+            {'name': 'Karnataka', 'electricity_emission_factor': 0.73},
+            {'name': 'Kerala', 'electricity_emission_factor': 0.68},
+            {'name': 'Madhya Pradesh', 'electricity_emission_factor': 0.88},
+            {'name': 'Maharashtra', 'electricity_emission_factor': 0.77},
+            {'name': 'Manipur', 'electricity_emission_factor': 0.69},
+            {'name': 'Meghalaya', 'electricity_emission_factor': 0.72},
+            {'name': 'Mizoram', 'electricity_emission_factor': 0.74},
+            {'name': 'Nagaland', 'electricity_emission_factor': 0.73},
+            {'name': 'Odisha', 'electricity_emission_factor': 0.91},
+            {'name': 'Punjab', 'electricity_emission_factor': 0.78},
+            {'name': 'Rajasthan', 'electricity_emission_factor': 0.85},
+            {'name': 'Sikkim', 'electricity_emission_factor': 0.42},
+            {'name': 'Tamil Nadu', 'electricity_emission_factor': 0.75},
+            {'name': 'Telangana', 'electricity_emission_factor': 0.80},
+            {'name': 'Tripura', 'electricity_emission_factor': 0.76},
+            {'name': 'Uttar Pradesh', 'electricity_emission_factor': 0.86},
+            {'name': 'Uttarakhand', 'electricity_emission_factor': 0.67},
+            {'name': 'West Bengal', 'electricity_emission_factor': 0.87},
             # Union Territories
-            {'name': 'Andaman and Nicobar Islands', 'emission_factor': 0.83},
-            {'name': 'Chandigarh', 'emission_factor': 0.79},
-            {'name': 'Dadra and Nagar Haveli and Daman and Diu', 'emission_factor': 0.81},
-            {'name': 'Jammu and Kashmir', 'emission_factor': 0.58},
-            {'name': 'Ladakh', 'emission_factor': 0.61},
-            {'name': 'Lakshadweep', 'emission_factor': 0.85},
-            {'name': 'Puducherry', 'emission_factor': 0.78},
+            {'name': 'Andaman and Nicobar Islands', 'electricity_emission_factor': 0.83},
+            {'name': 'Chandigarh', 'electricity_emission_factor': 0.79},
+            {'name': 'Dadra and Nagar Haveli and Daman and Diu', 'electricity_emission_factor': 0.81},
+            {'name': 'Jammu and Kashmir', 'electricity_emission_factor': 0.58},
+            {'name': 'Ladakh', 'electricity_emission_factor': 0.61},
+            {'name': 'Lakshadweep', 'electricity_emission_factor': 0.85},
+            {'name': 'Puducherry', 'electricity_emission_factor': 0.78},
         ]
         
-        created_count = 0
-        for state_data in states_data:
-            state, created = IndianState.objects.get_or_create(
-                name=state_data['name'],
-                defaults={'electricity_emission_factor': state_data['emission_factor']}
-            )
-            if created:
-                created_count += 1
-        
-        self.stdout.write(f'📍 Created {created_count} Indian states')
+        return states_data
 
-    def create_emission_factors(self):
-        """Create emission factors for different categories"""
+    def emission_factors_data(self):
+        """Emission factors for different categories"""
         factors_data = [
             # Energy emission factors (kg CO2 per unit)
-            {'category': 'energy', 'name': 'Electricity', 'unit': 'kWh', 'factor': 0.82, 'source': 'Central Electricity Authority, India'},
-            {'category': 'energy', 'name': 'LPG', 'unit': 'kg', 'factor': 2.98, 'source': 'Ministry of Petroleum, India'},
-            {'category': 'energy', 'name': 'CNG', 'unit': 'kg', 'factor': 2.75, 'source': 'IGL India'},
-            {'category': 'energy', 'name': 'Kerosene', 'unit': 'litre', 'factor': 2.52, 'source': 'IPCC Guidelines'},
-            {'category': 'energy', 'name': 'Wood', 'unit': 'kg', 'factor': 1.87, 'source': 'Forest Survey of India'},
-            {'category': 'energy', 'name': 'Coal', 'unit': 'kg', 'factor': 2.42, 'source': 'Coal India Limited'},
-            {'category': 'energy', 'name': 'Solar', 'unit': 'kWh', 'factor': 0.05, 'source': 'MNRE India'},
+            {'category': 'energy', 'name': 'Electricity', 'unit': 'kWh', 'emission_factor': 0.82, 'source': 'Central Electricity Authority, India'},
+            {'category': 'energy', 'name': 'LPG', 'unit': 'kg', 'emission_factor': 2.98, 'source': 'Ministry of Petroleum, India'},
+            {'category': 'energy', 'name': 'CNG', 'unit': 'kg', 'emission_factor': 2.75, 'source': 'IGL India'},
+            {'category': 'energy', 'name': 'Kerosene', 'unit': 'litre', 'emission_factor': 2.52, 'source': 'IPCC Guidelines'},
+            {'category': 'energy', 'name': 'Wood', 'unit': 'kg', 'emission_factor': 1.87, 'source': 'Forest Survey of India'},
+            {'category': 'energy', 'name': 'Coal', 'unit': 'kg', 'emission_factor': 2.42, 'source': 'Coal India Limited'},
+            {'category': 'energy', 'name': 'Solar', 'unit': 'kWh', 'emission_factor': 0.05, 'source': 'MNRE India'},
             
             # Transport emission factors (kg CO2 per km)
-            {'category': 'transport', 'name': 'Bike', 'unit': 'km', 'factor': 0.06, 'source': 'ARAI India'},
-            {'category': 'transport', 'name': 'Car Petrol', 'unit': 'km', 'factor': 0.17, 'source': 'ARAI India'},
-            {'category': 'transport', 'name': 'Car Diesel', 'unit': 'km', 'factor': 0.16, 'source': 'ARAI India'},
-            {'category': 'transport', 'name': 'Car CNG', 'unit': 'km', 'factor': 0.14, 'source': 'ARAI India'},
-            {'category': 'transport', 'name': 'Auto', 'unit': 'km', 'factor': 0.08, 'source': 'ARAI India'},
-            {'category': 'transport', 'name': 'Bus', 'unit': 'km', 'factor': 0.04, 'source': 'Indian Railways'},
-            {'category': 'transport', 'name': 'Train', 'unit': 'km', 'factor': 0.03, 'source': 'Indian Railways'},
-            {'category': 'transport', 'name': 'Metro', 'unit': 'km', 'factor': 0.02, 'source': 'Delhi Metro'},
-            {'category': 'transport', 'name': 'Flight Domestic', 'unit': 'km', 'factor': 0.18, 'source': 'DGCA India'},
-            {'category': 'transport', 'name': 'Flight International', 'unit': 'km', 'factor': 0.20, 'source': 'ICAO'},
+            {'category': 'transport', 'name': 'Bike', 'unit': 'km', 'emission_factor': 0.06, 'source': 'ARAI India'},
+            {'category': 'transport', 'name': 'Car Petrol', 'unit': 'km', 'emission_factor': 0.17, 'source': 'ARAI India'},
+            {'category': 'transport', 'name': 'Car Diesel', 'unit': 'km', 'emission_factor': 0.16, 'source': 'ARAI India'},
+            {'category': 'transport', 'name': 'Car CNG', 'unit': 'km', 'emission_factor': 0.14, 'source': 'ARAI India'},
+            {'category': 'transport', 'name': 'Auto', 'unit': 'km', 'emission_factor': 0.08, 'source': 'ARAI India'},
+            {'category': 'transport', 'name': 'Bus', 'unit': 'km', 'emission_factor': 0.04, 'source': 'Indian Railways'},
+            {'category': 'transport', 'name': 'Train', 'unit': 'km', 'emission_factor': 0.03, 'source': 'Indian Railways'},
+            {'category': 'transport', 'name': 'Metro', 'unit': 'km', 'emission_factor': 0.02, 'source': 'Delhi Metro'},
+            {'category': 'transport', 'name': 'Flight Domestic', 'unit': 'km', 'emission_factor': 0.18, 'source': 'DGCA India'},
+            {'category': 'transport', 'name': 'Flight International', 'unit': 'km', 'emission_factor': 0.20, 'source': 'ICAO'},
             
             # Diet emission factors (kg CO2 per kg of food)
-            {'category': 'diet', 'name': 'Rice', 'unit': 'kg', 'factor': 4.5, 'source': 'Indian Agricultural Research'},
-            {'category': 'diet', 'name': 'Wheat', 'unit': 'kg', 'factor': 1.2, 'source': 'Indian Agricultural Research'},
-            {'category': 'diet', 'name': 'Lentils', 'unit': 'kg', 'factor': 0.9, 'source': 'Indian Agricultural Research'},
-            {'category': 'diet', 'name': 'Chicken', 'unit': 'kg', 'factor': 6.1, 'source': 'Livestock Emission Study India'},
-            {'category': 'diet', 'name': 'Mutton', 'unit': 'kg', 'factor': 39.2, 'source': 'Livestock Emission Study India'},
-            {'category': 'diet', 'name': 'Fish', 'unit': 'kg', 'factor': 5.4, 'source': 'Marine Fisheries India'},
-            {'category': 'diet', 'name': 'Milk', 'unit': 'litre', 'factor': 3.2, 'source': 'National Dairy Development Board'},
-            {'category': 'diet', 'name': 'Vegetables', 'unit': 'kg', 'factor': 0.4, 'source': 'Indian Agricultural Research'},
-            {'category': 'diet', 'name': 'Fruits', 'unit': 'kg', 'factor': 0.5, 'source': 'Indian Agricultural Research'},
+            {'category': 'diet', 'name': 'Rice', 'unit': 'kg', 'emission_factor': 4.5, 'source': 'Indian Agricultural Research'},
+            {'category': 'diet', 'name': 'Wheat', 'unit': 'kg', 'emission_factor': 1.2, 'source': 'Indian Agricultural Research'},
+            {'category': 'diet', 'name': 'Lentils', 'unit': 'kg', 'emission_factor': 0.9, 'source': 'Indian Agricultural Research'},
+            {'category': 'diet', 'name': 'Chicken', 'unit': 'kg', 'emission_factor': 6.1, 'source': 'Livestock Emission Study India'},
+            {'category': 'diet', 'name': 'Mutton', 'unit': 'kg', 'emission_factor': 39.2, 'source': 'Livestock Emission Study India'},
+            {'category': 'diet', 'name': 'Fish', 'unit': 'kg', 'emission_factor': 5.4, 'source': 'Marine Fisheries India'},
+            {'category': 'diet', 'name': 'Milk', 'unit': 'litre', 'emission_factor': 3.2, 'source': 'National Dairy Development Board'},
+            {'category': 'diet', 'name': 'Vegetables', 'unit': 'kg', 'emission_factor': 0.4, 'source': 'Indian Agricultural Research'},
+            {'category': 'diet', 'name': 'Fruits', 'unit': 'kg', 'emission_factor': 0.5, 'source': 'Indian Agricultural Research'},
         ]
         
-        created_count = 0
-        for factor_data in factors_data:
-            factor, created = EmissionFactor.objects.get_or_create(
-                category=factor_data['category'],
-                name=factor_data['name'],
-                defaults={
-                    'unit': factor_data['unit'],
-                    'emission_factor': factor_data['factor'],
-                    'source': factor_data['source'],
-                    'is_active': True
-                }
-            )
-            if created:
-                created_count += 1
-        
-        self.stdout.write(f'⚡ Created {created_count} emission factors')
+        return factors_data
 
-    def create_eco_tips(self):
-        """Create eco-friendly tips"""
+    def eco_tips_data(self):
+        """Eco-friendly tips"""
         tips_data = [
             # Energy Tips
             {
@@ -261,19 +300,4 @@ class Command(BaseCommand):
             }
         ]
         
-        created_count = 0
-        for tip_data in tips_data:
-            tip, created = EcoTip.objects.get_or_create(
-                title=tip_data['title'],
-                defaults={
-                    'content': tip_data['content'],
-                    'category': tip_data['category'],
-                    'potential_reduction': tip_data['potential_reduction'],
-                    'source_url': tip_data['source_url'],
-                    'is_active': True
-                }
-            )
-            if created:
-                created_count += 1
-        
-        self.stdout.write(f'💡 Created {created_count} eco tips')
\ No newline at end of file
+        return tips_data
@@ -0,0 +1,98 @@
+"""Authentication from the cache.
+
+Django's AuthenticationMiddleware reads the session row and the user on
+every request, and views then query the user's household. With cached_db
+sessions the session comes from the cache. CachedAuthenticationMiddleware
+also caches the user, with the household (and its state) already attached,
+so request.user.household costs no query either. The session's auth hash is
+still checked against the cached user on every request, as Django does.
+
+Cached users are dropped when the user or household is saved or deleted and
+on logout; tracker.signals wires this up. That only reaches every process
+through a shared cache (Redis). With a process-local cache (the default
+LocMemCache) a password change or deactivation would leave other processes
+accepting the old session, so users are then not cached at all and are
+loaded from the database on every request, as Django does.
+"""
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, load_backend
+from django.contrib.auth import _get_user_session_key
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from .models import Household
+
+USER_CACHE_TTL = 5 * 60
+# Backends whose entries (and deletions) no other process sees
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def user_cache_key(user_id):
+    return f'tracker:auth-user:{user_id}'
+
+
+def invalidate_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+def user_cache_enabled():
+    """Whether cached users, and their invalidation, are seen by every process"""
+    return not isinstance(caches['default'], PROCESS_LOCAL_CACHES)
+
+
+def load_user(user_id, backend):
+    """User from the cache, or from the backend with its household attached"""
+    cached = user_cache_enabled()
+    key = user_cache_key(user_id)
+    user = cache.get(key) if cached else None
+    if user is None:
+        user = backend.get_user(user_id)
+        if user is None:
+            return None
+        household = Household.objects.select_related('state').filter(user=user).first()
+        # Cache the absence too, so request.user.household raises without a query
+        User._meta.get_field('household').set_cached_value(user, household)
+        if cached:
+            cache.set(key, user, USER_CACHE_TTL)
+    return user
+
+
+def get_cached_user(request):
+    """django.contrib.auth.get_user, with the user loaded through the cache"""
+    try:
+        user_id = _get_user_session_key(request)
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+
+    user = load_user(user_id, load_backend(backend_path))
+    if user is None:
+        return AnonymousUser()
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    session_auth_hash = user.get_session_auth_hash()
+    if session_hash and constant_time_compare(session_hash, session_auth_hash):
+        return user
+    # Sessions signed with an old SECRET_KEY are moved to the current one
+    if session_hash and any(
+        constant_time_compare(session_hash, fallback_hash) for fallback_hash in user.get_session_auth_fallback_hash()
+    ):
+        request.session.cycle_key()
+        request.session[HASH_SESSION_KEY] = session_auth_hash
+        return user
+    request.session.flush()
+    return AnonymousUser()
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware that resolves request.user through the cache"""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
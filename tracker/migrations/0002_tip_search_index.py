@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 table and triggers on SQLite, a GIN index on PostgreSQL
+    from tracker.search import install_search_index
+    install_search_index(schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, migrations.RunPython.noop),
+    ]
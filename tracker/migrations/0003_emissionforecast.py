@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0002_tip_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmissionForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coefficients', models.JSONField(help_text='Trend and calendar-month offsets')),
+                ('fitted_at', models.DateTimeField()),
+                ('household', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='emission_forecast', to='tracker.household')),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0003_emissionforecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TipRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tips', models.JSONField(help_text='Recommended tips, best first')),
+                ('computed_at', models.DateTimeField()),
+                ('household', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='tip_recommendation', to='tracker.household')),
+            ],
+        ),
+    ]
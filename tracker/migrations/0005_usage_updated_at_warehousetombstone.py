@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0004_tiprecommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WarehouseTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(help_text='Warehouse table name', max_length=50)),
+                ('row_id', models.CharField(max_length=36)),
+                ('reason', models.CharField(choices=[('deleted', 'Deleted'), ('archived', 'Archived')], default='deleted', max_length=10)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='dietemission',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='energyusage',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='transportusage',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
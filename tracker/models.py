@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from datetime import date
 import uuid
 
 class IndianState(models.Model):
@@ -56,19 +57,28 @@ class EmissionFactor(models.Model):
         ('waste', 'Waste'),
     ]
     
+    DEFAULT_VALID_FROM = date(1970, 1, 1)
+    
     category = models.CharField(max_length=20, choices=CATEGORIES)
     name = models.CharField(max_length=100)  # e.g., "Petrol", "Electricity", "Beef"
     unit = models.CharField(max_length=20)   # e.g., "litre", "kWh", "kg"
     emission_factor = models.FloatField(help_text="kg CO2 per unit")
     source = models.CharField(max_length=200, blank=True, help_text="Data source")
     is_active = models.BooleanField(default=True)
+    valid_from = models.DateField(default=DEFAULT_VALID_FROM, help_text="First date this factor applies to")
+    valid_to = models.DateField(null=True, blank=True, help_text="First date this factor no longer applies to (open-ended if empty)")
     created_at = models.DateTimeField(auto_now_add=True)
     
+    @property
+    def source_key(self):
+        """Key matching usage sources, e.g. 'Car Petrol' -> 'car_petrol'"""
+        return self.name.lower().replace(' ', '_')
+    
     def __str__(self):
         return f"{self.name} ({self.emission_factor} kg CO2/{self.unit})"
     
     class Meta:
-        unique_together = ['category', 'name']
+        unique_together = ['category', 'name', 'valid_from']
 
 class EnergyUsage(models.Model):
     """Track household energy consumption"""
@@ -90,19 +100,17 @@ class EnergyUsage(models.Model):
     month_year = models.DateField(help_text="Month and year of consumption")
     emission_calculated = models.FloatField(null=True, blank=True, help_text="kg CO2")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set explicitly by bulk updates too; the warehouse export's watermark
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def calculate_emissions(self):
         """Calculate CO2 emissions for this energy usage"""
-        try:
-            factor = EmissionFactor.objects.get(
-                category='energy', 
-                name__icontains=self.energy_source,
-                is_active=True
-            )
-            self.emission_calculated = self.consumption * factor.emission_factor
-            return self.emission_calculated
-        except EmissionFactor.DoesNotExist:
+        from .factors import resolve_factor
+        factor = resolve_factor('energy', self.energy_source, self.month_year)
+        if factor is None:
             return 0
+        self.emission_calculated = self.consumption * factor
+        return self.emission_calculated
     
     def save(self, *args, **kwargs):
         if not self.emission_calculated:
@@ -140,20 +148,17 @@ class TransportUsage(models.Model):
     month_year = models.DateField()
     emission_calculated = models.FloatField(null=True, blank=True, help_text="kg CO2")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def calculate_emissions(self):
         """Calculate CO2 emissions for transportation"""
-        try:
-            factor = EmissionFactor.objects.get(
-                category='transport',
-                name__icontains=self.transport_mode.split('_')[0],
-                is_active=True
-            )
-            total_distance = self.distance_km * self.frequency_per_month
-            self.emission_calculated = total_distance * factor.emission_factor
-            return self.emission_calculated
-        except EmissionFactor.DoesNotExist:
+        from .factors import resolve_factor
+        factor = resolve_factor('transport', self.transport_mode, self.month_year)
+        if factor is None:
             return 0
+        total_distance = self.distance_km * self.frequency_per_month
+        self.emission_calculated = total_distance * factor
+        return self.emission_calculated
     
     def save(self, *args, **kwargs):
         if not self.emission_calculated:
@@ -193,6 +198,7 @@ class DietEmission(models.Model):
     month_year = models.DateField()
     emission_calculated = models.FloatField(null=True, blank=True, help_text="kg CO2")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def calculate_emissions(self):
         """Calculate CO2 emissions for diet"""
@@ -264,6 +270,13 @@ class MonthlyEmissionSummary(models.Model):
             total=models.Sum('emission_calculated')
         )['total'] or 0
         
+        # Months moved to cold storage are read back from the archive
+        from .archive import archived_totals
+        archived = archived_totals(self.household_id, self.month_year)
+        energy_total += archived.get('energy', 0)
+        transport_total += archived.get('transport', 0)
+        diet_total += archived.get('diet', 0)
+        
         self.total_energy_emissions = energy_total
         self.total_transport_emissions = transport_total
         self.total_diet_emissions = diet_total
@@ -283,6 +296,68 @@ class MonthlyEmissionSummary(models.Model):
         unique_together = ['household', 'month_year']
         ordering = ['-month_year']
 
+class EmissionSnapshot(models.Model):
+    """Monthly totals with the household attributes in force that month"""
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, related_name='emission_snapshots')
+    month_year = models.DateField()
+    # Copied from the household while the month is open, frozen once it has passed
+    members_count = models.PositiveIntegerField()
+    state = models.ForeignKey(IndianState, on_delete=models.SET_NULL, null=True, blank=True)
+    house_type = models.CharField(max_length=20, choices=Household.HOUSE_TYPES)
+    income_range = models.CharField(max_length=20, choices=Household.INCOME_RANGES, blank=True)
+    total_energy_emissions = models.FloatField(default=0)
+    total_transport_emissions = models.FloatField(default=0)
+    total_diet_emissions = models.FloatField(default=0)
+    total_emissions = models.FloatField(default=0)
+    per_capita_emissions = models.FloatField(default=0)
+    recorded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.household.name} - {self.month_year} ({self.members_count} members)"
+
+    class Meta:
+        unique_together = ['household', 'month_year']
+        ordering = ['month_year']
+
+class YearlyEmissionRollup(models.Model):
+    """Per-household yearly sums of emission snapshots for long-range charts"""
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, related_name='yearly_rollups')
+    year = models.PositiveSmallIntegerField()
+    months_count = models.PositiveSmallIntegerField(default=0)
+    total_energy_emissions = models.FloatField(default=0)
+    total_transport_emissions = models.FloatField(default=0)
+    total_diet_emissions = models.FloatField(default=0)
+    total_emissions = models.FloatField(default=0)
+    # Sum of each month's per-capita value, so size changes within the year count
+    per_capita_emissions = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.household.name} - {self.year} ({self.total_emissions:.2f} kg CO2)"
+
+    class Meta:
+        unique_together = ['household', 'year']
+        ordering = ['year']
+
+class EmissionForecast(models.Model):
+    """Fitted forecast coefficients of a household (see tracker.forecasting)"""
+    household = models.OneToOneField(Household, on_delete=models.CASCADE, related_name='emission_forecast')
+    coefficients = models.JSONField(help_text="Trend and calendar-month offsets")
+    fitted_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.household.name} forecast fitted {self.fitted_at:%Y-%m-%d %H:%M}"
+
+class TipRecommendation(models.Model):
+    """Top eco tips for a household (see tracker.recommendations)"""
+    household = models.OneToOneField(Household, on_delete=models.CASCADE, related_name='tip_recommendation')
+    tips = models.JSONField(help_text="Recommended tips, best first")
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.household.name} tips computed {self.computed_at:%Y-%m-%d %H:%M}"
+
 class EcoTip(models.Model):
     """Eco-friendly tips and suggestions"""
     CATEGORIES = [
@@ -293,7 +368,7 @@ class EcoTip(models.Model):
         ('general', 'General'),
     ]
     
-    title = models.CharField(max_length=200)
+    title = models.CharField(max_length=200, db_index=True)
     content = models.TextField()
     category = models.CharField(max_length=20, choices=CATEGORIES)
     potential_reduction = models.FloatField(
@@ -302,8 +377,16 @@ class EcoTip(models.Model):
     )
     is_active = models.BooleanField(default=True)
     source_url = models.URLField(blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    simhash = models.BigIntegerField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    def save(self, *args, **kwargs):
+        from .tips import fingerprint
+        for field, value in fingerprint(self.content).items():
+            setattr(self, field, value)
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return self.title
     
@@ -335,6 +418,23 @@ class FuelPrice(models.Model):
         unique_together = ['fuel_type', 'state', 'date_recorded']
         ordering = ['-date_recorded']
 
+class LatestFuelPrice(models.Model):
+    """Most recent price per state and fuel, kept current on every FuelPrice save"""
+    fuel_type = models.CharField(max_length=20, choices=FuelPrice.FUEL_TYPES)
+    state = models.ForeignKey(IndianState, on_delete=models.CASCADE, related_name='latest_fuel_prices')
+    price = models.DecimalField(max_digits=8, decimal_places=2)
+    unit = models.CharField(max_length=20)
+    date_recorded = models.DateField()
+    source = models.CharField(max_length=200, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.fuel_type} - {self.state.name} (₹{self.price}/{self.unit} on {self.date_recorded})"
+    
+    class Meta:
+        unique_together = ['state', 'fuel_type']
+        ordering = ['fuel_type']
+
 class UserGoal(models.Model):
     """User-defined emission reduction goals"""
     GOAL_TYPES = [
@@ -355,9 +455,108 @@ class UserGoal(models.Model):
     
     def current_progress(self):
         """Calculate current progress towards goal"""
-        # This would calculate actual progress based on recent emissions
-        # Implementation would depend on the goal type and timeframe
-        pass
+        from .goals import goal_status
+        return goal_status(self)
     
     def __str__(self):
         return f"{self.household.name} - {self.goal_type} ({self.target_reduction_percentage}%)"
+
+class GoalProgress(models.Model):
+    """Running aggregates for a goal, updated as monthly summaries change"""
+    goal = models.OneToOneField(UserGoal, on_delete=models.CASCADE, related_name='progress')
+    monthly_values = models.JSONField(default=dict, help_text="Tracked value per month (ISO date)")
+    months_count = models.PositiveIntegerField(default=0)
+    # Least-squares sums over (month index, tracked value) for the trend line
+    sum_x = models.FloatField(default=0)
+    sum_y = models.FloatField(default=0)
+    sum_xx = models.FloatField(default=0)
+    sum_xy = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.goal} - {self.months_count} months tracked"
+
+class UsageArchive(models.Model):
+    """How far back a usage table has been moved to Parquet files"""
+    TABLES = [
+        ('energy', 'Energy usage'),
+        ('transport', 'Transport usage'),
+        ('diet', 'Diet emissions'),
+    ]
+    
+    table = models.CharField(max_length=20, choices=TABLES, unique=True)
+    cutoff = models.DateField(help_text="Rows for months before this are archived")
+    rows_archived = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.table} archived before {self.cutoff} ({self.rows_archived} rows)"
+
+class WarehouseExport(models.Model):
+    """Watermark of the last analytics warehouse export of a table"""
+    table = models.CharField(max_length=50, unique=True)
+    watermark = models.DateTimeField(null=True, blank=True, help_text="Rows changed before this have been exported")
+    rows_exported = models.PositiveBigIntegerField(default=0, help_text="Rows in the last export")
+    last_file = models.CharField(max_length=500, blank=True)
+    exported_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.table} exported up to {self.watermark}"
+
+class WarehouseTombstone(models.Model):
+    """A deleted or archived row, exported so the warehouse can drop it too"""
+    REASONS = [
+        ('deleted', 'Deleted'),
+        ('archived', 'Archived'),
+    ]
+    
+    table = models.CharField(max_length=50, help_text="Warehouse table name")
+    row_id = models.CharField(max_length=36)
+    reason = models.CharField(max_length=10, choices=REASONS, default='deleted')
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"{self.table} {self.row_id} {self.reason} at {self.deleted_at}"
+
+class DigestLog(models.Model):
+    """Monthly digest email sent (or failing) to a household, so re-runs skip it"""
+    STATUSES = [
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, related_name='digest_logs')
+    month_year = models.DateField()
+    email = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUSES)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.CharField(max_length=500, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.household.name} - {self.month_year} digest ({self.status})"
+    
+    class Meta:
+        unique_together = ['household', 'month_year']
+
+class ApiKey(models.Model):
+    """Revocable API key of a household; only a keyed digest of the key is stored"""
+    SCOPES = [
+        ('read', 'Read only'),
+        ('write', 'Read and write'),
+    ]
+    
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, related_name='api_keys')
+    name = models.CharField(max_length=100)
+    prefix = models.CharField(max_length=16, unique=True, help_text="Public part of the key, shown to identify it")
+    key_hash = models.CharField(max_length=64)
+    scope = models.CharField(max_length=10, choices=SCOPES, default='read')
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(null=True, blank=True)
+    revoked_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.household.name} - {self.name} ({self.prefix}, {self.scope})"
+    
+    class Meta:
+        ordering = ['-created_at']
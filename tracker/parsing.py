@@ -0,0 +1,211 @@
+"""Table extraction from scraped pages.
+
+Each source has a declarative TableSpec naming the table to read and which
+cells become which fields. Only that table is extracted: the lxml parser
+streams the page through a pull parser that reports tables and rows only
+and discards rows once they are read, and the fallback restricts
+BeautifulSoup to tables with a SoupStrainer instead of building a tree of
+the whole page.
+"""
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    from lxml import etree
+except ImportError:  # pragma: no cover - lxml is in requirements.txt
+    etree = None
+
+NUMBER_PATTERN = re.compile(r'^-?[\d,]*\.?\d+$')
+FEED_CHUNK_SIZE = 64 * 1024
+
+
+def clean_value(text):
+    """Strip a cell's text and convert numbers (with thousands separators) to float"""
+    text = ' '.join(text.split())
+    return float(text.replace(',', '')) if NUMBER_PATTERN.match(text) else text
+
+
+class TableSpec:
+    """Which table of a page to read and how its cells map to fields.
+
+    table: attributes identifying the table, e.g. {'id': 'prices'}; empty
+        matches the first table of the page.
+    columns: field name -> column index, or header text (case-insensitive)
+        looked up in the table's header row.
+    numeric: fields that must parse as numbers; rows where they don't
+        (sub-headings, footnotes) are skipped.
+    """
+
+    def __init__(self, columns, table=None, numeric=()):
+        self.columns = columns
+        self.table = table or {}
+        self.numeric = set(numeric)
+
+    @classmethod
+    def from_dict(cls, spec):
+        return cls(spec['columns'], spec.get('table'), spec.get('numeric', ()))
+
+    def matches(self, attributes):
+        for name, expected in self.table.items():
+            value = attributes.get(name)
+            if name == 'class':
+                if value is None or expected not in value.split():
+                    return False
+            elif value != expected:
+                return False
+        return True
+
+    def resolve_columns(self, header):
+        """Field -> index, resolving header names against the header row cells"""
+        header = [' '.join(cell.split()).lower() for cell in header or []]
+        resolved = {}
+        for field, column in self.columns.items():
+            if isinstance(column, int):
+                resolved[field] = column
+            elif column.lower() in header:
+                resolved[field] = header.index(column.lower())
+        return resolved
+
+    def needs_header(self):
+        return any(not isinstance(column, int) for column in self.columns.values())
+
+    def build_row(self, cells, columns):
+        row = {}
+        for field, index in columns.items():
+            if index >= len(cells):
+                return None
+            value = clean_value(cells[index])
+            if field in self.numeric and not isinstance(value, float):
+                return None
+            row[field] = value
+        return row if len(row) == len(self.columns) else None
+
+
+class RowCollector:
+    """Turns the cell texts of consecutive table rows into field dicts"""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.columns = None if spec.needs_header() else spec.resolve_columns(None)
+        self.rows = []
+
+    def add(self, cells, is_header):
+        if self.columns is None:
+            if is_header:
+                self.columns = self.spec.resolve_columns(cells)
+            return
+        if is_header:
+            return
+        row = self.spec.build_row(cells, self.columns)
+        if row is not None:
+            self.rows.append(row)
+
+
+class LxmlTableParser:
+    """Streams the page through lxml's pull parser, reporting only tables and rows"""
+
+    name = 'lxml'
+
+    def parse(self, html, spec):
+        if isinstance(html, str):
+            html = html.encode('utf-8')
+        # Events only for <table> and <tr>: the rest of the page is parsed in C
+        # without surfacing in Python
+        parser = etree.HTMLPullParser(events=('start', 'end'), tag=('table', 'tr'), encoding='utf-8')
+        collector = RowCollector(spec)
+        depth = 0  # nesting of tables inside the target table
+        found = done = False
+
+        for offset in range(0, len(html), FEED_CHUNK_SIZE):
+            parser.feed(html[offset:offset + FEED_CHUNK_SIZE])
+            for event, element in parser.read_events():
+                if element.tag == 'table':
+                    if event == 'start':
+                        if found:
+                            depth += 1
+                        elif not done and spec.matches(element.attrib):
+                            found = True
+                    elif found:
+                        if depth:
+                            depth -= 1
+                        else:
+                            found, done = False, True
+                    continue
+                if event == 'start':
+                    continue
+
+                if found and not depth:
+                    cells = [cell for cell in element if cell.tag in ('td', 'th')]
+                    collector.add(
+                        [''.join(cell.itertext()) for cell in cells],
+                        is_header=bool(cells) and all(cell.tag == 'th' for cell in cells),
+                    )
+                if not depth:
+                    # Drop finished rows so memory stays bounded by one row
+                    element.clear()
+                    parent = element.getparent()
+                    while parent is not None and element.getprevious() is not None:
+                        del parent[0]
+            if done:
+                break
+        if not done:
+            parser.close()
+        return collector.rows
+
+
+class StrainedSoupParser:
+    """BeautifulSoup limited to <table> elements with a SoupStrainer"""
+
+    name = 'soupstrainer'
+
+    def __init__(self, features='html.parser'):
+        self.features = features
+
+    def parse(self, html, spec):
+        soup = BeautifulSoup(html, self.features, parse_only=SoupStrainer('table'))
+        return soup_rows(soup, spec)
+
+
+class FullSoupParser:
+    """Full BeautifulSoup tree of the page (reference for benchmarks)"""
+
+    name = 'beautifulsoup'
+
+    def parse(self, html, spec):
+        return soup_rows(BeautifulSoup(html, 'html.parser'), spec)
+
+
+def soup_rows(soup, spec):
+    table = None
+    for candidate in soup.find_all('table'):
+        if spec.matches({name: ' '.join(value) if isinstance(value, list) else value
+                         for name, value in candidate.attrs.items()}):
+            table = candidate
+            break
+    if table is None:
+        return []
+    collector = RowCollector(spec)
+    for row in table.find_all('tr'):
+        if row.find_parent('table') is not table:
+            continue
+        cells = row.find_all(['td', 'th'], recursive=False)
+        collector.add(
+            [cell.get_text() for cell in cells],
+            is_header=bool(cells) and all(cell.name == 'th' for cell in cells),
+        )
+    return collector.rows
+
+
+PARSERS = {
+    'lxml': LxmlTableParser,
+    'soupstrainer': StrainedSoupParser,
+    'beautifulsoup': FullSoupParser,
+}
+
+
+def get_parser(name=None):
+    """Parser by name, defaulting to lxml when it is installed"""
+    if name is None:
+        name = 'lxml' if etree is not None else 'soupstrainer'
+    return PARSERS[name]()
@@ -0,0 +1,168 @@
+"""Fuel price time series: latest-price index, history ranges and downsampling.
+
+LatestFuelPrice holds one row per (state, fuel) and is upserted whenever a
+FuelPrice is saved, so "current prices for a state" is an indexed lookup
+instead of a GROUP BY over the whole history. Old daily rows are rolled up
+into one row per month to keep the history table bounded.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import TruncMonth
+
+from .models import FuelPrice, LatestFuelPrice
+from .tombstones import deletion_batch
+
+logger = logging.getLogger('tracker')
+
+CENTS = Decimal('0.01')
+
+_paused = threading.local()
+
+
+def _as_date(value):
+    # FuelPrice.date_recorded defaults to timezone.now, a datetime
+    return value.date() if isinstance(value, datetime) else value
+
+
+def record_latest(fuel_price):
+    """Upsert the latest-price row if this price is at least as recent"""
+    date_recorded = _as_date(fuel_price.date_recorded)
+    values = {
+        'price': fuel_price.price,
+        'unit': fuel_price.unit,
+        'date_recorded': date_recorded,
+        'source': fuel_price.source,
+    }
+    updated = LatestFuelPrice.objects.filter(
+        state_id=fuel_price.state_id,
+        fuel_type=fuel_price.fuel_type,
+        date_recorded__lte=date_recorded,
+    ).update(**values)
+    if not updated:
+        # Either no row yet, or the stored one is newer and stays
+        LatestFuelPrice.objects.get_or_create(
+            state_id=fuel_price.state_id, fuel_type=fuel_price.fuel_type, defaults=values
+        )
+
+
+def rebuild_latest(state_id=None, fuel_type=None):
+    """Recompute latest-price rows from the history, optionally for one state/fuel"""
+    history = FuelPrice.objects.all()
+    if state_id is not None:
+        history = history.filter(state_id=state_id)
+    if fuel_type is not None:
+        history = history.filter(fuel_type=fuel_type)
+
+    newest = FuelPrice.objects.filter(
+        state_id=OuterRef('state_id'), fuel_type=OuterRef('fuel_type')
+    ).order_by('-date_recorded').values('date_recorded')[:1]
+    rows = [
+        LatestFuelPrice(
+            state_id=price.state_id, fuel_type=price.fuel_type, price=price.price,
+            unit=price.unit, date_recorded=price.date_recorded, source=price.source,
+        )
+        for price in history.filter(date_recorded=Subquery(newest))
+    ]
+
+    with transaction.atomic():
+        stale = LatestFuelPrice.objects.all()
+        if state_id is not None:
+            stale = stale.filter(state_id=state_id)
+        if fuel_type is not None:
+            stale = stale.filter(fuel_type=fuel_type)
+        stale.delete()
+        LatestFuelPrice.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def refresh_latest(fuel_price):
+    """post_delete handler body: rebuild the latest price of the deleted row's state and fuel"""
+    if not getattr(_paused, 'active', False):
+        rebuild_latest(state_id=fuel_price.state_id, fuel_type=fuel_price.fuel_type)
+
+
+@contextmanager
+def latest_refresh_paused():
+    """Skip the per-row latest-price rebuild of deletes in the block; the caller rebuilds"""
+    previous = getattr(_paused, 'active', False)
+    _paused.active = True
+    try:
+        yield
+    finally:
+        _paused.active = previous
+
+
+def latest_prices(state):
+    """Current price of every fuel in a state"""
+    return LatestFuelPrice.objects.filter(state=state)
+
+
+def price_history(state, fuel_type, start=None, end=None):
+    """(date_recorded, price) rows for a state and fuel, oldest first"""
+    history = FuelPrice.objects.filter(state=state, fuel_type=fuel_type)
+    if start:
+        history = history.filter(date_recorded__gte=start)
+    if end:
+        history = history.filter(date_recorded__lte=end)
+    return history.order_by('date_recorded').values('date_recorded', 'price', 'unit')
+
+
+def downsample_prices(before, dry_run=False, batch_size=200):
+    """Roll daily prices recorded before a date up into one row per month.
+
+    Each (state, fuel, month) keeps a single row dated the first of the month
+    holding the average price. Months that are already downsampled are left
+    alone, so the job can run repeatedly.
+    """
+    groups = list(
+        FuelPrice.objects.filter(date_recorded__lt=before)
+        .annotate(month=TruncMonth('date_recorded'))
+        .values('state_id', 'fuel_type', 'month')
+        .annotate(
+            average=Avg('price'), rows=Count('id'), first_day=Min('date_recorded'),
+            unit=Max('unit'), source=Max('source'),
+        )
+        .filter(Q(rows__gt=1) | ~Q(first_day=F('month')))
+        .order_by()
+    )
+    removed = sum(group['rows'] for group in groups) - len(groups)
+    if dry_run or not groups:
+        return len(groups), removed
+
+    for offset in range(0, len(groups), batch_size):
+        batch = groups[offset:offset + batch_size]
+        condition = Q()
+        for group in batch:
+            month = group['month']
+            next_month = month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+            condition |= Q(
+                state_id=group['state_id'], fuel_type=group['fuel_type'],
+                date_recorded__gte=month, date_recorded__lt=next_month,
+            )
+        monthly = [
+            FuelPrice(
+                state_id=group['state_id'], fuel_type=group['fuel_type'],
+                price=Decimal(str(group['average'])).quantize(CENTS), unit=group['unit'],
+                date_recorded=group['month'], source=group['source'],
+            )
+            for group in batch
+        ]
+        pks = list(FuelPrice.objects.filter(condition).values_list('pk', flat=True))
+        # Rebuilding the latest price per deleted row would run before the
+        # monthly rows exist and empty LatestFuelPrice; it is rebuilt below
+        with transaction.atomic(), deletion_batch(), latest_refresh_paused():
+            FuelPrice.objects.filter(pk__in=pks).delete()
+            FuelPrice.objects.bulk_create(monthly)
+
+    # A rolled-up month may have held the latest price
+    for state_id, fuel_type in {(group['state_id'], group['fuel_type']) for group in groups}:
+        rebuild_latest(state_id=state_id, fuel_type=fuel_type)
+
+    logger.info(f"Downsampled {len(groups)} fuel price months, removed {removed} daily rows")
+    return len(groups), removed
@@ -0,0 +1,205 @@
+"""Eco tip recommendations per household.
+
+Households and tips are described over the same features: emission
+categories plus usage groups (electricity, cooking fuel, cars, flights,
+meat, ...). A household's vector holds its kg CO2 per feature in its latest
+month; a tip's holds its category and the usage groups its text mentions.
+Scores for a batch of households against every active tip are one matrix
+product, weighted by each tip's potential reduction, and the top tips per
+household are stored in TipRecommendation, so a recommend_tips run serves
+every web process and the dashboard reads them with one query. A new
+month deletes the household's row and a tip change deletes them all; the
+next dashboard load computes them again.
+"""
+import logging
+import re
+
+import numpy as np
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import (
+    Household, MonthlyEmissionSummary, EnergyUsage, TransportUsage, DietEmission, EcoTip, TipRecommendation,
+)
+
+logger = logging.getLogger('tracker')
+
+DEFAULT_BATCH_SIZE = 5000
+TOP_K = 10
+# Scores are multiplied by (1 + potential_reduction / REDUCTION_SCALE)
+REDUCTION_SCALE = 100.0
+# Share of a household's total counted towards general tips
+GENERAL_SHARE = 0.05
+
+FEATURES = [
+    'energy', 'transport', 'diet', 'waste', 'general',
+    'electricity', 'cooking_fuel', 'car', 'two_wheeler', 'flight', 'public_transport', 'meat',
+]
+FEATURE_INDEX = {feature: i for i, feature in enumerate(FEATURES)}
+
+ENERGY_GROUPS = {
+    'electricity': 'electricity',
+    'lpg': 'cooking_fuel', 'cng': 'cooking_fuel', 'kerosene': 'cooking_fuel',
+    'wood': 'cooking_fuel', 'coal': 'cooking_fuel',
+}
+TRANSPORT_GROUPS = {
+    'car_petrol': 'car', 'car_diesel': 'car', 'car_cng': 'car',
+    'bike': 'two_wheeler', 'auto': 'two_wheeler',
+    'flight_domestic': 'flight', 'flight_international': 'flight',
+    'bus': 'public_transport', 'train': 'public_transport', 'metro': 'public_transport',
+}
+MEAT_DIETS = {'pescatarian', 'chicken', 'mutton', 'mixed'}
+
+# Words in a tip's title or content that tie it to a usage group
+TIP_KEYWORDS = {
+    'electricity': {'electricity', 'electric', 'led', 'bulb', 'bulbs', 'appliance', 'appliances', 'ac',
+                    'fan', 'fans', 'solar', 'unplug', 'light', 'lighting', 'refrigerator', 'kwh'},
+    'cooking_fuel': {'lpg', 'gas', 'cooking', 'stove', 'cylinder', 'cooker', 'kerosene', 'induction'},
+    'car': {'car', 'cars', 'carpool', 'carpooling', 'drive', 'driving', 'fuel', 'petrol', 'diesel',
+            'tire', 'tires', 'tyre', 'tyres', 'vehicle', 'vehicles', 'rideshare'},
+    'two_wheeler': {'motorcycle', 'scooter', 'two', 'wheeler'},
+    'flight': {'flight', 'flights', 'fly', 'flying', 'airline'},
+    'public_transport': {'bus', 'buses', 'train', 'trains', 'metro', 'public', 'transportation'},
+    'meat': {'meat', 'chicken', 'mutton', 'beef', 'livestock', 'vegetarian', 'vegan', 'plant'},
+    'waste': {'waste', 'compost', 'leftovers', 'leftover', 'recycle', 'recycling'},
+}
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def tip_matrix(tips):
+    """Unit feature vectors of tips (tips x features) and their reduction weights"""
+    vectors = np.zeros((len(tips), len(FEATURES)))
+    weights = np.empty(len(tips))
+    for i, tip in enumerate(tips):
+        if tip.category in FEATURE_INDEX:
+            vectors[i, FEATURE_INDEX[tip.category]] = 1.0
+        words = set(WORD_PATTERN.findall(f'{tip.title} {tip.content}'.lower()))
+        for feature, keywords in TIP_KEYWORDS.items():
+            if words & keywords:
+                vectors[i, FEATURE_INDEX[feature]] = 1.0
+        weights[i] = 1 + (tip.potential_reduction or 0) / REDUCTION_SCALE
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1), weights
+
+
+def household_matrix(household_ids):
+    """Unit feature vectors (households x features) from each household's latest month"""
+    positions = {household_id: i for i, household_id in enumerate(household_ids)}
+    vectors = np.zeros((len(household_ids), len(FEATURES)))
+
+    # The dashboard opens an empty summary for the current month; skip those
+    latest_month = MonthlyEmissionSummary.objects.filter(
+        household_id=OuterRef('household_id'), total_emissions__gt=0
+    ).order_by('-month_year').values('month_year')[:1]
+
+    summaries = MonthlyEmissionSummary.objects.filter(
+        household_id__in=household_ids, month_year=Subquery(latest_month)
+    ).values_list('household_id', 'total_energy_emissions', 'total_transport_emissions',
+                  'total_diet_emissions', 'total_emissions')
+    for household_id, energy, transport, diet, total in summaries:
+        row = vectors[positions[household_id]]
+        row[FEATURE_INDEX['energy']] = energy
+        row[FEATURE_INDEX['transport']] = transport
+        row[FEATURE_INDEX['diet']] = diet
+        row[FEATURE_INDEX['general']] = GENERAL_SHARE * total
+
+    for model, source_field, groups in (
+        (EnergyUsage, 'energy_source', ENERGY_GROUPS),
+        (TransportUsage, 'transport_mode', TRANSPORT_GROUPS),
+    ):
+        usage = model.objects.filter(
+            household_id__in=household_ids, month_year=Subquery(latest_month)
+        ).values('household_id', source_field).annotate(emissions=Sum('emission_calculated')).order_by()
+        for row in usage:
+            feature = groups.get(row[source_field])
+            if feature:
+                vectors[positions[row['household_id']], FEATURE_INDEX[feature]] += row['emissions'] or 0
+
+    diets = DietEmission.objects.filter(
+        household_id__in=household_ids, month_year=Subquery(latest_month)
+    ).values_list('household_id', 'diet_type', 'food_waste_percentage', 'emission_calculated')
+    for household_id, diet_type, waste_percentage, emissions in diets:
+        row = vectors[positions[household_id]]
+        if diet_type in MEAT_DIETS:
+            row[FEATURE_INDEX['meat']] += emissions or 0
+        row[FEATURE_INDEX['waste']] += (emissions or 0) * (waste_percentage or 0) / 100
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def top_tips(household_vectors, tip_vectors, tip_weights, k=TOP_K):
+    """Indexes of the k best tips per household, best first"""
+    scores = (household_vectors @ tip_vectors.T) * tip_weights
+    # Households without data score 0 everywhere and get the biggest reductions
+    scores += 1e-9 * tip_weights
+    k = min(k, scores.shape[1])
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1)
+    return np.take_along_axis(best, order, axis=1)
+
+
+def tip_entry(tip):
+    """What the dashboard shows of a tip"""
+    return {
+        'id': tip.pk,
+        'title': tip.title,
+        'content': tip.content,
+        'category': tip.category,
+        'potential_reduction': tip.potential_reduction,
+    }
+
+
+def load_tips():
+    return list(EcoTip.objects.filter(is_active=True).only(
+        'title', 'content', 'category', 'potential_reduction'
+    ).order_by('pk'))
+
+
+def compute_recommendations(household_ids, tips=None, k=TOP_K):
+    """Top-k tip entries per household, computed as one batch and stored"""
+    if tips is None:
+        tips = load_tips()
+    if not tips or not household_ids:
+        return {}
+    tip_vectors, tip_weights = tip_matrix(tips)
+    best = top_tips(household_matrix(household_ids), tip_vectors, tip_weights, k)
+    recommendations = {
+        household_id: [tip_entry(tips[j]) for j in best[i]]
+        for i, household_id in enumerate(household_ids)
+    }
+    computed_at = timezone.now()
+    TipRecommendation.objects.bulk_create(
+        [
+            TipRecommendation(household_id=household_id, tips=entries, computed_at=computed_at)
+            for household_id, entries in recommendations.items()
+        ],
+        update_conflicts=True, unique_fields=['household'], update_fields=['tips', 'computed_at'],
+    )
+    return recommendations
+
+
+def compute_all_recommendations(batch_size=DEFAULT_BATCH_SIZE, k=TOP_K):
+    """Recommend tips to every household, one matrix product per batch"""
+    tips = load_tips()
+    household_ids = list(Household.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(household_ids), batch_size):
+        compute_recommendations(household_ids[start:start + batch_size], tips, k)
+    logger.info(f"Computed tip recommendations for {len(household_ids)} households over {len(tips)} tips")
+    return len(household_ids)
+
+
+def recommended_tips(household_id, count=3):
+    """Stored recommendations for a household, computing them if there are none"""
+    stored = TipRecommendation.objects.filter(household_id=household_id).values_list('tips', flat=True)
+    for entries in stored:
+        return entries[:count]
+    return compute_recommendations([household_id]).get(household_id, [])[:count]
+
+
+def invalidate_recommendations(household_ids=None):
+    """Drop the stored recommendations of some households, or everyone's"""
+    stored = TipRecommendation.objects.all()
+    if household_ids is not None:
+        stored = stored.filter(household_id__in=household_ids)
+    stored.delete()
@@ -0,0 +1,95 @@
+"""Faster renderers and parsers for the API.
+
+OrjsonRenderer writes JSON like DRF's JSONRenderer (compact, UTF-8, dates
+in ISO 8601 with "Z" for UTC, U+2028/U+2029 escaped) several times faster.
+Values orjson has no native encoding for (decimals, lazy strings, sets,
+NumPy values, ...) go through DRF's encoder, so they come out as before.
+The output decodes to the same data but is not always byte-identical:
+float exponents are written without a sign (1e20, not 1e+20) and NaN is
+written as null where JSONRenderer refuses it. Data orjson can't encode at
+all, such as integers wider than 64 bits, is rendered by JSONRenderer.
+MessagePackRenderer serves the same data as application/msgpack, for
+clients sending that Accept header (or ?format=msgpack). Dates and decimals
+are encoded as in the JSON output. The parsers read request bodies in
+either format.
+"""
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is in requirements.txt
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+
+# Types neither library encodes natively are converted as DRF's JSON encoder does
+encode_default = JSONEncoder().default
+
+
+class OrjsonRenderer(renderers.JSONRenderer):
+    """JSONRenderer output, encoded with orjson"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or indent is not None or self.ensure_ascii:
+            # Pretty-printed and ASCII-only output keep the standard encoder
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            content = orjson.dumps(
+                data, default=encode_default,
+                option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+            )
+        except TypeError:
+            # orjson.JSONEncodeError, e.g. for integers over 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping as JSONRenderer, keeping the output a JavaScript subset
+        return content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    media_type = MSGPACK_MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if msgpack is None:
+            raise RuntimeError('msgpack is required to render MessagePack responses')
+        return msgpack.packb(data, default=encode_default, use_bin_type=True, datetime=False)
+
+
+class OrjsonParser(JSONParser):
+    """JSONParser decoding with orjson"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as error:
+            raise ParseError(f'JSON parse error - {error}')
+
+
+class MessagePackParser(BaseParser):
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if msgpack is None:
+            raise ParseError('MessagePack request bodies are not supported')
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as error:
+            raise ParseError(f'MessagePack parse error - {error or type(error).__name__}')
@@ -0,0 +1,170 @@
+"""Read replica routing.
+
+Views wrapped in `use_replica` (reports, charts, summary API) read from a
+replica alias listed in CARBON_FOOTPRINT_SETTINGS['REPLICAS']; everything
+else, and every write, uses the primary. Replicas are checked for lag at
+most every LAG_CHECK_SECONDS and skipped while behind by more than
+MAX_LAG_SECONDS or unreachable, falling back to the primary.
+
+Read-your-writes: once a request writes, the rest of it reads from the
+primary, and when it was a POST (or other unsafe method) the client is
+pinned to the primary for STICKY_SECONDS with a cookie, so the page it is
+redirected to shows what it just saved.
+"""
+import functools
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger('tracker')
+
+REPLICA_DEFAULTS = {
+    'ALIASES': [],
+    'STICKY_SECONDS': 10,
+    'MAX_LAG_SECONDS': 5,
+    'LAG_CHECK_SECONDS': 5,
+}
+PIN_COOKIE = 'carbontrack_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Seconds a PostgreSQL standby is behind; 0 on a primary or when caught up
+POSTGRES_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+_replica_reads = ContextVar('tracker_replica_reads', default=False)
+_pinned = ContextVar('tracker_primary_pinned', default=False)
+_wrote = ContextVar('tracker_wrote', default=False)
+
+
+def get_replica_setting(name):
+    configured = settings.CARBON_FOOTPRINT_SETTINGS.get('REPLICAS', {})
+    return configured.get(name, REPLICA_DEFAULTS[name])
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind the primary (None when unreachable)"""
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(POSTGRES_LAG_SQL)
+                return float(cursor.fetchone()[0])
+            # No replication to measure (e.g. a copied SQLite file used for
+            # local testing): a replica that answers is up to date
+            cursor.execute('SELECT 1')
+            return 0.0
+    except Exception as exc:
+        logger.warning(f"Replica {alias} unavailable: {exc}")
+        return None
+
+
+class ReplicaHealth:
+    """Recently measured lag of each replica"""
+
+    def __init__(self):
+        self._checked = {}
+        self._lock = threading.Lock()
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            checked = self._checked.get(alias)
+        if checked is None or now - checked[0] > get_replica_setting('LAG_CHECK_SECONDS'):
+            lag = replica_lag(alias)
+            healthy = lag is not None and lag <= get_replica_setting('MAX_LAG_SECONDS')
+            if lag is not None and not healthy:
+                logger.warning(f"Replica {alias} is {lag:.1f}s behind, reading from the primary")
+            with self._lock:
+                self._checked[alias] = (now, healthy)
+            return healthy
+        return checked[1]
+
+    def clear(self):
+        with self._lock:
+            self._checked.clear()
+
+
+replica_health = ReplicaHealth()
+
+
+def choose_replica():
+    """A healthy replica alias, or None to read from the primary"""
+    aliases = [alias for alias in get_replica_setting('ALIASES') if alias in connections.databases]
+    random.shuffle(aliases)
+    for alias in aliases:
+        if replica_health.is_healthy(alias):
+            return alias
+    return None
+
+
+class ReplicaRouter:
+    """Sends reads inside `use_replica` views to a replica, everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or _pinned.get() or _wrote.get():
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return choose_replica()
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *get_replica_setting('ALIASES')}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def use_replica(view):
+    """Let the read-only (GET/HEAD) requests of a view read from a replica"""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        token = _replica_reads.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+
+    return wrapper
+
+
+class PrimaryPinMiddleware:
+    """Reads from the primary for a short while after a client writes"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        pinned = _pinned.set(pinned_until > time.time())
+        wrote = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get() and request.method not in SAFE_METHODS:
+                sticky = get_replica_setting('STICKY_SECONDS')
+                response.set_cookie(
+                    PIN_COOKIE, str(int(time.time() + sticky)), max_age=sticky, httponly=True, samesite='Lax'
+                )
+            return response
+        finally:
+            _pinned.reset(pinned)
+            _wrote.reset(wrote)
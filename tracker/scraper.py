@@ -1,21 +1,57 @@
-import requests
-from bs4 import BeautifulSoup
-import re
 from datetime import datetime
-from django.conf import settings
 import logging
 from .models import FuelPrice, IndianState, EcoTip
+from .fetch import get_client, get_scraper_setting
+from .parsing import TableSpec, get_parser
+from .tips import ingest_tips
 
 logger = logging.getLogger('tracker')
 
-class FuelPriceScraper:
-    """Scraper for Indian fuel prices from various sources"""
+# Declarative extraction spec per source; SCRAPER['SPECS'] entries override these
+SOURCE_SPECS = {
+    'petrol_diesel': {'columns': {'state': 'State', 'petrol': 'Petrol', 'diesel': 'Diesel'}, 'numeric': ['petrol', 'diesel']},
+    'lpg': {'columns': {'state': 'State', 'price': 'Price'}, 'numeric': ['price']},
+    'electricity': {'columns': {'state': 'State', 'rate': 'Rate'}, 'numeric': ['rate']},
+    'energy_tips': {
+        'columns': {'title': 'Title', 'content': 'Content', 'potential_reduction': 'Potential Reduction', 'source_url': 'Source URL'},
+        'numeric': ['potential_reduction'],
+    },
+}
+SOURCE_SPECS['transport_tips'] = SOURCE_SPECS['diet_tips'] = SOURCE_SPECS['energy_tips']
+
+def get_source_spec(source):
+    spec = get_scraper_setting('SPECS').get(source) or SOURCE_SPECS[source]
+    return TableSpec.from_dict(spec)
+
+class BaseScraper:
+    """Common source loading for the scrapers"""
+    
+    def __init__(self, client=None):
+        self.client = client or get_client()
+        self.session = self.client.session
+        self.fetched = {}
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+    def fetch_rows(self, source, sample_rows):
+        """Rows of a configured source page, the sample rows when it has no URL, or None if unchanged"""
+        url = get_scraper_setting('SOURCES').get(source)
+        if not url:
+            return sample_rows
+        result = self.client.fetch(url)
+        if result.not_modified:
+            logger.info(f"Source {source} unchanged since last run, skipping")
+            return None
+        rows = get_parser(get_scraper_setting('PARSER')).parse(result.text, get_source_spec(source))
+        self.fetched[source] = result
+        return rows
+    
+    def ingested(self, source):
+        """Mark a fetched source as saved, so the next run may skip it if unchanged"""
+        result = self.fetched.pop(source, None)
+        if result:
+            result.commit()
+
+class FuelPriceScraper(BaseScraper):
+    """Scraper for Indian fuel prices from various sources"""
     
     def scrape_petrol_diesel_prices(self):
         """Scrape petrol and diesel prices from multiple sources"""
@@ -36,7 +72,12 @@ class FuelPriceScraper:
                 {'state': 'Ahmedabad', 'petrol': 96.46, 'diesel': 92.56},
             ]
             
-            for data in sample_data:
+            rows = self.fetch_rows('petrol_diesel', sample_data)
+            if rows is None:
+                return []
+            
+            failed = False
+            for data in rows:
                 try:
                     state, created = IndianState.objects.get_or_create(
                         name=data['state']
@@ -69,8 +110,11 @@ class FuelPriceScraper:
                     prices_data.append(data)
                     
                 except Exception as e:
+                    failed = True
                     logger.error(f"Error saving fuel price for {data['state']}: {e}")
             
+            if not failed:
+                self.ingested('petrol_diesel')
             logger.info(f"Successfully scraped fuel prices for {len(prices_data)} states")
             return prices_data
             
@@ -91,7 +135,12 @@ class FuelPriceScraper:
                 {'state': 'Hyderabad', 'price': 845.50},
             ]
             
-            for data in lpg_prices:
+            rows = self.fetch_rows('lpg', lpg_prices)
+            if rows is None:
+                return []
+            
+            failed = False
+            for data in rows:
                 try:
                     state, created = IndianState.objects.get_or_create(
                         name=data['state']
@@ -109,10 +158,13 @@ class FuelPriceScraper:
                     )
                     
                 except Exception as e:
+                    failed = True
                     logger.error(f"Error saving LPG price for {data['state']}: {e}")
             
-            logger.info(f"Successfully scraped LPG prices for {len(lpg_prices)} states")
-            return lpg_prices
+            if not failed:
+                self.ingested('lpg')
+            logger.info(f"Successfully scraped LPG prices for {len(rows)} states")
+            return rows
             
         except Exception as e:
             logger.error(f"Error scraping LPG prices: {e}")
@@ -131,7 +183,12 @@ class FuelPriceScraper:
                 {'state': 'Hyderabad', 'rate': 2.82},
             ]
             
-            for data in electricity_rates:
+            rows = self.fetch_rows('electricity', electricity_rates)
+            if rows is None:
+                return []
+            
+            failed = False
+            for data in rows:
                 try:
                     state, created = IndianState.objects.get_or_create(
                         name=data['state']
@@ -149,24 +206,21 @@ class FuelPriceScraper:
                     )
                     
                 except Exception as e:
+                    failed = True
                     logger.error(f"Error saving electricity rate for {data['state']}: {e}")
             
-            logger.info(f"Successfully scraped electricity rates for {len(electricity_rates)} states")
-            return electricity_rates
+            if not failed:
+                self.ingested('electricity')
+            logger.info(f"Successfully scraped electricity rates for {len(rows)} states")
+            return rows
             
         except Exception as e:
             logger.error(f"Error scraping electricity rates: {e}")
             return []
 
-class EcoTipsScraper:
+class EcoTipsScraper(BaseScraper):
     """Scraper for eco-friendly tips and environmental news"""
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-    
     def scrape_energy_tips(self):
         """Scrape energy saving tips"""
         try:
@@ -204,23 +258,12 @@ class EcoTipsScraper:
                 }
             ]
             
-            saved_tips = []
-            for tip_data in energy_tips:
-                try:
-                    tip, created = EcoTip.objects.get_or_create(
-                        title=tip_data['title'],
-                        defaults={
-                            'content': tip_data['content'],
-                            'category': 'energy',
-                            'potential_reduction': tip_data['potential_reduction'],
-                            'source_url': tip_data['source_url'],
-                            'is_active': True
-                        }
-                    )
-                    if created:
-                        saved_tips.append(tip)
-                except Exception as e:
-                    logger.error(f"Error saving energy tip: {e}")
+            rows = self.fetch_rows('energy_tips', energy_tips)
+            if rows is None:
+                return []
+            
+            saved_tips = ingest_tips(rows, category='energy')
+            self.ingested('energy_tips')
             
             logger.info(f"Successfully scraped {len(saved_tips)} energy tips")
             return saved_tips
@@ -265,23 +308,12 @@ class EcoTipsScraper:
                 }
             ]
             
-            saved_tips = []
-            for tip_data in transport_tips:
-                try:
-                    tip, created = EcoTip.objects.get_or_create(
-                        title=tip_data['title'],
-                        defaults={
-                            'content': tip_data['content'],
-                            'category': 'transport',
-                            'potential_reduction': tip_data['potential_reduction'],
-                            'source_url': tip_data['source_url'],
-                            'is_active': True
-                        }
-                    )
-                    if created:
-                        saved_tips.append(tip)
-                except Exception as e:
-                    logger.error(f"Error saving transport tip: {e}")
+            rows = self.fetch_rows('transport_tips', transport_tips)
+            if rows is None:
+                return []
+            
+            saved_tips = ingest_tips(rows, category='transport')
+            self.ingested('transport_tips')
             
             logger.info(f"Successfully scraped {len(saved_tips)} transport tips")
             return saved_tips
@@ -326,23 +358,12 @@ class EcoTipsScraper:
                 }
             ]
             
-            saved_tips = []
-            for tip_data in diet_tips:
-                try:
-                    tip, created = EcoTip.objects.get_or_create(
-                        title=tip_data['title'],
-                        defaults={
-                            'content': tip_data['content'],
-                            'category': 'diet',
-                            'potential_reduction': tip_data['potential_reduction'],
-                            'source_url': tip_data['source_url'],
-                            'is_active': True
-                        }
-                    )
-                    if created:
-                        saved_tips.append(tip)
-                except Exception as e:
-                    logger.error(f"Error saving diet tip: {e}")
+            rows = self.fetch_rows('diet_tips', diet_tips)
+            if rows is None:
+                return []
+            
+            saved_tips = ingest_tips(rows, category='diet')
+            self.ingested('diet_tips')
             
             logger.info(f"Successfully scraped {len(saved_tips)} diet tips")
             return saved_tips
@@ -0,0 +1,262 @@
+"""Full-text search over eco tips.
+
+SQLite uses an FTS5 index kept in sync by triggers on the tips table;
+PostgreSQL uses a GIN index over the tsvector of title and content. Either
+way the index is created by a migration, follows every write to EcoTip,
+including bulk ones, and matches are ranked by text relevance weighted by
+potential_reduction.
+Other databases fall back to substring matching. Rankings are cached per
+query until tips change.
+"""
+import hashlib
+import logging
+import re
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+
+from .models import EcoTip
+
+logger = logging.getLogger('tracker')
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# Relevance is multiplied by (1 + potential_reduction / REDUCTION_SCALE)
+REDUCTION_SCALE = 100.0
+TITLE_WEIGHT = 5.0
+# Queries matching more tips than this are ranked without text relevance
+BROAD_QUERY_MATCHES = 2000
+SEARCH_CACHE_TIMEOUT = 5 * 60
+SEARCH_VERSION_KEY = 'tracker:tip-search:version'
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def query_terms(text):
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+class SearchBackend:
+    """Index maintenance and ranked queries for one database connection"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def match_clause(self, terms):
+        """FROM/WHERE clause selecting matching tips as `tip`, and its params"""
+        raise NotImplementedError
+
+    def relevance(self, terms):
+        """Text relevance expression (higher is better), and its params"""
+        raise NotImplementedError
+
+    def is_broad(self, match_sql, match_params):
+        # Scoring relevance costs a few microseconds per match; when a query
+        # matches most tips (common words only) it barely separates them
+        # anyway, so those are ranked by potential_reduction alone
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM (SELECT 1 {match_sql} LIMIT %s) AS matches',
+                match_params + [BROAD_QUERY_MATCHES + 1],
+            )
+            return cursor.fetchone()[0] > BROAD_QUERY_MATCHES
+
+    def search(self, terms, category, active_only, limit):
+        """(id, score) of the best matching tips"""
+        match_sql, match_params = self.match_clause(terms)
+        relevance_sql, relevance_params = self.relevance(terms)
+        if self.is_broad(match_sql, match_params):
+            relevance_sql, relevance_params = '1.0', []
+
+        sql = (
+            f'SELECT tip.id, ({relevance_sql}) * (1 + COALESCE(tip.potential_reduction, 0) / %s) AS score '
+            f'{match_sql}'
+        )
+        params = relevance_params + [REDUCTION_SCALE] + match_params
+        if category:
+            sql += ' AND tip.category = %s'
+            params.append(category)
+        if active_only:
+            sql += ' AND tip.is_active'
+        sql += ' ORDER BY score DESC LIMIT %s'
+        params.append(limit)
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """FTS5 external-content index on tracker_ecotip"""
+
+    TABLE = 'tracker_ecotip_fts'
+    SETUP = [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+            title, content, content='tracker_ecotip', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2', prefix='2 3')""",
+        f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_insert AFTER INSERT ON tracker_ecotip BEGIN
+            INSERT INTO {TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_delete AFTER DELETE ON tracker_ecotip BEGIN
+            INSERT INTO {TABLE}({TABLE}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_update AFTER UPDATE OF title, content ON tracker_ecotip BEGIN
+            INSERT INTO {TABLE}({TABLE}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+            INSERT INTO {TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END""",
+    ]
+
+    def is_installed(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [self.TABLE])
+            return cursor.fetchone() is not None
+
+    def install(self):
+        created = not self.is_installed()
+        with self.connection.cursor() as cursor:
+            for statement in self.SETUP:
+                cursor.execute(statement)
+        if created:
+            self.rebuild()
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.TABLE}({self.TABLE}) VALUES ('rebuild')")
+
+    def match_clause(self, terms):
+        # Quoted terms are never parsed as FTS5 operators; the last one is a
+        # prefix so results update while typing
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += '*'
+        return (
+            f'FROM {self.TABLE} JOIN tracker_ecotip AS tip ON tip.id = {self.TABLE}.rowid '
+            f'WHERE {self.TABLE} MATCH %s',
+            [' '.join(quoted)],
+        )
+
+    def relevance(self, terms):
+        # bm25() is lower for better matches
+        return f'-bm25({self.TABLE}, %s, 1.0)', [TITLE_WEIGHT]
+
+
+class PostgresSearchBackend(SearchBackend):
+    """GIN index over the English tsvector of title and content"""
+
+    INDEX = 'tracker_ecotip_search_idx'
+    DOCUMENT = "to_tsvector('english', coalesce(tip.title, '') || ' ' || coalesce(tip.content, ''))"
+
+    def is_installed(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT 1 FROM pg_indexes WHERE indexname = %s', [self.INDEX])
+            return cursor.fetchone() is not None
+
+    def install(self):
+        # The index is on an expression of the row, so PostgreSQL maintains it
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.INDEX} ON tracker_ecotip USING GIN "
+                f"({self.DOCUMENT.replace('tip.', '')})"
+            )
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'REINDEX INDEX {self.INDEX}')
+
+    def match_clause(self, terms):
+        query = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+        return (
+            f"FROM tracker_ecotip AS tip, to_tsquery('english', %s) AS query WHERE {self.DOCUMENT} @@ query",
+            [query],
+        )
+
+    def relevance(self, terms):
+        return (
+            "ts_rank(setweight(to_tsvector('english', coalesce(tip.title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(tip.content, '')), 'B'), query)",
+            [],
+        )
+
+
+class SubstringSearchBackend(SearchBackend):
+    """Unindexed fallback for databases without full-text search"""
+
+    def is_installed(self):
+        return True
+
+    def install(self):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, terms, category, active_only, limit):
+        tips = EcoTip.objects.using(self.connection.alias)
+        for term in terms:
+            tips = tips.filter(Q(title__icontains=term) | Q(content__icontains=term))
+        if category:
+            tips = tips.filter(category=category)
+        if active_only:
+            tips = tips.filter(is_active=True)
+        ranked = tips.order_by('-potential_reduction').values_list('id', 'potential_reduction')[:limit]
+        return [(tip_id, 1 + (reduction or 0) / REDUCTION_SCALE) for tip_id, reduction in ranked]
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+_installed = set()
+
+
+def get_search_backend(using='default'):
+    connection = connections[using]
+    return BACKENDS.get(connection.vendor, SubstringSearchBackend)(connection)
+
+
+def install_search_index(using='default'):
+    """Create the index (and its triggers) if missing"""
+    get_search_backend(using).install()
+    _installed.add(using)
+
+
+def invalidate_search_results():
+    """Forget cached rankings after tips change"""
+    try:
+        cache.incr(SEARCH_VERSION_KEY)
+    except ValueError:
+        cache.set(SEARCH_VERSION_KEY, 1, None)
+
+
+def ranked_ids(terms, category, active_only, limit, using):
+    """(id, score) rankings, cached per query until tips change"""
+    version = cache.get_or_set(SEARCH_VERSION_KEY, 1, None)
+    query = hashlib.md5(f"{using}|{category}|{active_only}|{limit}|{' '.join(terms)}".encode('utf-8')).hexdigest()
+    key = f'tracker:tip-search:{version}:{query}'
+    ranked = cache.get(key)
+    if ranked is None:
+        backend = get_search_backend(using)
+        if using not in _installed:
+            if not backend.is_installed():
+                logger.info('Creating eco tip search index')
+                backend.install()
+            _installed.add(using)
+        ranked = backend.search(terms, category, active_only, limit)
+        cache.set(key, ranked, SEARCH_CACHE_TIMEOUT)
+    return ranked
+
+
+def search_tips(text, category=None, active_only=True, limit=DEFAULT_LIMIT, using='default'):
+    """Tips matching a query, best first, each with a `search_score` attribute"""
+    terms = query_terms(text)
+    if not terms:
+        return []
+    ranked = ranked_ids(terms, category, active_only, limit, using)
+    tips = EcoTip.objects.using(using).in_bulk([tip_id for tip_id, _ in ranked])
+    results = []
+    for tip_id, score in ranked:
+        tip = tips.get(tip_id)
+        if tip is not None:
+            tip.search_score = score
+            results.append(tip)
+    return results
@@ -0,0 +1,111 @@
+"""Diff-and-apply engine for reference data (states, emission factors, tips).
+
+Existing rows are loaded once, compared with the desired rows in memory and
+the difference is written with bulk_create/bulk_update, so reseeding a
+catalogue costs a few queries no matter how many rows it has.
+"""
+import csv
+import json
+from pathlib import Path
+
+
+class SeedDiff:
+    """Inserts, updates and unchanged rows for one model"""
+
+    def __init__(self, model, key_fields):
+        self.model = model
+        self.key_fields = key_fields
+        self.to_create = []
+        self.to_update = []
+        self.update_fields = set()
+        self.changes = []  # (key, field, old value, new value)
+        self.unchanged = 0
+
+    @property
+    def label(self):
+        return self.model._meta.verbose_name_plural
+
+    def has_changes(self):
+        return bool(self.to_create or self.to_update)
+
+    def describe(self):
+        """Human-readable lines describing the diff"""
+        lines = []
+        for obj in self.to_create:
+            key = ', '.join(str(getattr(obj, field)) for field in self.key_fields)
+            lines.append(f'+ {key}')
+        for key, field, old, new in self.changes:
+            lines.append(f"~ {', '.join(str(part) for part in key)}: {field} {old!r} -> {new!r}")
+        return lines
+
+
+def coerce_row(model, row):
+    """Convert raw fixture values (e.g. CSV strings) to the model fields' Python types"""
+    coerced = {}
+    for name, value in row.items():
+        field = model._meta.get_field(name)
+        if value == '' and field.null:
+            value = None
+        elif isinstance(value, str) and field.get_internal_type() == 'BooleanField':
+            value = value.strip().lower() in ('1', 'true', 't', 'yes', 'y')
+        coerced[field.attname] = field.to_python(value)
+    return coerced
+
+
+def diff_rows(model, rows, key_fields, queryset=None):
+    """Compare desired rows with the stored ones, loading the stored rows in one query"""
+    diff = SeedDiff(model, key_fields)
+    compared = {name for row in rows for name in row}
+    if queryset is None:
+        queryset = model.objects.all()
+    existing = {
+        tuple(getattr(obj, field) for field in key_fields): obj
+        for obj in queryset.only(*({model._meta.pk.name} | set(key_fields) | compared))
+    }
+
+    desired = {}
+    for row in rows:
+        # Later rows win when a catalogue repeats a key
+        desired[tuple(row[field] for field in key_fields)] = row
+
+    for key, row in desired.items():
+        obj = existing.get(key)
+        if obj is None:
+            diff.to_create.append(model(**row))
+            continue
+        changed = False
+        for field, value in row.items():
+            if field in key_fields:
+                continue
+            current = getattr(obj, field)
+            if current != value:
+                diff.changes.append((key, field, current, value))
+                diff.update_fields.add(field)
+                setattr(obj, field, value)
+                changed = True
+        if changed:
+            diff.to_update.append(obj)
+        else:
+            diff.unchanged += 1
+    return diff
+
+
+def apply_diff(diff, batch_size=500):
+    """Write a diff with bulk queries"""
+    if diff.to_create:
+        diff.model.objects.bulk_create(diff.to_create, batch_size=batch_size)
+    if diff.to_update:
+        diff.model.objects.bulk_update(diff.to_update, sorted(diff.update_fields), batch_size=batch_size)
+
+
+def load_fixture(path, model):
+    """Load rows from a JSON (list of objects) or CSV (header row) fixture file"""
+    path = Path(path)
+    with path.open(encoding='utf-8', newline='') as handle:
+        if path.suffix.lower() == '.csv':
+            rows = list(csv.DictReader(handle))
+        elif path.suffix.lower() == '.json':
+            rows = json.load(handle)
+        else:
+            raise ValueError(f'Unsupported fixture format: {path.suffix} (expected .json or .csv)')
+    return [coerce_row(model, row) for row in rows]
@@ -1,22 +1,23 @@
 from rest_framework import serializers
 from .models import (
     Household, IndianState, EnergyUsage, TransportUsage, DietEmission,
-    MonthlyEmissionSummary, EcoTip, FuelPrice, EmissionFactor, UserGoal
+    MonthlyEmissionSummary, EcoTip, FuelPrice, EmissionFactor, UserGoal, ApiKey
 )
 from django.contrib.auth.models import User
+from .fieldsets import SparseFieldsMixin
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'first_name', 'last_name', 'email']
         read_only_fields = ['id']
 
-class IndianStateSerializer(serializers.ModelSerializer):
+class IndianStateSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = IndianState
         fields = ['id', 'name', 'electricity_emission_factor']
 
-class HouseholdSerializer(serializers.ModelSerializer):
+class HouseholdSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     state = IndianStateSerializer(read_only=True)
     state_id = serializers.IntegerField(write_only=True, required=False)
@@ -30,15 +31,15 @@ class HouseholdSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
 
-class EmissionFactorSerializer(serializers.ModelSerializer):
+class EmissionFactorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = EmissionFactor
         fields = [
             'id', 'category', 'name', 'unit', 'emission_factor',
-            'source', 'is_active', 'created_at'
+            'source', 'is_active', 'valid_from', 'valid_to', 'created_at'
         ]
 
-class EnergyUsageSerializer(serializers.ModelSerializer):
+class EnergyUsageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     household = HouseholdSerializer(read_only=True)
     
     class Meta:
@@ -56,7 +57,7 @@ class EnergyUsageSerializer(serializers.ModelSerializer):
             validated_data['household'] = request.user.household
         return super().create(validated_data)
 
-class TransportUsageSerializer(serializers.ModelSerializer):
+class TransportUsageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     household = HouseholdSerializer(read_only=True)
     
     class Meta:
@@ -74,7 +75,7 @@ class TransportUsageSerializer(serializers.ModelSerializer):
             validated_data['household'] = request.user.household
         return super().create(validated_data)
 
-class DietEmissionSerializer(serializers.ModelSerializer):
+class DietEmissionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     household = HouseholdSerializer(read_only=True)
     
     class Meta:
@@ -92,7 +93,7 @@ class DietEmissionSerializer(serializers.ModelSerializer):
             validated_data['household'] = request.user.household
         return super().create(validated_data)
 
-class MonthlyEmissionSummarySerializer(serializers.ModelSerializer):
+class MonthlyEmissionSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     household = HouseholdSerializer(read_only=True)
     
     class Meta:
@@ -110,7 +111,7 @@ class MonthlyEmissionSummarySerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
 
-class EcoTipSerializer(serializers.ModelSerializer):
+class EcoTipSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = EcoTip
         fields = [
@@ -119,7 +120,13 @@ class EcoTipSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at']
 
-class FuelPriceSerializer(serializers.ModelSerializer):
+class EcoTipSearchResultSerializer(EcoTipSerializer):
+    search_score = serializers.FloatField(read_only=True)
+    
+    class Meta(EcoTipSerializer.Meta):
+        fields = EcoTipSerializer.Meta.fields + ['search_score']
+
+class FuelPriceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     state = IndianStateSerializer(read_only=True)
     
     class Meta:
@@ -130,7 +137,7 @@ class FuelPriceSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at']
 
-class UserGoalSerializer(serializers.ModelSerializer):
+class UserGoalSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     household = HouseholdSerializer(read_only=True)
     
     class Meta:
@@ -147,6 +154,12 @@ class UserGoalSerializer(serializers.ModelSerializer):
             validated_data['household'] = request.user.household
         return super().create(validated_data)
 
+class ApiKeySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ApiKey
+        fields = ['prefix', 'name', 'scope', 'created_at', 'last_used_at', 'revoked_at']
+        read_only_fields = ['prefix', 'created_at', 'last_used_at', 'revoked_at']
+
 # Specialized serializers for specific use cases
 class EmissionBreakdownSerializer(serializers.Serializer):
     """Serializer for emission breakdown data"""
@@ -164,6 +177,33 @@ class ComparisonDataSerializer(serializers.Serializer):
     state_average = serializers.FloatField(required=False)
     comparison_percentage = serializers.FloatField()
     rank_percentile = serializers.FloatField(required=False)
+    cohort_size = serializers.IntegerField(required=False)
+
+class FuelPricePointSerializer(serializers.Serializer):
+    """Serializer for one point of a fuel price history"""
+    date_recorded = serializers.DateField()
+    price = serializers.DecimalField(max_digits=8, decimal_places=2)
+    unit = serializers.CharField()
+
+class CostIntensitySerializer(serializers.Serializer):
+    """Serializer for cost per kg CO2 of one emission category"""
+    category = serializers.CharField()
+    cost = serializers.FloatField()
+    emissions = serializers.FloatField()
+    inr_per_kg_co2 = serializers.FloatField(allow_null=True)
+    estimated_share = serializers.FloatField()
+
+class EmissionHistoryPointSerializer(serializers.Serializer):
+    """Serializer for one month or year of a household's emission history"""
+    period = serializers.DateField()
+    label = serializers.CharField()
+    total_energy_emissions = serializers.FloatField()
+    total_transport_emissions = serializers.FloatField()
+    total_diet_emissions = serializers.FloatField()
+    total_emissions = serializers.FloatField()
+    per_capita_emissions = serializers.FloatField()
+    members_count = serializers.IntegerField(required=False)
+    months_count = serializers.IntegerField(required=False)
 
 class TrendDataSerializer(serializers.Serializer):
     """Serializer for trend analysis data"""
@@ -173,6 +213,17 @@ class TrendDataSerializer(serializers.Serializer):
     change_percentage = serializers.FloatField()
     trend_direction = serializers.CharField()
 
+class ForecastPointSerializer(serializers.Serializer):
+    """Serializer for a single forecast month"""
+    month_year = serializers.DateField()
+    total_emissions = serializers.FloatField()
+
+class ForecastSerializer(serializers.Serializer):
+    """Serializer for a household emission forecast"""
+    horizon_months = serializers.IntegerField()
+    forecast = ForecastPointSerializer(many=True)
+    trend = TrendDataSerializer()
+
 class ChartDataSerializer(serializers.Serializer):
     """Serializer for chart data"""
     labels = serializers.ListField(child=serializers.CharField())
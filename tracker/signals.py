@@ -0,0 +1,161 @@
+from django.db import transaction
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import events, forecasting, goals, history, prices, recommendations, tombstones
+from .apikeys import key_cache
+from .archive import invalidate_archive_cutoffs
+from .cohorts import peer_index
+from .factors import invalidate_factor_index
+from .middleware import invalidate_user
+from .search import invalidate_search_results
+from .models import (
+    Household, MonthlyEmissionSummary, FuelPrice, UserGoal, EmissionFactor, EcoTip, ApiKey,
+    EnergyUsage, TransportUsage, DietEmission, UsageArchive,
+)
+
+
+@receiver(post_save, sender=MonthlyEmissionSummary)
+def publish_summary_update(sender, instance, **kwargs):
+    """Push the new monthly totals to the household's open dashboards"""
+    channel = events.household_channel(instance.household_id)
+    event = events.summary_event(instance)
+    transaction.on_commit(lambda: events.publish(channel, event))
+
+
+@receiver(post_save, sender=FuelPrice)
+def publish_fuel_price_update(sender, instance, **kwargs):
+    """Push a freshly recorded fuel price to dashboards in the same state"""
+    channel = events.fuel_channel(instance.state_id)
+    event = events.fuel_price_event(instance)
+    transaction.on_commit(lambda: events.publish(channel, event))
+
+
+@receiver(post_save, sender=MonthlyEmissionSummary)
+def update_goal_progress(sender, instance, **kwargs):
+    """Fold the changed month into the running aggregates of the household's goals"""
+    goals.record_summary(instance)
+
+
+@receiver(post_delete, sender=MonthlyEmissionSummary)
+def remove_goal_progress(sender, instance, **kwargs):
+    goals.record_summary(instance, deleted=True)
+
+
+@receiver(post_save, sender=UserGoal)
+def create_goal_progress(sender, instance, created, **kwargs):
+    """Seed a new goal's aggregates from the summaries recorded so far"""
+    if created:
+        goals.build_progress([instance])
+
+
+@receiver(post_save, sender=MonthlyEmissionSummary)
+def invalidate_forecast(sender, instance, **kwargs):
+    """Drop stored forecast coefficients so the next request refits with the new month"""
+    forecasting.invalidate_forecast(instance.household_id)
+
+
+@receiver(post_save, sender=MonthlyEmissionSummary)
+@receiver(post_delete, sender=MonthlyEmissionSummary)
+def invalidate_tip_recommendations(sender, instance, **kwargs):
+    recommendations.invalidate_recommendations([instance.household_id])
+
+
+@receiver(post_save, sender=MonthlyEmissionSummary)
+def update_peer_index(sender, instance, **kwargs):
+    peer_index.record_summary(instance)
+
+
+@receiver(post_delete, sender=MonthlyEmissionSummary)
+def remove_from_peer_index(sender, instance, **kwargs):
+    peer_index.record_summary(instance, deleted=True)
+
+
+@receiver(post_save, sender=MonthlyEmissionSummary)
+def record_emission_snapshot(sender, instance, **kwargs):
+    history.record_snapshot(instance)
+
+
+@receiver(post_delete, sender=MonthlyEmissionSummary)
+def remove_emission_snapshot(sender, instance, **kwargs):
+    history.remove_snapshot(instance.household_id, instance.month_year)
+
+
+@receiver(post_save, sender=Household)
+def update_open_snapshots(sender, instance, created, **kwargs):
+    if not created:
+        history.record_household(instance)
+
+
+@receiver(post_save, sender=Household)
+def move_household_cohort(sender, instance, **kwargs):
+    """Keep loaded peer indexes in step with household size, state and income changes"""
+    peer_index.record_household(instance)
+
+
+@receiver(post_save, sender=EmissionFactor)
+@receiver(post_delete, sender=EmissionFactor)
+def reload_emission_factors(sender, **kwargs):
+    invalidate_factor_index()
+
+
+@receiver(post_save, sender=UsageArchive)
+@receiver(post_delete, sender=UsageArchive)
+def reload_archive_cutoffs(sender, **kwargs):
+    invalidate_archive_cutoffs()
+
+
+@receiver(post_save, sender=FuelPrice)
+def update_latest_fuel_price(sender, instance, **kwargs):
+    prices.record_latest(instance)
+
+
+@receiver(post_delete, sender=FuelPrice)
+def refresh_latest_fuel_price(sender, instance, **kwargs):
+    prices.refresh_latest(instance)
+
+
+@receiver(post_delete, sender=Household)
+@receiver(post_delete, sender=EnergyUsage)
+@receiver(post_delete, sender=TransportUsage)
+@receiver(post_delete, sender=DietEmission)
+@receiver(post_delete, sender=MonthlyEmissionSummary)
+@receiver(post_delete, sender=FuelPrice)
+def record_warehouse_tombstone(sender, instance, **kwargs):
+    """Deleted rows leave the warehouse datasets on the next export"""
+    tombstones.record_deletion(instance)
+
+
+@receiver(post_save, sender=EcoTip)
+@receiver(post_delete, sender=EcoTip)
+def expire_tip_search_results(sender, **kwargs):
+    invalidate_search_results()
+    recommendations.invalidate_recommendations()
+
+
+@receiver(post_save, sender=ApiKey)
+@receiver(post_delete, sender=ApiKey)
+def forget_cached_api_key(sender, instance, **kwargs):
+    """Scope changes, revocations and deletions apply to this process at once"""
+    key_cache.discard(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    """Password, permission and profile changes reach the next request"""
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Household)
+@receiver(post_delete, sender=Household)
+def forget_cached_household(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, user, **kwargs):
+    if user is not None:
+        invalidate_user(user.pk)
@@ -0,0 +1,235 @@
+"""Downloadable yearly emission statements (PDF or PNG).
+
+A statement shows the figures of the reports page: the year's monthly
+emissions by category, the year's totals and per-capita emissions, and the
+household's yearly history. Rendered files are kept under <REPORTS DIR>/
+<household id>/ and named after a hash of the data drawn, so a statement
+is only drawn again when the household's numbers change. The batch mode
+renders statements for all households in worker processes, each drawing
+on one reused figure. Matplotlib figures aren't safe to share between
+threads, so each thread serving downloads gets its own renderer.
+"""
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from pathlib import Path
+
+from matplotlib.figure import Figure
+from django.conf import settings
+from django.db import connections
+from django.db.models import Sum
+
+from . import history
+from .history import prepare_chart_data
+from .models import Household, MonthlyEmissionSummary
+
+logger = logging.getLogger('tracker')
+
+REPORTS_DEFAULTS = {
+    'DIR': None,
+    'FORMAT': 'pdf',
+    'DPI': 150,
+}
+FORMATS = ('pdf', 'png')
+# Bump when the layout changes so cached statements are drawn again
+LAYOUT_VERSION = 1
+DEFAULT_WORKERS = 4
+DEFAULT_BATCH_SIZE = 200
+CATEGORY_COLORS = {'energy': '#f39c12', 'transport': '#3498db', 'diet': '#27ae60'}
+
+# One renderer per thread, created on first use
+_local = threading.local()
+
+
+def get_reports_setting(name):
+    configured = settings.CARBON_FOOTPRINT_SETTINGS.get('REPORTS', {})
+    return configured.get(name, REPORTS_DEFAULTS[name])
+
+
+def household_dir(household_id):
+    root = get_reports_setting('DIR') or Path(settings.BASE_DIR) / 'reports'
+    return Path(root) / str(household_id)
+
+
+def statement_data(household, year):
+    """Everything drawn on a household's statement for a year"""
+    summaries = MonthlyEmissionSummary.objects.filter(household=household, month_year__year=year).order_by('month_year')
+    totals = summaries.aggregate(
+        energy=Sum('total_energy_emissions'),
+        transport=Sum('total_transport_emissions'),
+        diet=Sum('total_diet_emissions'),
+        total=Sum('total_emissions'),
+    )
+    totals = {name: float(value or 0) for name, value in totals.items()}
+    rollup = household.yearly_rollups.filter(year=year).first()
+    per_capita = rollup.per_capita_emissions if rollup else totals['total'] / household.members_count
+
+    return {
+        'household': household.name,
+        'city': household.city,
+        'year': year,
+        'chart': prepare_chart_data(summaries),
+        'totals': totals,
+        'per_capita': float(per_capita),
+        'history': [
+            {'label': point['label'], 'total': float(point['total_emissions'])}
+            for point in history.emission_history(household.pk, end=date(year, 12, 31), granularity='year')
+        ],
+    }
+
+
+def data_hash(data, file_format):
+    payload = json.dumps([LAYOUT_VERSION, file_format, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class StatementRenderer:
+    """Draws statements on one A4 figure that is cleared between statements"""
+
+    def __init__(self, dpi=None):
+        self.dpi = dpi or get_reports_setting('DPI')
+        self.figure = Figure(figsize=(8.27, 11.69))
+
+    def render(self, data, file_format):
+        figure = self.figure
+        figure.clear()
+        grid = figure.add_gridspec(3, 1, height_ratios=[1.1, 3, 2], hspace=0.45, left=0.1, right=0.95, top=0.95, bottom=0.06)
+
+        header = figure.add_subplot(grid[0])
+        header.axis('off')
+        totals = data['totals']
+        header.text(0, 1, f"{data['household']} — Carbon footprint {data['year']}", fontsize=16, fontweight='bold', va='top')
+        header.text(0, 0.62, data['city'], fontsize=10, color='#555555', va='top')
+        header.text(
+            0, 0.3,
+            f"Total {totals['total']:,.1f} kg CO₂   ·   Per person {data['per_capita']:,.1f} kg CO₂\n"
+            f"Energy {totals['energy']:,.1f}   ·   Transport {totals['transport']:,.1f}   ·   Diet {totals['diet']:,.1f} kg CO₂",
+            fontsize=11, va='top', linespacing=1.6,
+        )
+
+        monthly = figure.add_subplot(grid[1])
+        chart = data['chart']
+        positions = range(len(chart['months']))
+        bottom = [0.0] * len(chart['months'])
+        for category, color in CATEGORY_COLORS.items():
+            monthly.bar(positions, chart[category], bottom=bottom, color=color, label=category.title())
+            bottom = [base + value for base, value in zip(bottom, chart[category])]
+        monthly.set_title('Monthly emissions by category', fontsize=11)
+        if chart['months']:
+            monthly.set_xticks(list(positions), chart['months'], rotation=45, ha='right', fontsize=8)
+            monthly.set_ylabel('kg CO₂')
+            monthly.legend(fontsize=8)
+        else:
+            self.empty(monthly, 'No data for this year')
+
+        yearly = figure.add_subplot(grid[2])
+        yearly.set_title('Emissions per year', fontsize=11)
+        if data['history']:
+            yearly.bar([point['label'] for point in data['history']], [point['total'] for point in data['history']], color='#7f8c8d')
+            yearly.set_ylabel('kg CO₂')
+            yearly.tick_params(axis='x', labelsize=8)
+        else:
+            self.empty(yearly, 'No yearly history yet')
+
+        output = io.BytesIO()
+        figure.savefig(output, format=file_format, dpi=self.dpi)
+        return output.getvalue()
+
+    @staticmethod
+    def empty(axes, message):
+        axes.set_xticks([])
+        axes.set_yticks([])
+        axes.text(0.5, 0.5, message, ha='center', va='center', color='#777777', transform=axes.transAxes)
+
+
+def get_renderer():
+    renderer = getattr(_local, 'renderer', None)
+    if renderer is None:
+        renderer = _local.renderer = StatementRenderer()
+    return renderer
+
+
+def render_statement(household, year, file_format=None):
+    """Path of a household's statement for a year, drawing it if its data changed.
+
+    Returns (path, rendered).
+    """
+    file_format = file_format or get_reports_setting('FORMAT')
+    if file_format not in FORMATS:
+        raise ValueError(f'Unknown statement format {file_format!r}')
+    data = statement_data(household, year)
+    directory = household_dir(household.pk)
+    path = directory / f'{year}-{data_hash(data, file_format)[:16]}.{file_format}'
+    if path.exists():
+        return path, False
+
+    content = get_renderer().render(data, file_format)
+    directory.mkdir(parents=True, exist_ok=True)
+    # A unique name, as concurrent requests may draw the same statement
+    handle, temporary = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(handle, 'wb') as temporary_file:
+            temporary_file.write(content)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    # Drop the statements drawn from older data
+    for old in directory.glob(f'{year}-*.{file_format}'):
+        if old != path:
+            old.unlink(missing_ok=True)
+    return path, True
+
+
+def render_batch(household_ids, year, file_format=None):
+    """Render the statements of some households; returns (rendered, skipped)"""
+    rendered = skipped = 0
+    for household in Household.objects.filter(id__in=household_ids):
+        _, drawn = render_statement(household, year, file_format)
+        if drawn:
+            rendered += 1
+        else:
+            skipped += 1
+    return rendered, skipped
+
+
+def render_all_statements(year, file_format=None, workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Render every household's statement for a year; returns (rendered, skipped, seconds)"""
+    started = time.perf_counter()
+    household_ids = list(
+        Household.objects.filter(created_at__year__lte=year).order_by('id').values_list('id', flat=True)
+    )
+    batches = [household_ids[start:start + batch_size] for start in range(0, len(household_ids), batch_size)]
+    rendered = skipped = 0
+
+    if workers <= 1 or len(batches) <= 1:
+        results = (render_batch(batch, year, file_format) for batch in batches)
+        for batch_rendered, batch_skipped in results:
+            rendered += batch_rendered
+            skipped += batch_skipped
+            if progress:
+                progress(rendered, skipped, len(household_ids))
+    else:
+        # Forked workers must open their own database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [pool.submit(render_batch, batch, year, file_format) for batch in batches]
+            for future in as_completed(futures):
+                batch_rendered, batch_skipped = future.result()
+                rendered += batch_rendered
+                skipped += batch_skipped
+                if progress:
+                    progress(rendered, skipped, len(household_ids))
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Rendered {rendered} statements for {year} ({skipped} unchanged) in {elapsed:.1f}s")
+    return rendered, skipped, elapsed
@@ -1,3 +1,1274 @@
-from django.test import TestCase
+import socketserver
+import tempfile
+import threading
+from io import StringIO
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pyarrow.parquet as pq
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.db.models import Count, Sum
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .analytics import fill_missing_costs, household_cost_intensity
+from .apikeys import create_key, key_cache, revoke_key
+from .archive import archive_table, archived_totals, invalidate_archive_cutoffs, is_archived, usage_records
+from .closing import close_month
+from .cohorts import MonthIndex, PeerIndex
+from .digests import send_digests
+from .factors import invalidate_factor_index, resolve_factor
+from .fetch import HttpClient
+from .fieldsets import row_plan
+from .forecasting import fit_all_forecasts, get_coefficients, month_number, predict
+from .goals import build_progress, evaluate, goal_start
+from .history import build_snapshots, current_month, emission_history, prepare_chart_data, rebuild_rollups
+from .middleware import user_cache_key
+from .models import (
+    DigestLog, EcoTip, EmissionFactor, EmissionForecast, EnergyUsage, FuelPrice, GoalProgress, Household, IndianState, LatestFuelPrice,
+    EmissionSnapshot, MonthlyEmissionSummary, TipRecommendation, UsageArchive, WarehouseTombstone, YearlyEmissionRollup,
+)
+from .prices import downsample_prices
+from .recommendations import compute_all_recommendations, recommended_tips
+from .renderers import OrjsonRenderer
+from .replicas import PIN_COOKIE, PrimaryPinMiddleware, ReplicaRouter, choose_replica, replica_health, use_replica
+from .parsing import PARSERS, get_parser
+from .scraper import FuelPriceScraper, get_source_spec
+from .search import get_search_backend, invalidate_search_results, search_tips
+from .serializers import MonthlyEmissionSummarySerializer
+from .tips import TipIndex, fingerprint, ingest_tips
+from .warehouse import export_table
+
+
+class DownsamplePricesTests(TestCase):
+    def setUp(self):
+        self.state = IndianState.objects.create(name='Goa')
+        for day in range(1, 11):
+            FuelPrice.objects.create(
+                fuel_type='petrol', state=self.state, price=Decimal(100 + day), unit='litre',
+                date_recorded=date(2020, 1, day),
+            )
+
+    def test_latest_price_follows_the_monthly_row(self):
+        self.assertEqual(LatestFuelPrice.objects.get().price, Decimal('110.00'))
+
+        self.assertEqual(downsample_prices(date(2021, 1, 1)), (1, 9))
+
+        monthly = FuelPrice.objects.get()
+        self.assertEqual((monthly.date_recorded, monthly.price), (date(2020, 1, 1), Decimal('105.50')))
+        latest = LatestFuelPrice.objects.get()
+        self.assertEqual((latest.date_recorded, latest.price), (date(2020, 1, 1), Decimal('105.50')))
+
+    def test_newer_latest_price_is_kept(self):
+        FuelPrice.objects.create(
+            fuel_type='petrol', state=self.state, price=Decimal('120.00'), unit='litre', date_recorded=date(2021, 2, 1),
+        )
+        downsample_prices(date(2021, 1, 1))
+        self.assertEqual(LatestFuelPrice.objects.get().price, Decimal('120.00'))
+
+    def test_deleted_rows_are_handled_in_bulk(self):
+        for day in range(11, 29):
+            FuelPrice.objects.create(
+                fuel_type='petrol', state=self.state, price=Decimal(100 + day), unit='litre',
+                date_recorded=date(2020, 1, day),
+            )
+        # Tombstones and the latest price don't cost a query per deleted row
+        with self.assertNumQueries(13):
+            self.assertEqual(downsample_prices(date(2021, 1, 1)), (1, 27))
+        self.assertEqual(WarehouseTombstone.objects.filter(table='fuel_prices').count(), 28)
+        self.assertEqual(LatestFuelPrice.objects.get().date_recorded, date(2020, 1, 1))
+
+    def test_deleting_a_price_rebuilds_the_latest(self):
+        FuelPrice.objects.get(date_recorded=date(2020, 1, 10)).delete()
+        self.assertEqual(LatestFuelPrice.objects.get().price, Decimal('109.00'))
+
+
+class CostIntensityTests(TestCase):
+    def setUp(self):
+        self.goa = IndianState.objects.create(name='Goa')
+        self.kerala = IndianState.objects.create(name='Kerala')
+        user = User.objects.create_user('asha')
+        self.household = Household.objects.create(user=user, name='Asha', state=self.goa, members_count=2, city='Panaji')
+        EnergyUsage.objects.create(
+            household=self.household, energy_source='electricity', consumption=100, unit='kWh',
+            month_year=date(2024, 3, 1),
+        )
+
+    def add_price(self, state, day, price):
+        FuelPrice.objects.create(fuel_type='electricity', state=state, price=Decimal(price), unit='kWh', date_recorded=day)
+
+    def test_prices_from_the_household_state_up_to_the_range(self):
+        self.add_price(self.goa, date(2024, 1, 15), '6.00')
+        self.add_price(self.goa, date(2024, 5, 1), '9.00')
+        self.add_price(self.kerala, date(2024, 3, 1), '7.00')
+
+        [energy] = household_cost_intensity(self.household.pk, date(2024, 3, 1), date(2024, 3, 1))
+
+        # January is the latest Goa month with a price by March
+        self.assertEqual(energy['cost'], 600.0)
+        self.assertEqual(energy['estimated_share'], 1.0)
+
+
+class StubServer:
+    """Local HTTP server answering GETs with queued (status, headers, body) responses.
+
+    Once the queue is empty a request carrying If-None-Match gets a 304 and
+    any other the last page again. Request headers are recorded.
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append(dict(self.headers))
+                if stub.responses:
+                    status, headers, body = stub.responses.pop(0)
+                    stub.last = (status, headers, body)
+                elif self.headers.get('If-None-Match'):
+                    status, headers, body = 304, {}, b''
+                else:
+                    status, headers, body = stub.last
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/prices'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+PRICE_PAGE = (
+    b'<table><tr><th>State</th><th>Petrol</th><th>Diesel</th></tr>'
+    b'<tr><td>Goa</td><td>100.50</td><td>90.10</td></tr></table>'
+)
+
+
+class HttpClientTests(SimpleTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+
+    def client_for(self, server):
+        self.addCleanup(server.close)
+        client = HttpClient(cache_dir=self.cache_dir.name, retries=3, backoff_factor=0)
+        self.addCleanup(client.close)
+        return client
+
+    def test_retries_server_errors(self):
+        server = StubServer((503, {}, b''), (502, {}, b''), (200, {}, b'ok'))
+        result = self.client_for(server).fetch(server.url)
+        self.assertEqual((result.status, result.content), (200, b'ok'))
+        self.assertEqual(len(server.requests), 3)
+
+    def test_revalidates_only_committed_responses(self):
+        server = StubServer((200, {'ETag': '"v1"'}, b'page'))
+        client = self.client_for(server)
+
+        client.fetch(server.url)
+        result = client.fetch(server.url)
+        self.assertNotIn('If-None-Match', server.requests[1])
+        self.assertTrue(result.changed)
+
+        result.commit()
+        result = client.fetch(server.url)
+        self.assertEqual(server.requests[2]['If-None-Match'], '"v1"')
+        self.assertTrue(result.not_modified)
+        self.assertEqual(result.content, b'page')
+
+
+class ScraperRevalidationTests(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.server = StubServer((200, {'ETag': '"v1"'}, PRICE_PAGE))
+        self.addCleanup(self.server.close)
+        scraper_settings = {'SOURCES': {'petrol_diesel': self.server.url}, 'CACHE_DIR': cache_dir.name}
+        overridden = override_settings(CARBON_FOOTPRINT_SETTINGS={**settings.CARBON_FOOTPRINT_SETTINGS, 'SCRAPER': scraper_settings})
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        client = HttpClient(retries=0)
+        self.addCleanup(client.close)
+        self.scraper = FuelPriceScraper(client)
+
+    def test_failed_ingest_is_fetched_again(self):
+        with mock.patch('tracker.scraper.FuelPrice.objects.update_or_create', side_effect=ValueError('db down')):
+            self.scraper.scrape_petrol_diesel_prices()
+        self.assertEqual(FuelPrice.objects.count(), 0)
+
+        self.assertEqual(len(self.scraper.scrape_petrol_diesel_prices()), 1)
+        self.assertNotIn('If-None-Match', self.server.requests[1])
+        self.assertEqual(FuelPrice.objects.count(), 2)
+
+        # Saved this time, so the unchanged page is skipped
+        self.assertEqual(self.scraper.scrape_petrol_diesel_prices(), [])
+        self.assertEqual(self.server.requests[2]['If-None-Match'], '"v1"')
+
+
+def with_carbon_settings(test_case, **sections):
+    """Override CARBON_FOOTPRINT_SETTINGS sections for the duration of a test"""
+    overridden = override_settings(CARBON_FOOTPRINT_SETTINGS={**settings.CARBON_FOOTPRINT_SETTINGS, **sections})
+    overridden.enable()
+    test_case.addCleanup(overridden.disable)
+
+
+@mock.patch.dict(connections.databases, {'replica': {**settings.DATABASES['default']}})
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        with_carbon_settings(self, REPLICAS={'ALIASES': ['replica'], 'MAX_LAG_SECONDS': 5, 'LAG_CHECK_SECONDS': 60})
+        replica_health.clear()
+        self.addCleanup(replica_health.clear)
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+        self.lag = mock.patch('tracker.replicas.replica_lag', return_value=0.0).start()
+        self.addCleanup(mock.patch.stopall)
+
+        @use_replica
+        def view(request):
+            if request.method not in ('GET', 'HEAD'):
+                self.router.db_for_write(Household)
+            response = HttpResponse()
+            response.read_from = self.router.db_for_read(Household)
+            return response
+
+        self.middleware = PrimaryPinMiddleware(view)
+
+    def test_reads_outside_replica_views_use_the_primary(self):
+        self.assertIsNone(self.router.db_for_read(Household))
+        self.assertEqual(self.router.db_for_write(Household), 'default')
+
+    def test_replica_views_read_from_a_healthy_replica(self):
+        self.assertEqual(self.middleware(self.factory.get('/')).read_from, 'replica')
+        self.assertIsNone(self.middleware(self.factory.post('/')).read_from)
+
+    def test_lagging_or_unreachable_replicas_are_skipped(self):
+        self.lag.return_value = 30.0
+        self.assertIsNone(choose_replica())
+        replica_health.clear()
+        self.lag.return_value = None
+        self.assertIsNone(choose_replica())
+
+    def test_lag_is_measured_once_per_check_interval(self):
+        choose_replica()
+        choose_replica()
+        self.assertEqual(self.lag.call_count, 1)
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        response = self.middleware(self.factory.post('/'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.assertIsNone(self.middleware(request).read_from)
+
+    def test_pin_expires(self):
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        response = self.middleware(request)
+        self.assertEqual(response.read_from, 'replica')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+class UsageArchiveTests(TestCase):
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        with_carbon_settings(self, ARCHIVE={'DIR': archive_dir.name})
+        invalidate_archive_cutoffs()
+        self.addCleanup(invalidate_archive_cutoffs)
+        state = IndianState.objects.create(name='Goa')
+        user = User.objects.create_user('asha')
+        self.household = Household.objects.create(user=user, name='Asha', state=state, members_count=2, city='Panaji')
+        self.month = date(2020, 1, 1)
+        for source, consumption in [('electricity', 100), ('lpg', 10)]:
+            EnergyUsage.objects.create(
+                household=self.household, energy_source=source, consumption=consumption, unit='-', month_year=self.month,
+            )
+        self.summary = MonthlyEmissionSummary.objects.create(household=self.household, month_year=self.month)
+        self.total = self.summary.total_energy_emissions
+
+    def test_cutoffs_moved_elsewhere_are_seen(self):
+        self.assertFalse(is_archived('energy', self.month))
+        # As recorded by an archive run in another process
+        UsageArchive.objects.create(table='energy', cutoff=date(2021, 1, 1))
+        self.assertTrue(is_archived('energy', self.month))
+
+    def test_months_after_the_cutoff_skip_the_archive(self):
+        archive_table('energy', date(2019, 1, 1))
+        archived_totals(self.household.pk, self.month)
+        with self.assertNumQueries(0):
+            self.assertEqual(archived_totals(self.household.pk, self.month), {})
+
+        # Moving a cutoff in this process is seen at once, elsewhere within the TTL
+        UsageArchive.objects.filter(table='energy').update(cutoff=date(2021, 1, 1))
+        self.assertEqual(archived_totals(self.household.pk, self.month), {})
+        with mock.patch('tracker.archive.CUTOFF_CACHE_TTL', 0):
+            self.assertEqual(archived_totals(self.household.pk, self.month), {'energy': 0.0})
+        self.assertEqual(archive_table('energy', date(2022, 1, 1)), 2)
+        self.assertAlmostEqual(archived_totals(self.household.pk, self.month)['energy'], self.total)
+
+    def test_archived_rows_are_read_back(self):
+        self.assertEqual(archive_table('energy', date(2021, 1, 1)), 2)
+        self.assertFalse(EnergyUsage.objects.exists())
+
+        self.summary.save()
+        self.assertAlmostEqual(self.summary.total_energy_emissions, self.total)
+        self.assertEqual(len(list(usage_records('energy', ['id', 'emission_calculated']))), 2)
+
+    def test_rows_in_both_places_are_counted_once(self):
+        rows = list(EnergyUsage.objects.all())
+        archive_table('energy', date(2021, 1, 1))
+        # An archive run that stopped after writing a chunk but before deleting it
+        EnergyUsage.objects.bulk_create(rows[:1])
+
+        self.summary.save()
+        self.assertAlmostEqual(self.summary.total_energy_emissions, self.total)
+        ids = [row[0] for row in usage_records('energy', ['id', 'emission_calculated'])]
+        self.assertEqual(sorted(ids), sorted(row.pk for row in rows))
+
+
+class OrjsonRendererTests(SimpleTestCase):
+    def test_integers_orjson_cannot_encode_use_the_standard_encoder(self):
+        data = {'total': 2 ** 70, 'name': 'Asha'}
+        self.assertEqual(OrjsonRenderer().render(data), b'{"total":1180591620717411303424,"name":"Asha"}')
+        self.assertEqual(OrjsonRenderer().render({'total': 2 ** 40}), b'{"total":1099511627776}')
+
+
+class RowPlanTests(SimpleTestCase):
+    def test_plans_are_shared_by_field_orders(self):
+        plan = row_plan(MonthlyEmissionSummarySerializer, ('total_emissions', 'month_year'))
+        self.assertIs(row_plan(MonthlyEmissionSummarySerializer, ('month_year', 'total_emissions')), plan)
+        self.assertEqual([name for name, *_ in plan.entries], ['month_year', 'total_emissions'])
+
+
+class StubSmtpServer:
+    """Local SMTP server recording the recipients of each message it accepts.
+
+    The connection is dropped on the MAIL commands numbered in drop_at
+    (counting from 1 across connections), and RCPT is refused with a 550
+    for addresses in refuse.
+    """
+
+    def __init__(self, drop_at=(), refuse=()):
+        self.drop_at = set(drop_at)
+        self.refuse = set(refuse)
+        self.mail_commands = 0
+        self.delivered = []
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(f'{line}\r\n'.encode())
+
+            def handle(self):
+                recipients = []
+                self.reply('220 stub')
+                while line := self.rfile.readline():
+                    command = line[:4].upper()
+                    if command == b'MAIL':
+                        stub.mail_commands += 1
+                        if stub.mail_commands in stub.drop_at:
+                            return
+                        self.reply('250 OK')
+                    elif command == b'RCPT':
+                        address = line.decode().partition('<')[2].partition('>')[0]
+                        if address in stub.refuse:
+                            self.reply('550 No such user')
+                        else:
+                            recipients.append(address)
+                            self.reply('250 OK')
+                    elif command == b'DATA':
+                        self.reply('354 End data with <CR><LF>.<CR><LF>')
+                        while self.rfile.readline() not in (b'.\r\n', b''):
+                            pass
+                        stub.delivered.extend(recipients)
+                        recipients = []
+                        self.reply('250 OK')
+                    elif command == b'RSET':
+                        recipients = []
+                        self.reply('250 OK')
+                    elif command == b'QUIT':
+                        self.reply('221 Bye')
+                        return
+                    else:
+                        self.reply('250 stub')
+
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def connection(self):
+        return get_connection(
+            'django.core.mail.backends.smtp.EmailBackend', host='127.0.0.1', port=self.server.server_address[1],
+            username='', password='', use_tls=False, timeout=5,
+        )
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class DigestTests(TestCase):
+    def setUp(self):
+        with_carbon_settings(self, DIGEST={'CHUNK_SIZE': 3, 'MAX_ATTEMPTS': 3, 'RETRY_DELAY': 0})
+        state = IndianState.objects.create(name='Goa')
+        self.month = date(2024, 3, 1)
+        recipients = []
+        for i in range(5):
+            user = User.objects.create_user(f'user{i}', email=f'user{i}@example.com')
+            household = Household.objects.create(user=user, name=f'Home {i}', state=state, members_count=2, city='Panaji')
+            summary = MonthlyEmissionSummary.objects.create(household=household, month_year=self.month)
+            # save() recalculates the totals from usage records, of which there are none
+            MonthlyEmissionSummary.objects.filter(pk=summary.pk).update(total_emissions=100 + i, per_capita_emissions=50)
+            recipients.append((household.pk, user.email))
+        # Digests go out in household id order, and ids are UUIDs
+        self.emails = [email for _, email in sorted(recipients)]
+
+    def logs(self):
+        return list(DigestLog.objects.order_by('household_id').values_list('email', 'status', 'attempts'))
+
+    def smtp_server(self, **options):
+        server = StubSmtpServer(**options)
+        self.addCleanup(server.close)
+        return server
+
+    def test_each_household_is_sent_one_digest(self):
+        self.assertEqual(send_digests(self.month)[:2], (5, 0))
+        self.assertEqual([message.to[0] for message in mail.outbox], self.emails)
+        self.assertEqual(self.logs(), [(email, 'sent', 1) for email in self.emails])
+
+        # A re-run finds nobody left to send to
+        self.assertEqual(send_digests(self.month)[:2], (0, 0))
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_sending_resumes_at_the_message_that_failed(self):
+        # Dropped while sending the second message of the first chunk
+        server = self.smtp_server(drop_at=[2])
+        self.assertEqual(send_digests(self.month, connection=server.connection())[:2], (5, 0))
+
+        self.assertEqual(server.delivered, self.emails)
+        self.assertEqual(self.logs(), [
+            (email, 'sent', 2 if index == 1 else 1) for index, email in enumerate(self.emails)
+        ])
+
+    def test_failing_messages_are_given_up_on(self):
+        # The second message fails on every attempt, the fourth is refused outright
+        server = self.smtp_server(drop_at=[2, 3, 4], refuse=[self.emails[3]])
+        self.assertEqual(send_digests(self.month, connection=server.connection())[:2], (3, 2))
+
+        self.assertEqual(server.delivered, [self.emails[0], self.emails[2], self.emails[4]])
+        logs = self.logs()
+        self.assertEqual(logs[1], (self.emails[1], 'failed', 3))
+        self.assertEqual(logs[3], (self.emails[3], 'failed', 1))
+        self.assertEqual(DigestLog.objects.filter(status='sent').count(), 3)
+
+        # Failed digests are tried again on the next run
+        retry = self.smtp_server()
+        self.assertEqual(send_digests(self.month, connection=retry.connection())[:2], (2, 0))
+        self.assertEqual(retry.delivered, [self.emails[1], self.emails[3]])
+
+
+class TipSearchTests(TestCase):
+    def setUp(self):
+        invalidate_search_results()
+        self.panels, self.drying, self.bus, self.heater = EcoTip.objects.bulk_create([
+            EcoTip(title='Install solar panels', content='Rooftop panels cut grid electricity use.',
+                   category='energy', potential_reduction=50),
+            EcoTip(title='Dry clothes outside', content='Skip the dryer and let solar heat do the work.',
+                   category='energy', potential_reduction=10),
+            EcoTip(title='Take the bus', content='Public transport beats driving alone.',
+                   category='transport', potential_reduction=30),
+            EcoTip(title='Solar water heater', content='Heat water with the sun.', category='energy', is_active=False),
+        ])
+
+    def test_index_is_created_by_migrations(self):
+        self.assertTrue(get_search_backend().is_installed())
+
+    def test_matches_are_ranked_by_relevance(self):
+        self.assertEqual(search_tips('solar'), [self.panels, self.drying])
+        self.assertEqual(search_tips('sol'), [self.panels, self.drying])
+        self.assertEqual(search_tips('solar', category='transport'), [])
+        self.assertIn(self.heater, search_tips('solar', active_only=False))
+        self.assertEqual(search_tips('bus'), [self.bus])
+
+    def test_index_follows_edits(self):
+        self.drying.content = 'Skip the dryer on sunny days.'
+        self.drying.save()
+        self.assertEqual(search_tips('solar'), [self.panels])
+
+
+class ForecastTests(TestCase):
+    def setUp(self):
+        state = IndianState.objects.create(name='Goa')
+        # (first month, months, intercept, slope), with a month missing from the second
+        self.series = {}
+        summaries = []
+        for i, (first, count, intercept, slope) in enumerate([
+            (date(2023, 1, 1), 24, 200.0, 3.0), (date(2024, 1, 1), 8, 150.0, -2.0), (date(2023, 7, 1), 18, 100.0, 0.5),
+        ]):
+            user = User.objects.create_user(f'user{i}')
+            household = Household.objects.create(user=user, name=f'Home {i}', state=state, members_count=2, city='Panaji')
+            start = month_number(first)
+            numbers = [start + step for step in range(count) if not (i == 1 and step == 2)]
+            totals = [intercept + slope * (number - start) for number in numbers]
+            self.series[household.pk] = (numbers, totals)
+            summaries.extend(
+                MonthlyEmissionSummary(
+                    household=household, month_year=date(number // 12, number % 12 + 1, 1), total_emissions=total,
+                )
+                for number, total in zip(numbers, totals)
+            )
+        # bulk_create, so no signals fit anything before the test does
+        MonthlyEmissionSummary.objects.bulk_create(summaries)
+
+    def test_predictions_follow_the_least_squares_line(self):
+        self.assertEqual(fit_all_forecasts(batch_size=2), 3)
+        self.assertEqual(EmissionForecast.objects.count(), 3)
+
+        for household_id, (numbers, totals) in self.series.items():
+            with self.assertNumQueries(1):
+                coefficients = get_coefficients(household_id)
+            line = np.polyfit(numbers, totals, 1)
+            expected = np.polyval(line, [numbers[-1] + step for step in range(1, 4)])
+            for month, value in zip(predict(coefficients, 3), expected):
+                self.assertAlmostEqual(month['total_emissions'], value, places=1)
+
+    def test_saved_summaries_are_refitted(self):
+        fit_all_forecasts()
+        household_id = next(iter(self.series))
+        MonthlyEmissionSummary.objects.filter(household_id=household_id).first().save()
+        self.assertFalse(EmissionForecast.objects.filter(household_id=household_id).exists())
+
+        self.assertIsNotNone(get_coefficients(household_id))
+        self.assertTrue(EmissionForecast.objects.filter(household_id=household_id).exists())
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        state = IndianState.objects.create(name='Goa')
+        self.lights, self.bus = EcoTip.objects.bulk_create([
+            EcoTip(title='Switch to LED bulbs', content='LED lighting uses less electricity.', category='energy',
+                   potential_reduction=10),
+            EcoTip(title='Take the bus', content='Public transport beats driving alone.', category='transport',
+                   potential_reduction=20),
+        ])
+        self.households = []
+        summaries = []
+        for i, (energy, transport) in enumerate([(300.0, 20.0), (20.0, 300.0)]):
+            user = User.objects.create_user(f'user{i}')
+            household = Household.objects.create(user=user, name=f'Home {i}', state=state, members_count=2, city='Panaji')
+            self.households.append(household)
+            summaries.append(MonthlyEmissionSummary(
+                household=household, month_year=date(2024, 3, 1), total_energy_emissions=energy,
+                total_transport_emissions=transport, total_emissions=energy + transport,
+            ))
+        MonthlyEmissionSummary.objects.bulk_create(summaries)
+
+    def titles(self, household):
+        return [tip['title'] for tip in recommended_tips(household.pk)]
+
+    def test_stored_recommendations_follow_the_emission_mix(self):
+        self.assertEqual(compute_all_recommendations(batch_size=1), 2)
+        self.assertEqual(TipRecommendation.objects.count(), 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.titles(self.households[0]), ['Switch to LED bulbs', 'Take the bus'])
+        self.assertEqual(self.titles(self.households[1]), ['Take the bus', 'Switch to LED bulbs'])
+
+    def test_changes_drop_stored_recommendations(self):
+        compute_all_recommendations()
+        MonthlyEmissionSummary.objects.get(household=self.households[0]).save()
+        self.assertEqual(
+            list(TipRecommendation.objects.values_list('household', flat=True)), [self.households[1].pk],
+        )
+
+        self.lights.title = 'Switch to LED lights'
+        self.lights.save()
+        self.assertFalse(TipRecommendation.objects.exists())
+        self.assertEqual(self.titles(self.households[1])[-1], 'Switch to LED lights')
+
+
+class CloseMonthTests(TestCase):
+    def setUp(self):
+        state = IndianState.objects.create(name='Goa')
+        user = User.objects.create_user('asha')
+        self.household = Household.objects.create(user=user, name='Asha', state=state, members_count=2, city='Panaji')
+        self.month = date(2024, 3, 1)
+        Household.objects.filter(pk=self.household.pk).update(created_at=datetime(2024, 1, 1, tzinfo=dt_timezone.utc))
+
+    def test_stored_forecasts_and_recommendations_are_dropped(self):
+        now = datetime.now(dt_timezone.utc)
+        EmissionForecast.objects.create(household=self.household, coefficients={}, fitted_at=now)
+        TipRecommendation.objects.create(household=self.household, tips=[], computed_at=now)
+
+        self.assertEqual(close_month(self.month, workers=1)[0], 1)
+
+        self.assertTrue(MonthlyEmissionSummary.objects.filter(household=self.household, month_year=self.month).exists())
+        self.assertFalse(EmissionForecast.objects.exists())
+        self.assertFalse(TipRecommendation.objects.exists())
+
+
+class WarehouseExportTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        with_carbon_settings(self, WAREHOUSE={'DIR': directory.name}, ARCHIVE={'DIR': directory.name + '/archive'})
+        state = IndianState.objects.create(name='Goa')
+        user = User.objects.create_user('asha')
+        household = Household.objects.create(user=user, name='Asha', state=state, members_count=2, city='Panaji')
+        FuelPrice.objects.create(
+            fuel_type='electricity', state=state, price=Decimal('6.00'), unit='kWh', date_recorded=date(2020, 1, 1),
+        )
+        self.usage = [
+            EnergyUsage.objects.create(
+                household=household, energy_source='electricity', consumption=consumption, unit='kWh',
+                month_year=month, cost=cost,
+            )
+            for month, consumption, cost in [(date(2020, 1, 1), 100, None), (date(2020, 2, 1), 50, Decimal('300.00'))]
+        ]
+
+    def read(self, path):
+        return pq.read_table(path).to_pylist()
+
+    def test_bulk_updated_rows_are_exported_again(self):
+        self.assertEqual(export_table('energy_usage')[0], 2)
+        self.assertEqual(export_table('energy_usage')[0], 0)
+
+        fill_missing_costs()
+        exported, path = export_table('energy_usage')
+        self.assertEqual(exported, 1)
+        [row] = self.read(path)
+        self.assertEqual((row['id'], row['cost']), (self.usage[0].pk, Decimal('600.00')))
+
+    def test_deleted_and_archived_rows_are_exported_as_tombstones(self):
+        export_table('energy_usage')
+        archived, deleted = [str(usage.pk) for usage in self.usage]
+        self.usage[1].delete()
+        archive_table('energy', date(2021, 1, 1))
+
+        exported, path = export_table('deletions')
+        self.assertEqual(exported, 2)
+        self.assertEqual(
+            sorted((row['table'], row['row_id'], row['reason']) for row in self.read(path)),
+            [('energy_usage', archived, 'archived'), ('energy_usage', deleted, 'deleted')],
+        )
+        self.assertEqual(WarehouseTombstone.objects.count(), 2)
+
+
+class ApiKeyTests(TestCase):
+    def setUp(self):
+        key_cache.clear()
+        self.addCleanup(key_cache.clear)
+        state = IndianState.objects.create(name='Goa')
+        user = User.objects.create_user('asha')
+        self.household = Household.objects.create(user=user, name='Asha', state=state, members_count=2, city='Panaji')
+        self.api_key, self.key = create_key(self.household, 'Sync', scope='read')
+
+    def get(self, key):
+        return self.client.get('/api/energy-usage/', HTTP_AUTHORIZATION=f'Api-Key {key}')
+
+    def test_valid_key_authenticates_and_is_cached(self):
+        self.assertEqual(self.get(self.key).status_code, 200)
+        self.api_key.refresh_from_db()
+        self.assertIsNotNone(self.api_key.last_used_at)
+
+        # Verified keys are served from the cache, with no ApiKey query
+        with CaptureQueriesContext(connections['default']) as queries:
+            self.assertEqual(self.get(self.key).status_code, 200)
+        self.assertFalse([query for query in queries if 'tracker_apikey' in query['sql']])
+
+    def test_bad_keys_are_rejected(self):
+        for key in ['ct_nope_nope', self.key[:-1] + ('A' if self.key[-1] != 'A' else 'B'), 'not-a-key']:
+            response = self.get(key)
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response['WWW-Authenticate'], 'Api-Key')
+
+    def test_revoked_keys_are_rejected_at_once(self):
+        self.assertEqual(self.get(self.key).status_code, 200)
+        revoke_key(self.api_key)
+        response = self.get(self.key)
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('revoked', response.json()['detail'])
+
+    def test_read_keys_may_not_write(self):
+        body = {'energy_source': 'electricity', 'consumption': 100, 'unit': 'kWh', 'month_year': '2024-03-01'}
+        response = self.client.post('/api/energy-usage/', body, HTTP_AUTHORIZATION=f'Api-Key {self.key}')
+        self.assertEqual(response.status_code, 403)
+
+        _, write_key = create_key(self.household, 'Import', scope='write')
+        response = self.client.post('/api/energy-usage/', body, HTTP_AUTHORIZATION=f'Api-Key {write_key}')
+        self.assertNotIn(response.status_code, (401, 403))
+
+    def test_admin_changelist_query_count_does_not_grow(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+
+        def changelist_queries():
+            with CaptureQueriesContext(connections['default']) as queries:
+                self.assertEqual(self.client.get('/admin/tracker/apikey/').status_code, 200)
+            return len(queries)
+
+        # The first request also loads the session and user into the cache
+        changelist_queries()
+        queries = changelist_queries()
+        for i in range(3):
+            create_key(self.household, f'Client {i}')
+        self.assertEqual(changelist_queries(), queries)
+
+
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        state = IndianState.objects.create(name='Kerala')
+        self.user = User.objects.create_user('ravi', password='old-password')
+        Household.objects.create(user=self.user, name='Ravi', state=state, members_count=3, city='Kochi')
+        self.other = Client()
+        self.assertTrue(self.client.login(username='ravi', password='old-password'))
+        self.assertTrue(self.other.login(username='ravi', password='old-password'))
+
+    def signed_in(self, client):
+        return client.get('/api/keys/').status_code == 200
+
+    def test_process_local_cache_reads_the_user_every_request(self):
+        self.assertTrue(self.signed_in(self.other))
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+        # Changes made by another process send no signal here
+        User.objects.filter(pk=self.user.pk).update(password=make_password('new-password'))
+        self.assertFalse(self.signed_in(self.other))
+        self.assertTrue(self.client.login(username='ravi', password='new-password'))
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertFalse(self.signed_in(self.client))
+
+    def test_password_change_signs_out_other_sessions(self):
+        with mock.patch('tracker.middleware.user_cache_enabled', return_value=True):
+            self.assertTrue(self.signed_in(self.other))
+            self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+
+            self.user.set_password('new-password')
+            self.user.save()
+            self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+            self.assertFalse(self.signed_in(self.other))
+
+    def test_logout_forgets_the_cached_user(self):
+        with mock.patch('tracker.middleware.user_cache_enabled', return_value=True):
+            self.assertTrue(self.signed_in(self.client))
+            self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+
+            self.client.logout()
+            self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+            self.assertFalse(self.signed_in(self.client))
+            self.assertTrue(self.signed_in(self.other))
+
+
+
+class PeerIndexTests(TestCase):
+    def setUp(self):
+        state = IndianState.objects.create(name='Punjab')
+        self.month = date(2024, 3, 1)
+        self.households = []
+        for i, (members, per_capita) in enumerate([(2, 1.0), (2, 2.0), (2, 2.0), (2, 4.0), (5, 3.0)]):
+            user = User.objects.create_user(f'peer{i}')
+            self.households.append(Household.objects.create(user=user, name=f'Peer {i}', state=state, members_count=members))
+        self.summaries = MonthlyEmissionSummary.objects.bulk_create([
+            MonthlyEmissionSummary(household=household, month_year=self.month, per_capita_emissions=per_capita)
+            for household, per_capita in zip(self.households, [1.0, 2.0, 2.0, 4.0, 3.0])
+        ])
+
+    def test_percentile_rank_within_cohort(self):
+        index = PeerIndex().get(self.month)
+        ranks = [index.percentile(household.pk) for household in self.households]
+        # Ties count half: below + 0.5 * equal over the cohort size
+        self.assertEqual(ranks, [(12.5, 4), (50.0, 4), (50.0, 4), (87.5, 4), (50.0, 1)])
+        self.assertEqual(index.state_average(self.households[0].state_id), 12.0 / 5)
+        self.assertEqual(index.percentile(999), (None, 0))
+
+    def test_changes_during_a_build_are_replayed(self):
+        peers = PeerIndex()
+        build = MonthIndex.build
+        lock_free = []
+
+        def slow_build(month):
+            index = build(month)
+            # Another thread (a post_save handler) can take the lock mid-build
+            def handler():
+                lock_free.append(peers._lock.acquire(timeout=1))
+                peers._lock.release()
+            thread = threading.Thread(target=handler)
+            thread.start()
+            thread.join()
+
+            summary = self.summaries[3]
+            summary.per_capita_emissions = 0.5
+            peers.record_summary(summary)
+            peers.record_summary(self.summaries[1], deleted=True)
+            return index
+
+        with mock.patch.object(MonthIndex, 'build', side_effect=slow_build):
+            index = peers.get(self.month)
+        self.assertEqual(lock_free, [True])
+        rank, cohort_size = index.percentile(self.households[3].pk)
+        self.assertAlmostEqual(rank, 100 / 6)
+        self.assertEqual(cohort_size, 3)
+        self.assertIsNone(index.percentile(self.households[1].pk)[0])
+        self.assertIs(peers.get(self.month), index)
+
+
+
+class GoalProgressTests(TestCase):
+    def setUp(self):
+        state = IndianState.objects.create(name='Assam')
+        user = User.objects.create_user('meera')
+        self.household = Household.objects.create(user=user, name='Meera', state=state, members_count=2)
+        self.goals = [
+            self.add_goal(goal_type)
+            for goal_type in ['monthly', 'yearly', 'per_capita']
+        ]
+        self.start = goal_start(self.goals[0])
+
+    def add_goal(self, goal_type):
+        return self.household.goals.create(
+            goal_type=goal_type, target_reduction_percentage=20, baseline_emissions=400,
+            target_date=date(2030, 1, 1),
+        )
+
+    def month(self, offset):
+        months = self.start.month - 1 + offset
+        return date(self.start.year + months // 12, months % 12 + 1, 1)
+
+    def save_month(self, offset, emissions):
+        month = self.month(offset)
+        EnergyUsage.objects.update_or_create(
+            household=self.household, energy_source='electricity', month_year=month,
+            defaults={'consumption': 1, 'unit': 'kWh', 'emission_calculated': emissions},
+        )
+        summary, _ = MonthlyEmissionSummary.objects.get_or_create(household=self.household, month_year=month)
+        summary.save()
+        return summary
+
+    def assert_matches_fresh_build(self):
+        goals = list(self.household.goals.filter(is_active=True))
+        stored = {progress.goal_id: progress for progress in GoalProgress.objects.filter(goal__in=goals)}
+        with transaction.atomic():
+            GoalProgress.objects.filter(goal__in=goals).delete()
+            fresh = {progress.goal_id: progress for progress in build_progress(goals)}
+            transaction.set_rollback(True)
+
+        fields = ['monthly_values', 'months_count', 'sum_x', 'sum_y', 'sum_xx', 'sum_xy']
+        for goal in goals:
+            self.assertEqual(
+                {field: getattr(stored[goal.pk], field) for field in fields},
+                {field: getattr(fresh[goal.pk], field) for field in fields},
+            )
+            self.assertEqual(evaluate(goal, stored[goal.pk]), evaluate(goal, fresh[goal.pk]))
+
+    def test_incremental_updates_match_a_fresh_build(self):
+        for offset, emissions in enumerate([400, 380, 350]):
+            self.save_month(offset, emissions)
+        self.assert_matches_fresh_build()
+
+        # Re-saving a month replaces its value
+        self.save_month(1, 300)
+        self.assert_matches_fresh_build()
+
+        self.save_month(1, 300).delete()
+        self.assert_matches_fresh_build()
+
+        # Months before the goal started are not tracked
+        self.save_month(-1, 500)
+        self.assert_matches_fresh_build()
+
+        # A new goal is seeded from the summaries so far
+        goal = self.add_goal('monthly')
+        self.assertEqual(goal.progress.months_count, 2)
+        self.save_month(3, 320)
+        self.assert_matches_fresh_build()
+        self.assertEqual(GoalProgress.objects.get(goal=goal).months_count, 3)
+
+
+
+class EmissionFactorTests(TestCase):
+    def setUp(self):
+        invalidate_factor_index()
+        self.addCleanup(invalidate_factor_index)
+        self.add_factor('energy', 'Electricity', 0.82)
+        self.add_factor('energy', 'Electricity', 0.75, date(2023, 4, 1), date(2024, 1, 1))
+        self.revised = self.add_factor('energy', 'Electricity', 0.71, date(2024, 1, 1))
+        self.add_factor('energy', 'LPG', 2.98, date(2020, 1, 1))
+        self.add_factor('energy', 'Kerosene', 2.5, is_active=False)
+        self.add_factor('transport', 'Car', 0.17)
+        self.add_factor('transport', 'Car Petrol', 0.19)
+
+    def add_factor(self, category, name, value, valid_from=EmissionFactor.DEFAULT_VALID_FROM, valid_to=None, **fields):
+        return EmissionFactor.objects.create(
+            category=category, name=name, unit='unit', emission_factor=value,
+            valid_from=valid_from, valid_to=valid_to, **fields,
+        )
+
+    def test_factor_as_of_month(self):
+        electricity = lambda month: resolve_factor('energy', 'electricity', month)
+        self.assertEqual(electricity(date(2023, 3, 1)), 0.82)
+        # valid_from is inclusive, valid_to exclusive
+        self.assertEqual(electricity(date(2023, 4, 1)), 0.75)
+        self.assertEqual(electricity(date(2023, 12, 1)), 0.75)
+        self.assertEqual(electricity(date(2024, 1, 1)), 0.71)
+        # The latest version is open-ended
+        self.assertEqual(electricity(date(2099, 1, 1)), 0.71)
+        self.assertEqual(resolve_factor('transport', 'car_petrol', date(2024, 1, 1)), 0.19)
+        self.assertEqual(resolve_factor('transport', 'car_diesel', date(2024, 1, 1)), 0.17)
+
+    def test_overlapping_versions(self):
+        # A temporary rate over an open-ended one; the open-ended rate resumes after it
+        self.add_factor('energy', 'Electricity', 0.6, date(2025, 1, 1), date(2025, 3, 1))
+        electricity = lambda month: resolve_factor('energy', 'electricity', month)
+        self.assertEqual(electricity(date(2024, 12, 1)), 0.71)
+        self.assertEqual(electricity(date(2025, 2, 1)), 0.6)
+        self.assertEqual(electricity(date(2025, 3, 1)), 0.71)
+
+    def test_missing_factors(self):
+        self.assertIsNone(resolve_factor('energy', 'coal', date(2024, 1, 1)))
+        self.assertIsNone(resolve_factor('energy', 'lpg', date(2019, 12, 1)))
+        self.assertIsNone(resolve_factor('energy', 'kerosene', date(2024, 1, 1)))
+        self.assertIsNone(resolve_factor('diet', 'electricity', date(2024, 1, 1)))
+
+    def test_lookups_come_from_the_index(self):
+        resolve_factor('energy', 'electricity', date(2024, 1, 1))
+        with self.assertNumQueries(0):
+            resolve_factor('energy', 'lpg', date(2024, 1, 1))
+        # Saving a factor rebuilds the index
+        self.add_factor('energy', 'Coal', 1.5)
+        self.assertEqual(resolve_factor('energy', 'coal', date(2024, 1, 1)), 1.5)
+
+    def test_recalculate_emissions(self):
+        state = IndianState.objects.create(name='Bihar')
+        user = User.objects.create_user('kabir')
+        household = Household.objects.create(user=user, name='Kabir', state=state, members_count=2)
+        for month in [date(2023, 6, 1), date(2024, 6, 1)]:
+            EnergyUsage.objects.create(household=household, energy_source='electricity', consumption=100, unit='kWh', month_year=month)
+            EnergyUsage.objects.create(household=household, energy_source='coal', consumption=10, unit='kg', month_year=month)
+            MonthlyEmissionSummary.objects.create(household=household, month_year=month)
+        old = EnergyUsage.objects.get(energy_source='electricity', month_year=date(2023, 6, 1))
+
+        # Revised in place, without the signal that rebuilds the index
+        EmissionFactor.objects.filter(pk=self.revised.pk).update(emission_factor=0.5)
+        output = StringIO()
+        call_command('recalculate_emissions', '--from', '2024-01', stdout=output)
+        self.assertIn('1 rows updated', output.getvalue())
+
+        usage = {row.month_year: row for row in EnergyUsage.objects.filter(energy_source='electricity')}
+        self.assertAlmostEqual(usage[date(2024, 6, 1)].emission_calculated, 50)
+        self.assertGreater(usage[date(2024, 6, 1)].updated_at, old.updated_at)
+        self.assertAlmostEqual(usage[date(2023, 6, 1)].emission_calculated, 75)
+        self.assertEqual(usage[date(2023, 6, 1)].updated_at, old.updated_at)
+        # Rows without a factor are left alone
+        self.assertEqual(set(EnergyUsage.objects.filter(energy_source='coal').values_list('emission_calculated', flat=True)), {None})
+
+        totals = dict(MonthlyEmissionSummary.objects.values_list('month_year', 'total_emissions'))
+        self.assertAlmostEqual(totals[date(2024, 6, 1)], 50)
+        self.assertAlmostEqual(totals[date(2023, 6, 1)], 75)
+
+
+
+GEYSER_TIP = (
+    'Switch off the geyser as soon as you finish bathing. A water heater left on all day keeps '
+    'reheating the tank and can waste several units of electricity every week.'
+)
+
+
+class TipDuplicateTests(TestCase):
+    def setUp(self):
+        invalidate_search_results()
+        self.geyser = EcoTip.objects.create(title='Switch off the geyser', content=GEYSER_TIP, category='energy')
+
+    def test_duplicates_are_skipped_on_ingest(self):
+        created = ingest_tips([
+            {'title': 'Switch off the Geyser!', 'content': 'Something else entirely.'},
+            {'title': 'Geyser habits', 'content': GEYSER_TIP.upper().replace('.', ' ')},
+            {'title': 'Turn the heater off', 'content': GEYSER_TIP.replace('Switch off', 'Turn off')},
+            {'title': 'Carry a cloth bag', 'content': 'Shopkeepers then need not hand you thin plastic bags.'},
+            {'title': 'Carry a cloth bag', 'content': 'A second copy in the same batch.'},
+        ], category='waste')
+        self.assertEqual([tip.title for tip in created], ['Carry a cloth bag'])
+        self.assertEqual(created[0].category, 'waste')
+        self.assertEqual(created[0].content_hash, fingerprint(created[0].content)['content_hash'])
+
+    def test_near_duplicates(self):
+        index = TipIndex.load()
+        reworded = fingerprint(GEYSER_TIP.replace('several', 'many'))
+        self.assertEqual(index.find_duplicate('Geyser', reworded['content_hash'], reworded['simhash']), 'near')
+        unrelated = fingerprint('Carry a cloth bag to the market so shopkeepers do not hand you thin plastic bags.')
+        self.assertIsNone(index.find_duplicate('Cloth bags', unrelated['content_hash'], unrelated['simhash']))
+
+    def test_content_is_read_only_for_tips_without_fingerprints(self):
+        # bulk_create skips save(), like tips stored before fingerprints were kept
+        EcoTip.objects.bulk_create([EcoTip(title='Old tip', content='Walk to the corner shop.', category='transport')])
+        with CaptureQueriesContext(connections['default']) as queries:
+            index = TipIndex.load()
+        content_queries = [query['sql'] for query in queries if '"tracker_ecotip"."content" FROM' in query['sql']]
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(len(content_queries), 1)
+        self.assertIn('"simhash" IS NULL', content_queries[0])
+
+        walk = fingerprint('Walk to the corner shop!')
+        self.assertEqual(index.find_duplicate('Walking', walk['content_hash'], walk['simhash']), 'exact')
+        self.assertEqual(index.find_duplicate('Switch off the geyser', '', 0), 'title')
+
+    def test_dedupe_tips_command(self):
+        EcoTip.objects.bulk_create([
+            EcoTip(title='Geyser again', content=GEYSER_TIP.replace('Switch off', 'Turn off'), category='energy'),
+            EcoTip(title='Cloth bags', content='Carry a cloth bag to the market.', category='waste'),
+            EcoTip(title='Copy of cloth bags', content='Carry a cloth bag to the market!', category='waste'),
+        ])
+        output = StringIO()
+        call_command('dedupe_tips', stdout=output)
+        self.assertIn('Updated fingerprints of 3 tips', output.getvalue())
+        self.assertIn('Found 2 duplicate tips', output.getvalue())
+        self.assertFalse(EcoTip.objects.filter(simhash__isnull=True).exists())
+        self.assertEqual(EcoTip.objects.filter(is_active=True).count(), 4)
+
+        call_command('dedupe_tips', '--deactivate', stdout=StringIO())
+        self.assertEqual(
+            set(EcoTip.objects.filter(is_active=True).values_list('title', flat=True)),
+            {'Switch off the geyser', 'Cloth bags'},
+        )
+
+
+
+# Source pages: the rows each should parse to, with every parser
+PARSER_FIXTURES = {
+    'petrol_diesel': ("""<html><head><script>var row = "<table><tr><td>x</td></tr></table>";</script></head><body>
+<table class="prices"><thead><tr><th>State</th><th>Petrol</th><th>Diesel</th></tr></thead><tbody>
+<tr><td colspan="3">North</td></tr>
+<tr><td><a href="/delhi">Delhi</a></td><td>96.72</td><td><span class="price">89.62</span></td></tr>
+<tr><td>Uttar
+    Pradesh</td><td>96.57</td><td>89.76</td></tr>
+<tr><td>Goa</td><td>97.50</td><td>88.10</td><td><table><tr><td>Revised</td><td>1</td><td>2</td></tr></table></td></tr>
+<tr><td>Kerala</td><td>107.56</td><td>96.43</td></tr>
+</tbody></table>
+<table><tr><th>State</th><th>Petrol</th><th>Diesel</th></tr><tr><td>Other table</td><td>1</td><td>2</td></tr></table>
+</body></html>""", [
+        {'state': 'Delhi', 'petrol': 96.72, 'diesel': 89.62},
+        {'state': 'Uttar Pradesh', 'petrol': 96.57, 'diesel': 89.76},
+        {'state': 'Goa', 'petrol': 97.5, 'diesel': 88.1},
+        {'state': 'Kerala', 'petrol': 107.56, 'diesel': 96.43},
+    ]),
+    'lpg': ("""<table><tr><th>Price</th><th>State</th></tr>
+<tr><td>1,103.00</td><td>Delhi</td></tr>
+<tr><td>1,129.00</td><td>Kolkata</td></tr>
+<tr><td colspan="2">* Domestic 14.2 kg cylinder</td></tr></table>""", [
+        {'state': 'Delhi', 'price': 1103.0},
+        {'state': 'Kolkata', 'price': 1129.0},
+    ]),
+    'electricity': ("""<table><tr><th> state </th><th>Category</th><th>RATE</th></tr>
+<tr><td>Kerala</td><td>Domestic</td><td>3.15</td></tr>
+<tr><td>Bihar</td><td>Domestic</td><td>-</td></tr></table>""", [
+        {'state': 'Kerala', 'rate': 3.15},
+    ]),
+    'energy_tips': ("""<table><tr><th>Title</th><th>Content</th><th>Potential Reduction</th><th>Source URL</th></tr>
+<tr><td>Use LED bulbs</td><td>LEDs use <b>80%</b> less power.</td><td>12.5</td><td>https://example.org/led</td></tr>
+<tr><td>Unplug chargers</td><td>Idle chargers draw power.</td><td></td><td>https://example.org/chargers</td></tr></table>""", [
+        {'title': 'Use LED bulbs', 'content': 'LEDs use 80% less power.', 'potential_reduction': 12.5,
+         'source_url': 'https://example.org/led'},
+    ]),
+}
+
+MALFORMED_PAGE = """<html><body><table class="prices"><thead><tr><th>State</th><th>Petrol</th><th>Diesel</th></thead>
+<tr><td>Delhi</td><td>96.72</td><td>89.62</td>
+<tr><td><b>Mumbai</td><td>106.31</td><td>94.27</td></span></tr>
+<tr><td>Goa & Daman</td><td>97.50</td><td>88.10</td></tr></tr>
+<tr><td>Pune</td><td>n/a</td><td>92.17</td></tr>
+<tr><td>Kochi</td><td>105.10</td></tr>
+</table><div>Unclosed footer"""
+
+
+class ParserTests(SimpleTestCase):
+    def assert_parsed(self, html, spec, expected):
+        for name in PARSERS:
+            with self.subTest(parser=name):
+                self.assertEqual(get_parser(name).parse(html, spec), expected)
+
+    def test_source_pages(self):
+        for source, (html, expected) in PARSER_FIXTURES.items():
+            with self.subTest(source=source):
+                self.assert_parsed(html, get_source_spec(source), expected)
+
+    def test_malformed_page(self):
+        # Unclosed rows and inline tags, stray end tags; rows with bad or missing cells are skipped
+        self.assert_parsed(MALFORMED_PAGE, get_source_spec('petrol_diesel'), [
+            {'state': 'Delhi', 'petrol': 96.72, 'diesel': 89.62},
+            {'state': 'Mumbai', 'petrol': 106.31, 'diesel': 94.27},
+            {'state': 'Goa & Daman', 'petrol': 97.5, 'diesel': 88.1},
+        ])
+
+    def test_unclosed_cells(self):
+        html = '<table><tr><th>State<th>Petrol<th>Diesel<tr><td>Delhi<td>96.72<td>89.62</table>'
+        expected = [{'state': 'Delhi', 'petrol': 96.72, 'diesel': 89.62}]
+        self.assertEqual(get_parser('lxml').parse(html, get_source_spec('petrol_diesel')), expected)
+
+    def test_missing_columns(self):
+        html = '<table><tr><th>State</th><th>Petrol</th></tr><tr><td>Delhi</td><td>96.72</td></tr></table>'
+        self.assert_parsed(html, get_source_spec('petrol_diesel'), [])
+        # Nor a header row at all
+        self.assert_parsed('<table><tr><td>Delhi</td><td>96.72</td><td>89.62</td></tr></table>', get_source_spec('petrol_diesel'), [])
+
+    def test_table_selection(self):
+        html, expected = PARSER_FIXTURES['petrol_diesel']
+        spec = get_source_spec('petrol_diesel')
+        spec.table = {'class': 'prices'}
+        self.assert_parsed(html, spec, expected)
+        spec.table = {'id': 'missing'}
+        self.assert_parsed(html, spec, [])
+
+        with_carbon_settings(self, SCRAPER={**settings.CARBON_FOOTPRINT_SETTINGS.get('SCRAPER', {}), 'SPECS': {
+            'petrol_diesel': {'columns': {'state': 0, 'petrol': 1}, 'numeric': ['petrol'], 'table': {'class': 'prices'}},
+        }})
+        self.assert_parsed(html, get_source_spec('petrol_diesel'), [
+            {'state': 'Delhi', 'petrol': 96.72}, {'state': 'Uttar Pradesh', 'petrol': 96.57},
+            {'state': 'Goa', 'petrol': 97.5}, {'state': 'Kerala', 'petrol': 107.56},
+        ])
+
+    def test_benchmark_parsers(self):
+        output = StringIO()
+        call_command('benchmark_parsers', '--rows', '50', '--repeat', '1', stdout=output)
+        for name in PARSERS:
+            self.assertRegex(output.getvalue(), rf'{name} .* 50 rows')
+
+        with tempfile.NamedTemporaryFile('w', suffix='.html') as page:
+            page.write(PARSER_FIXTURES['lpg'][0])
+            page.flush()
+            output = StringIO()
+            call_command('benchmark_parsers', page.name, '--source', 'lpg', '--repeat', '1', stdout=output)
+        self.assertRegex(output.getvalue(), r'lxml .* 2 rows')
+
+
+
+class EmissionHistoryTests(TestCase):
+    totals = ['total_energy_emissions', 'total_transport_emissions', 'total_diet_emissions', 'total_emissions']
+
+    def setUp(self):
+        state = IndianState.objects.create(name='Sikkim')
+        self.user = User.objects.create_user('tenzin', password='secret')
+        self.household = Household.objects.create(user=self.user, name='Tenzin', state=state, members_count=2)
+        self.this_month = current_month()
+
+    def save_month(self, month, emissions):
+        EnergyUsage.objects.update_or_create(
+            household=self.household, energy_source='electricity', month_year=month,
+            defaults={'consumption': 1, 'unit': 'kWh', 'emission_calculated': emissions},
+        )
+        summary, _ = MonthlyEmissionSummary.objects.get_or_create(household=self.household, month_year=month)
+        summary.save()
+        return summary
+
+    def rollup(self, year):
+        return YearlyEmissionRollup.objects.filter(household=self.household, year=year).values(
+            'months_count', 'per_capita_emissions', *self.totals
+        ).first()
+
+    def summed_summaries(self, year):
+        sums = MonthlyEmissionSummary.objects.filter(household=self.household, month_year__year=year).aggregate(
+            months_count=Count('id'), per_capita_emissions=Sum('per_capita_emissions'),
+            **{name: Sum(name) for name in self.totals}
+        )
+        return sums if sums['months_count'] else None
+
+    def test_rollups_match_the_summaries(self):
+        self.save_month(date(2023, 1, 1), 100)
+        self.save_month(date(2023, 2, 1), 60)
+        snapshot = EmissionSnapshot.objects.get(household=self.household, month_year=date(2023, 2, 1))
+        self.assertEqual((snapshot.total_emissions, snapshot.members_count, snapshot.per_capita_emissions), (60, 2, 30))
+        self.assertEqual(self.rollup(2023), self.summed_summaries(2023))
+
+        self.save_month(date(2023, 1, 1), 80)
+        self.assertEqual(self.rollup(2023), self.summed_summaries(2023))
+
+        MonthlyEmissionSummary.objects.get(month_year=date(2023, 1, 1)).delete()
+        self.assertFalse(EmissionSnapshot.objects.filter(month_year=date(2023, 1, 1)).exists())
+        self.assertEqual(self.rollup(2023), self.summed_summaries(2023))
+
+        MonthlyEmissionSummary.objects.get(month_year=date(2023, 2, 1)).delete()
+        self.assertIsNone(self.rollup(2023))
+
+    def test_past_months_keep_the_household_as_it_was(self):
+        self.save_month(date(2023, 1, 1), 100)
+        self.save_month(self.this_month, 120)
+
+        self.household.members_count = 4
+        self.household.save()
+        past = EmissionSnapshot.objects.get(month_year=date(2023, 1, 1))
+        current = EmissionSnapshot.objects.get(month_year=self.this_month)
+        self.assertEqual((past.members_count, past.per_capita_emissions), (2, 50))
+        self.assertEqual((current.members_count, current.per_capita_emissions), (4, 30))
+        self.assertEqual(self.rollup(self.this_month.year)['per_capita_emissions'], 30)
+
+        # Corrections to a past month update its totals only
+        self.save_month(date(2023, 1, 1), 90)
+        past.refresh_from_db()
+        self.assertEqual((past.total_emissions, past.members_count, past.per_capita_emissions), (90, 2, 45))
+        self.assertEqual(self.rollup(2023)['per_capita_emissions'], 45)
+
+    def test_rebuild_and_backfill(self):
+        self.save_month(date(2022, 6, 1), 100)
+        self.save_month(date(2023, 6, 1), 40)
+        expected = {year: self.rollup(year) for year in (2022, 2023)}
+        YearlyEmissionRollup.objects.update(total_emissions=0, months_count=0)
+        self.assertEqual(rebuild_rollups(), 2)
+        self.assertEqual({year: self.rollup(year) for year in (2022, 2023)}, expected)
+
+        # Summaries stored before snapshots were kept
+        EmissionSnapshot.objects.all().delete()
+        YearlyEmissionRollup.objects.all().delete()
+        self.assertEqual(build_snapshots(), 2)
+        self.assertEqual(build_snapshots(), 0)
+        self.assertEqual({year: self.rollup(year) for year in (2022, 2023)}, expected)
+
+        monthly = emission_history(self.household.pk, date(2022, 1, 1), date(2023, 12, 1))
+        self.assertEqual([(point['label'], point['total_emissions']) for point in monthly], [('Jun 2022', 100), ('Jun 2023', 40)])
+        yearly = emission_history(self.household.pk)
+        self.assertEqual([(point['label'], point['months_count']) for point in yearly], [('2022', 1), ('2023', 1)])
+
+    def test_deleting_a_household_removes_its_history(self):
+        self.save_month(date(2023, 1, 1), 100)
+        self.household.delete()
+        self.assertFalse(EmissionSnapshot.objects.exists())
+        self.assertFalse(YearlyEmissionRollup.objects.exists())
+
+    def test_chart_data(self):
+        self.save_month(self.this_month, 120)
+        summaries = MonthlyEmissionSummary.objects.filter(household=self.household)
+        expected = {
+            'months': [self.this_month.strftime('%b %Y')], 'energy': [120.0], 'transport': [0.0],
+            'diet': [0.0], 'total': [120.0],
+        }
+        self.assertEqual(prepare_chart_data(summaries), expected)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/ajax/chart-data/', {'period': '1year'}).json(), expected)
+        long_range = self.client.get('/ajax/chart-data/', {'period': '5years'}).json()
+        self.assertEqual((long_range['months'], long_range['per_capita']), ([str(self.this_month.year)], [60.0]))
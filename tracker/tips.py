@@ -0,0 +1,145 @@
+"""Eco tip ingestion with duplicate detection.
+
+A tip is a duplicate when a stored tip has the same title or the same or
+nearly the same content. Content is normalised and fingerprinted twice: a
+SHA-256 of the normalised text catches exact copies, and a 64-bit simhash
+over word shingles catches near-identical rewordings from other sources.
+Fingerprints of stored tips are loaded once per batch, new tips are checked
+in memory and inserted with bulk_create, so ingesting a scraped batch costs
+a constant number of queries.
+"""
+import hashlib
+import logging
+import re
+import unicodedata
+from collections import defaultdict
+
+from django.db.models import Q
+
+from .models import EcoTip
+from .recommendations import invalidate_recommendations
+from .search import invalidate_search_results
+
+logger = logging.getLogger('tracker')
+
+# Tips are short, so word pairs: a reworded clause changes few shingles.
+# On the built-in tips a one-phrase rewording is about 8 bits away and
+# unrelated tips 20+ bits apart.
+SHINGLE_SIZE = 2
+# Tips whose simhashes differ in at most this many bits are near-duplicates
+SIMHASH_DISTANCE = 8
+# 64 bits split into SIMHASH_DISTANCE + 1 bands: two hashes within the
+# distance agree on at least one band, so bands index the candidates
+SIMHASH_BANDS = SIMHASH_DISTANCE + 1
+BAND_BITS = 64 // SIMHASH_BANDS
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Lowercased words of a text, ignoring accents, punctuation and spacing"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return WORD_PATTERN.findall(text.lower())
+
+
+def content_hash(content):
+    return hashlib.sha256(' '.join(normalize(content)).encode('utf-8')).hexdigest()
+
+
+def simhash(content):
+    """64-bit simhash of the word shingles of a text, as a signed integer (fits BigIntegerField)"""
+    words = normalize(content)
+    shingles = [' '.join(words[i:i + SHINGLE_SIZE]) for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))]
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    fingerprint = sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def fingerprint(content):
+    """Fields identifying a tip's content"""
+    return {'content_hash': content_hash(content), 'simhash': simhash(content)}
+
+
+def hamming_distance(first, second):
+    return bin((first ^ second) & (1 << 64) - 1).count('1')
+
+
+class TipIndex:
+    """Content hashes and simhash bands of known tips"""
+
+    def __init__(self):
+        self.titles = set()
+        self.hashes = set()
+        self.bands = defaultdict(list)
+
+    @classmethod
+    def load(cls):
+        """Index all stored tips from their fingerprints, reading content only where they are missing"""
+        index = cls()
+        # Stored before fingerprints were kept
+        unfingerprinted = Q(content_hash='') | Q(simhash__isnull=True)
+        tips = EcoTip.objects.exclude(unfingerprinted).values_list('title', 'content_hash', 'simhash')
+        for title, hash_value, sim in tips.iterator():
+            index.add(title, hash_value, sim)
+        for title, content in EcoTip.objects.filter(unfingerprinted).values_list('title', 'content').iterator():
+            index.add(title, content_hash(content), simhash(content))
+        return index
+
+    def _band_keys(self, sim):
+        unsigned = sim & (1 << 64) - 1
+        mask = (1 << BAND_BITS) - 1
+        return [(band, unsigned >> band * BAND_BITS & mask) for band in range(SIMHASH_BANDS)]
+
+    def add(self, title, hash_value, sim):
+        self.titles.add(' '.join(normalize(title)))
+        self.hashes.add(hash_value)
+        for key in self._band_keys(sim):
+            self.bands[key].append(sim)
+
+    def find_duplicate(self, title, hash_value, sim):
+        """'title', 'exact', 'near' or None"""
+        if ' '.join(normalize(title)) in self.titles:
+            return 'title'
+        if hash_value in self.hashes:
+            return 'exact'
+        for key in self._band_keys(sim):
+            for candidate in self.bands.get(key, ()):
+                if hamming_distance(sim, candidate) <= SIMHASH_DISTANCE:
+                    return 'near'
+        return None
+
+
+def ingest_tips(rows, category=None, batch_size=500):
+    """Insert the tips of rows that aren't duplicates of stored tips or of each other.
+
+    Rows are dicts of EcoTip fields; category fills in rows without one.
+    Returns the created tips.
+    """
+    index = TipIndex.load()
+    new_tips = []
+    skipped = {'title': 0, 'exact': 0, 'near': 0}
+    for row in rows:
+        fields = {name: row[name] for name in ('title', 'content', 'category', 'potential_reduction', 'source_url') if name in row}
+        fields.setdefault('category', category or 'general')
+        fields.update(fingerprint(fields.get('content', '')))
+        duplicate = index.find_duplicate(fields.get('title', ''), fields['content_hash'], fields['simhash'])
+        if duplicate:
+            skipped[duplicate] += 1
+            continue
+        index.add(fields.get('title', ''), fields['content_hash'], fields['simhash'])
+        new_tips.append(EcoTip(**fields))
+
+    created = EcoTip.objects.bulk_create(new_tips, batch_size=batch_size)
+    if created:
+        invalidate_search_results()
+        invalidate_recommendations()
+    logger.info(
+        f"Ingested {len(created)} eco tips, skipped duplicates: {skipped['title']} by title, "
+        f"{skipped['exact']} exact, {skipped['near']} near"
+    )
+    return created
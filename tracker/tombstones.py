@@ -0,0 +1,65 @@
+"""Tombstones of deleted and archived rows for the analytics warehouse.
+
+The warehouse export only reads rows that exist, so a row deleted (by a
+user, a cascade or a maintenance job) or moved to the archive would stay
+in the exported datasets forever. Deleting a row of an exported table
+records a WarehouseTombstone instead, and the tombstones are exported as
+a table of their own. Jobs deleting many rows wrap the delete in
+deletion_batch(), which writes the tombstones with one bulk insert.
+"""
+import threading
+from contextlib import contextmanager
+
+from .models import (
+    DietEmission, EnergyUsage, FuelPrice, Household, MonthlyEmissionSummary, TransportUsage, WarehouseTombstone,
+)
+
+# Model -> its table in tracker.warehouse.EXPORTS
+TABLES = {
+    Household: 'households',
+    EnergyUsage: 'energy_usage',
+    TransportUsage: 'transport_usage',
+    DietEmission: 'diet_emissions',
+    MonthlyEmissionSummary: 'monthly_summaries',
+    FuelPrice: 'fuel_prices',
+}
+
+_pending = threading.local()
+
+
+@contextmanager
+def deletion_batch(reason='deleted'):
+    """Collect the tombstones recorded in the block and insert them together at its end.
+
+    Use it inside the transaction doing the deletes, so that both commit or
+    roll back together. Nested batches join the outermost one.
+    """
+    if getattr(_pending, 'batch', None) is not None:
+        yield
+        return
+    _pending.batch = []
+    _pending.reason = reason
+    try:
+        yield
+        WarehouseTombstone.objects.bulk_create(_pending.batch, batch_size=1000)
+    finally:
+        _pending.batch = None
+        _pending.reason = None
+
+
+def record_deletions(table, row_ids):
+    """Record tombstones for rows of a warehouse table"""
+    tombstones = [
+        WarehouseTombstone(table=table, row_id=str(row_id), reason=getattr(_pending, 'reason', None) or 'deleted')
+        for row_id in row_ids
+    ]
+    batch = getattr(_pending, 'batch', None)
+    if batch is not None:
+        batch.extend(tombstones)
+    else:
+        WarehouseTombstone.objects.bulk_create(tombstones, batch_size=1000)
+
+
+def record_deletion(instance):
+    """post_delete handler body: a tombstone for one deleted row"""
+    record_deletions(TABLES[type(instance)], [instance.pk])
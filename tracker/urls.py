@@ -20,6 +20,7 @@ urlpatterns = [
     # Dashboard and Main Views
     path('dashboard/', views.dashboard, name='dashboard'),
     path('reports/', views.reports, name='reports'),
+    path('reports/statement/', views.download_statement, name='download_statement'),
     path('tips/', views.eco_tips, name='eco_tips'),
     
     # Data Entry Forms
@@ -29,8 +30,17 @@ urlpatterns = [
     
     # AJAX Endpoints
     path('ajax/chart-data/', views.get_chart_data, name='chart_data'),
+    path('ajax/stream/', views.dashboard_stream, name='dashboard_stream'),
     
     # API Endpoints
     path('api/', include(router.urls)),
     path('api/update-data/', views.update_scraped_data, name='update_scraped_data'),
+    path('api/forecast/', views.emission_forecast, name='emission_forecast'),
+    path('api/comparison/', views.peer_comparison, name='peer_comparison'),
+    path('api/fuel-prices/history/', views.fuel_price_history, name='fuel_price_history'),
+    path('api/cost-intensity/', views.cost_intensity, name='cost_intensity'),
+    path('api/tips/search/', views.tip_search, name='tip_search'),
+    path('api/emission-history/', views.emission_history, name='emission_history'),
+    path('api/keys/', views.api_keys, name='api_keys'),
+    path('api/keys/<str:prefix>/', views.revoke_api_key, name='revoke_api_key'),
 ]
\ No newline at end of file
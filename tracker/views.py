@@ -2,29 +2,43 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, FileResponse, Http404
+from django.core.handlers.wsgi import WSGIRequest
 from django.db import transaction
 from django.db.models import Sum, Avg
 from django.utils import timezone
+from django.conf import settings
+from django.utils.decorators import method_decorator
 from datetime import datetime, timedelta
 from django.core.paginator import Paginator
 from django.contrib.auth.forms import UserCreationForm
 from django.forms import ModelForm
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from asgiref.sync import sync_to_async
 import json
 from .models import (
     Household, EnergyUsage, TransportUsage, DietEmission, 
     MonthlyEmissionSummary, EcoTip, FuelPrice, IndianState,
-    EmissionFactor, UserGoal
+    EmissionFactor, UserGoal, ApiKey
 )
 from .serializers import (
     HouseholdSerializer, EnergyUsageSerializer, TransportUsageSerializer,
-    DietEmissionSerializer, MonthlyEmissionSummarySerializer, EcoTipSerializer
+    DietEmissionSerializer, MonthlyEmissionSummarySerializer, EcoTipSerializer,
+    ForecastSerializer, ComparisonDataSerializer, FuelPricePointSerializer,
+    CostIntensitySerializer, EcoTipSearchResultSerializer, EmissionHistoryPointSerializer,
+    ApiKeySerializer
 )
 from .scraper import run_all_scrapers
+from . import analytics, apikeys, events, forecasting, history, prices, recommendations, statements
+from .cohorts import compare_household
+from .search import search_tips, DEFAULT_LIMIT, MAX_LIMIT
+from .replicas import use_replica
+from .fieldsets import SparseFieldsViewSetMixin
+from .history import prepare_chart_data
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
@@ -48,6 +62,13 @@ def home(request):
     }
     return render(request, 'tracker/home.html', context)
 
+def user_household(request):
+    """The user's household, loaded with the user by CachedAuthenticationMiddleware (404 without one)"""
+    try:
+        return request.user.household
+    except Household.DoesNotExist:
+        raise Http404('No household profile for this user')
+
 def register(request):
     """User registration view"""
     if request.method == 'POST':
@@ -131,16 +152,13 @@ def dashboard(request):
     except MonthlyEmissionSummary.DoesNotExist:
         trend = 0
     
-    # Get recent eco tips
-    tips = EcoTip.objects.filter(is_active=True).order_by('?')[:3]
+    # Eco tips matched to the household's emissions
+    tips = recommendations.recommended_tips(household.id)
     
-    # Get fuel prices for user's state
+    # Get latest fuel prices for user's state
     fuel_prices = []
     if household.state:
-        fuel_prices = FuelPrice.objects.filter(
-            state=household.state,
-            date_recorded=timezone.now().date()
-        )
+        fuel_prices = prices.latest_prices(household.state)
     
     context = {
         'household': household,
@@ -154,34 +172,39 @@ def dashboard(request):
     
     return render(request, 'tracker/dashboard.html', context)
 
-def prepare_chart_data(monthly_summaries):
-    """Prepare data for charts"""
-    months = []
-    energy_data = []
-    transport_data = []
-    diet_data = []
-    total_data = []
-    
-    for summary in monthly_summaries:
-        months.append(summary.month_year.strftime('%b %Y'))
-        energy_data.append(float(summary.total_energy_emissions))
-        transport_data.append(float(summary.total_transport_emissions))
-        diet_data.append(float(summary.total_diet_emissions))
-        total_data.append(float(summary.total_emissions))
-    
-    return {
-        'months': months,
-        'energy': energy_data,
-        'transport': transport_data,
-        'diet': diet_data,
-        'total': total_data
-    }
+def _stream_household(request):
+    """Resolve the household of an authenticated request, or None"""
+    if not request.user.is_authenticated:
+        return None
+    try:
+        return request.user.household
+    except Household.DoesNotExist:
+        return None
+
+async def dashboard_stream(request):
+    """Server-sent events stream of summary and fuel price updates (ASGI only)"""
+    if isinstance(request, WSGIRequest):
+        # A WSGI worker would buffer the whole stream; tell EventSource not to retry
+        return HttpResponse(status=204)
+    
+    household = await sync_to_async(_stream_household)(request)
+    if household is None:
+        return HttpResponse(status=204)
+    
+    channels = [events.household_channel(household.pk)]
+    if household.state_id:
+        channels.append(events.fuel_channel(household.state_id))
+    
+    response = StreamingHttpResponse(events.event_stream(channels), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 # Data Entry Views
 @login_required
 def add_energy_usage(request):
     """Add energy usage data"""
-    household = get_object_or_404(Household, user=request.user)
+    household = user_household(request)
     
     if request.method == 'POST':
         try:
@@ -218,7 +241,7 @@ def add_energy_usage(request):
 @login_required
 def add_transport_usage(request):
     """Add transportation data"""
-    household = get_object_or_404(Household, user=request.user)
+    household = user_household(request)
     
     if request.method == 'POST':
         try:
@@ -255,7 +278,7 @@ def add_transport_usage(request):
 @login_required
 def add_diet_data(request):
     """Add diet emission data"""
-    household = get_object_or_404(Household, user=request.user)
+    household = user_household(request)
     
     if request.method == 'POST':
         try:
@@ -291,9 +314,10 @@ def add_diet_data(request):
 
 # Analysis and Reports Views
 @login_required
+@use_replica
 def reports(request):
     """Detailed reports and analysis"""
-    household = get_object_or_404(Household, user=request.user)
+    household = user_household(request)
     
     # Get yearly data
     current_year = timezone.now().year
@@ -310,8 +334,9 @@ def reports(request):
         total=Sum('total_emissions')
     )
     
-    # Calculate per capita emissions
-    yearly_per_capita = (yearly_totals['total'] or 0) / household.members_count
+    # Per capita with the household size of each month
+    rollup = household.yearly_rollups.filter(year=current_year).first()
+    yearly_per_capita = rollup.per_capita_emissions if rollup else (yearly_totals['total'] or 0) / household.members_count
     
     # Compare with national average
     national_average = 1900  # kg CO2 per person per year for India
@@ -324,11 +349,30 @@ def reports(request):
         'yearly_per_capita': yearly_per_capita,
         'national_average': national_average,
         'comparison': comparison,
-        'chart_data': prepare_chart_data(yearly_summaries)
+        'chart_data': prepare_chart_data(yearly_summaries),
+        'yearly_history': history.emission_history(household.pk, granularity='year')
     }
     
     return render(request, 'tracker/reports.html', context)
 
+@login_required
+def download_statement(request):
+    """Yearly emission statement as a PDF or PNG file (?year=&format=pdf|png)"""
+    household = user_household(request)
+    
+    file_format = request.GET.get('format', 'pdf')
+    if file_format not in statements.FORMATS:
+        return JsonResponse({'error': 'format must be pdf or png'}, status=400)
+    try:
+        year = int(request.GET.get('year', timezone.now().year))
+    except ValueError:
+        return JsonResponse({'error': 'year must be an integer'}, status=400)
+    if not 1900 <= year <= timezone.now().year:
+        return JsonResponse({'error': 'year is out of range'}, status=400)
+    
+    path, _ = statements.render_statement(household, year, file_format)
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'carbon-footprint-{year}.{file_format}')
+
 @login_required
 def eco_tips(request):
     """Eco-friendly tips and suggestions"""
@@ -351,13 +395,25 @@ def eco_tips(request):
     return render(request, 'tracker/eco_tips.html', context)
 
 # AJAX and API Views
+# Chart periods served from yearly rollups: years shown (None for all)
+LONG_CHART_PERIODS = {'5years': 5, '10years': 10, 'all': None}
+
 @login_required
+@use_replica
 def get_chart_data(request):
     """Get chart data for dashboard"""
-    household = get_object_or_404(Household, user=request.user)
+    household = user_household(request)
     
     period = request.GET.get('period', '6months')
     
+    if period in LONG_CHART_PERIODS:
+        # Long ranges come from the snapshot table, per year
+        years = LONG_CHART_PERIODS[period]
+        this_year = timezone.now().date().replace(month=1, day=1)
+        start = this_year.replace(year=this_year.year - years + 1) if years else None
+        points = history.emission_history(household.pk, start=start, granularity='year')
+        return JsonResponse(history.history_chart_data(points))
+    
     if period == '6months':
         start_date = timezone.now().date() - timedelta(days=180)
     elif period == '1year':
@@ -386,42 +442,194 @@ def update_scraped_data(request):
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def emission_forecast(request):
+    """Forecast of the household's monthly emissions from cached model coefficients"""
+    household = user_household(request)
+    
+    try:
+        months = min(max(int(request.GET.get('months', 6)), 1), 24)
+    except ValueError:
+        return Response({'error': 'months must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    coefficients = forecasting.get_coefficients(household.pk)
+    if coefficients is None:
+        return Response({'error': 'Not enough emission history to forecast'}, status=status.HTTP_404_NOT_FOUND)
+    
+    forecast = forecasting.predict(coefficients, months)
+    serializer = ForecastSerializer({
+        'horizon_months': months,
+        'forecast': forecast,
+        'trend': forecasting.forecast_trend(coefficients, forecast),
+    })
+    return Response(serializer.data)
+
+def national_monthly_per_capita():
+    """National average per-capita emissions for one month"""
+    averages = settings.CARBON_FOOTPRINT_SETTINGS['AVERAGE_INDIAN_EMISSIONS']
+    return averages['per_capita_yearly'] / 12
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def peer_comparison(request):
+    """Compare the household with similar households (state, house type, size and income)"""
+    household = user_household(request)
+    
+    if request.GET.get('month'):
+        try:
+            month = datetime.strptime(request.GET['month'], '%Y-%m').date()
+        except ValueError:
+            return Response({'error': 'month must be in YYYY-MM format'}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        month = MonthlyEmissionSummary.objects.filter(
+            household=household
+        ).values_list('month_year', flat=True).first()
+    
+    comparison = compare_household(household, month, national_monthly_per_capita()) if month else None
+    if comparison is None:
+        return Response({'error': 'No emission summary for this month'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response(ComparisonDataSerializer(comparison).data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def fuel_price_history(request):
+    """Price history of one fuel in the household's state (?fuel_type=&start=&end=)"""
+    household = user_household(request)
+    if not household.state:
+        return Response({'error': 'Household has no state set'}, status=status.HTTP_404_NOT_FOUND)
+    
+    fuel_type = request.GET.get('fuel_type', 'petrol')
+    if fuel_type not in dict(FuelPrice.FUEL_TYPES):
+        return Response({'error': f'Unknown fuel_type: {fuel_type}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        start = datetime.strptime(request.GET['start'], '%Y-%m-%d').date() if request.GET.get('start') else None
+        end = datetime.strptime(request.GET['end'], '%Y-%m-%d').date() if request.GET.get('end') else None
+    except ValueError:
+        return Response({'error': 'start and end must be in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    history = prices.price_history(household.state, fuel_type, start, end)
+    return Response(FuelPricePointSerializer(history, many=True).data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cost_intensity(request):
+    """Energy and transport cost per kg CO2, estimating missing costs from fuel prices (?from=&to=)"""
+    household = user_household(request)
+    
+    try:
+        start = datetime.strptime(request.GET['from'], '%Y-%m').date() if request.GET.get('from') else None
+        end = datetime.strptime(request.GET['to'], '%Y-%m').date() if request.GET.get('to') else None
+    except ValueError:
+        return Response({'error': 'from and to must be in YYYY-MM format'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    metrics = analytics.household_cost_intensity(household.pk, start, end)
+    return Response(CostIntensitySerializer(metrics, many=True).data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def tip_search(request):
+    """Full-text search over active eco tips (?q=&category=&limit=)"""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        limit = min(max(int(request.GET.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    tips = search_tips(query, category=request.GET.get('category') or None, limit=limit)
+    return Response(EcoTipSearchResultSerializer(tips, many=True).data)
+
+@use_replica
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def emission_history(request):
+    """Monthly or yearly emissions of the household over any range (?from=&to=&granularity=)"""
+    household = user_household(request)
+    
+    try:
+        start = datetime.strptime(request.GET['from'], '%Y-%m').date() if request.GET.get('from') else None
+        end = datetime.strptime(request.GET['to'], '%Y-%m').date() if request.GET.get('to') else None
+    except ValueError:
+        return Response({'error': 'from and to must be in YYYY-MM format'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    granularity = request.GET.get('granularity') or None
+    if granularity not in (None, 'month', 'year'):
+        return Response({'error': 'granularity must be month or year'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    points = history.emission_history(household.pk, start, end, granularity)
+    return Response(EmissionHistoryPointSerializer(points, many=True).data)
+
+# Keys are managed from a logged-in session only, so a leaked key can't mint more
+@api_view(['GET', 'POST'])
+@authentication_classes([SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def api_keys(request):
+    """List the household's API keys, or create one (the key is only shown in this response)"""
+    household = user_household(request)
+    
+    if request.method == 'GET':
+        keys = household.api_keys.all()
+        return Response(ApiKeySerializer(keys, many=True).data)
+    
+    serializer = ApiKeySerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    api_key, key = apikeys.create_key(household, serializer.validated_data['name'], serializer.validated_data['scope'])
+    return Response({**ApiKeySerializer(api_key).data, 'key': key}, status=status.HTTP_201_CREATED)
+
+@api_view(['DELETE'])
+@authentication_classes([SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def revoke_api_key(request, prefix):
+    """Revoke one of the household's API keys"""
+    api_key = get_object_or_404(ApiKey, household__user=request.user, prefix=prefix)
+    apikeys.revoke_key(api_key)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
 # REST API ViewSets
-class HouseholdViewSet(viewsets.ModelViewSet):
+class HouseholdViewSet(SparseFieldsViewSetMixin, viewsets.ModelViewSet):
     serializer_class = HouseholdSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
         return Household.objects.filter(user=self.request.user)
 
-class EnergyUsageViewSet(viewsets.ModelViewSet):
+class EnergyUsageViewSet(SparseFieldsViewSetMixin, viewsets.ModelViewSet):
     serializer_class = EnergyUsageSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
         return EnergyUsage.objects.filter(household__user=self.request.user)
 
-class TransportUsageViewSet(viewsets.ModelViewSet):
+class TransportUsageViewSet(SparseFieldsViewSetMixin, viewsets.ModelViewSet):
     serializer_class = TransportUsageSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
         return TransportUsage.objects.filter(household__user=self.request.user)
 
-class DietEmissionViewSet(viewsets.ModelViewSet):
+class DietEmissionViewSet(SparseFieldsViewSetMixin, viewsets.ModelViewSet):
     serializer_class = DietEmissionSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
         return DietEmission.objects.filter(household__user=self.request.user)
 
-class MonthlyEmissionSummaryViewSet(viewsets.ReadOnlyModelViewSet):
+class MonthlyEmissionSummaryViewSet(SparseFieldsViewSetMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = MonthlyEmissionSummarySerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
         return MonthlyEmissionSummary.objects.filter(household__user=self.request.user)
+    
+    @method_decorator(use_replica)
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
 
-class EcoTipViewSet(viewsets.ReadOnlyModelViewSet):
+class EcoTipViewSet(SparseFieldsViewSetMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = EcoTipSerializer
     queryset = EcoTip.objects.filter(is_active=True)
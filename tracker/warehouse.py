@@ -0,0 +1,154 @@
+"""Columnar export of all households' data for the analytics warehouse.
+
+Each table is exported as a dataset directory of part files (Parquet or
+Arrow IPC), one part per run holding the rows created or updated since the
+previous run's watermark. Rows are streamed from a server-side cursor and
+written one fixed-size row group at a time, so memory stays bounded by a
+row group whatever the table size. A row updated between runs appears in
+several parts; readers keep the newest copy of each id. Deleted and
+archived rows are exported to the deletions table (see tracker.tombstones)
+as (table, row_id, reason, deleted_at); readers drop the rows it lists.
+"""
+import logging
+import os
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .archive import arrow_type
+from .models import (
+    Household, EnergyUsage, TransportUsage, DietEmission, MonthlyEmissionSummary, FuelPrice, WarehouseExport,
+    WarehouseTombstone,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is in requirements.txt
+    pa = None
+
+logger = logging.getLogger('tracker')
+
+WAREHOUSE_DEFAULTS = {
+    'DIR': None,
+    'ROW_GROUP_SIZE': 65536,
+    'FORMAT': 'parquet',
+}
+FORMATS = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+# Table -> (model, watermark field, fields left out). Bulk updates of
+# usage rows set updated_at themselves, as bulk_update() skips auto_now.
+# Fuel prices are only ever inserted or deleted, so their creation time is
+# the watermark.
+EXPORTS = {
+    'households': (Household, 'updated_at', ['name', 'user']),
+    'energy_usage': (EnergyUsage, 'updated_at', []),
+    'transport_usage': (TransportUsage, 'updated_at', []),
+    'diet_emissions': (DietEmission, 'updated_at', []),
+    'monthly_summaries': (MonthlyEmissionSummary, 'updated_at', []),
+    'fuel_prices': (FuelPrice, 'created_at', []),
+    'deletions': (WarehouseTombstone, 'deleted_at', ['id']),
+}
+
+
+def get_warehouse_setting(name):
+    configured = settings.CARBON_FOOTPRINT_SETTINGS.get('WAREHOUSE', {})
+    return configured.get(name, WAREHOUSE_DEFAULTS[name])
+
+
+def export_fields(table):
+    model, _, excluded = EXPORTS[table]
+    return [field for field in model._meta.concrete_fields if field.name not in excluded]
+
+
+def export_schema(table):
+    return pa.schema([pa.field(field.attname, arrow_type(field)) for field in export_fields(table)])
+
+
+class PartWriter:
+    """Writes record batches to one Parquet or Arrow IPC file"""
+
+    def __init__(self, path, schema, file_format):
+        self.path = path
+        self.schema = schema
+        if file_format == 'parquet':
+            self.writer = pq.ParquetWriter(path, schema, compression='zstd')
+        else:
+            self.sink = pa.OSFile(str(path), 'wb')
+            self.writer = pa.ipc.new_file(self.sink, schema)
+        self.file_format = file_format
+
+    def write(self, columns):
+        batch = pa.record_batch(columns, schema=self.schema)
+        if self.file_format == 'parquet':
+            # One call per row group keeps row groups at the configured size
+            self.writer.write_batch(batch, row_group_size=batch.num_rows)
+        else:
+            self.writer.write_batch(batch)
+
+    def close(self):
+        self.writer.close()
+        if self.file_format != 'parquet':
+            self.sink.close()
+
+
+def _columns(rows, fields):
+    columns = [list(values) for values in zip(*rows)]
+    for index, field in enumerate(fields):
+        target = field.target_field if field.is_relation else field
+        if target.get_internal_type() == 'UUIDField':
+            columns[index] = [None if value is None else str(value) for value in columns[index]]
+    return columns
+
+
+def export_table(table, output_dir=None, full=False, row_group_size=None, file_format=None):
+    """Write the rows changed since the last export as a new part; returns (rows, path)"""
+    if pa is None:
+        raise RuntimeError('pyarrow is required for warehouse exports')
+    model, watermark_field, _ = EXPORTS[table]
+    row_group_size = row_group_size or get_warehouse_setting('ROW_GROUP_SIZE')
+    file_format = file_format or get_warehouse_setting('FORMAT')
+    root = Path(output_dir or get_warehouse_setting('DIR') or Path(settings.BASE_DIR) / 'warehouse')
+    directory = root / table
+    directory.mkdir(parents=True, exist_ok=True)
+
+    export, _ = WarehouseExport.objects.get_or_create(table=table)
+    started = timezone.now()
+    rows = model.objects.filter(**{f'{watermark_field}__lt': started})
+    if export.watermark and not full:
+        rows = rows.filter(**{f'{watermark_field}__gte': export.watermark})
+
+    fields = export_fields(table)
+    schema = export_schema(table)
+    path = directory / f"part-{started:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.{FORMATS[file_format]}"
+    temporary = path.with_suffix('.tmp')
+    writer = PartWriter(temporary, schema, file_format)
+    exported = 0
+    group = []
+    try:
+        # iterator() reads through a server-side cursor on PostgreSQL
+        for row in rows.order_by().values_list(*(field.attname for field in fields)).iterator(chunk_size=row_group_size):
+            group.append(row)
+            if len(group) == row_group_size:
+                writer.write(_columns(group, fields))
+                exported += len(group)
+                group = []
+        if group:
+            writer.write(_columns(group, fields))
+            exported += len(group)
+    finally:
+        writer.close()
+
+    if exported:
+        os.replace(temporary, path)
+    else:
+        temporary.unlink()
+        path = None
+    export.watermark = started
+    export.rows_exported = exported
+    export.last_file = str(path or '')
+    export.save()
+    logger.info(f"Exported {exported} {table} rows to the warehouse")
+    return exported, path